@@ -1,6 +1,11 @@
+import math
+
+from geometry import Rect
 from settings import SCREEN_HEIGHT, SCREEN_WIDTH
 from shared import ProjectileType
 
+CAST_EPSILON = 1e-9  # a box resting against a wall it bounced off is not touching it
+
 
 class Tile:
     def __init__(self) -> None:
@@ -57,6 +62,156 @@ class Arena:
         return list(filter(lambda x: x.has_collision, self.tiles))
 
 
+class ArenaRuntime:
+    """
+    Collision and interactable lookups for an arena.
+    Built once per arena, tiles are bucketed by grid cell so a query only looks at the cells it overlaps.
+    """
+    def __init__(self, arena: Arena) -> None:
+        self.arena = arena
+        self.cell_width = SCREEN_WIDTH / arena.width
+        self.cell_height = SCREEN_HEIGHT / arena.height
+
+        self.colliders: list[Rect] = [self.tile_rect(tile) for tile in arena.get_colliders()]
+        self.interactable_tiles: list[Tile] = [tile for tile in arena.tiles if tile.interactable]
+
+        self._collider_cells: dict[tuple[int, int], list[Rect]] = {}
+        for rect in self.colliders:
+            for cell in self._cells(rect):
+                self._collider_cells.setdefault(cell, []).append(rect)
+
+        self._interactable_cells: dict[tuple[int, int], list[tuple[Rect, Tile]]] = {}
+        for tile in self.interactable_tiles:
+            rect = self.tile_rect(tile)
+            for cell in self._cells(rect):
+                self._interactable_cells.setdefault(cell, []).append((rect, tile))
+
+        # the same area as the colliders in a few rects, for sweeps across the whole arena, see cast
+        self.walls: list[Rect] = self.merge_colliders(self.colliders)
+        self._obstacles: list[tuple[int, int, int, int, Tile | None]] = [
+            (rect.left, rect.top, rect.right, rect.bottom, None) for rect in self.walls]
+        for tile in self.interactable_tiles:
+            rect = self.tile_rect(tile)
+            self._obstacles.append((rect.left, rect.top, rect.right, rect.bottom, tile))
+
+    @staticmethod
+    def merge_colliders(colliders: list[Rect]) -> list[Rect]:
+        """
+        Joins touching colliders into horizontal runs, then stacks runs spanning the same columns
+        """
+        rows: dict[int, list[Rect]] = {}
+        for rect in colliders:
+            rows.setdefault(rect.top, []).append(rect)
+
+        runs: list[Rect] = []
+        for _, row in sorted(rows.items()):
+            row.sort(key=lambda rect: rect.left)
+            run = row[0]
+            for rect in row[1:]:
+                if rect.left <= run.right and rect.height == run.height:
+                    run = Rect(run.left, run.top, max(run.right, rect.right) - run.left, run.height)
+                else:
+                    runs.append(run)
+                    run = rect
+            runs.append(run)
+
+        merged: list[Rect] = []
+        for run in sorted(runs, key=lambda rect: (rect.left, rect.right, rect.top)):
+            last = merged[-1] if merged else None
+            if last and last.left == run.left and last.right == run.right and run.top <= last.bottom:
+                merged[-1] = Rect(last.left, last.top, last.width, max(last.bottom, run.bottom) - last.top)
+            else:
+                merged.append(run)
+        return merged
+
+    @staticmethod
+    def tile_rect(tile: Tile) -> Rect:
+        return Rect(tile.position[0], tile.position[1], tile.width, tile.height)
+
+    def _cells(self, rect: Rect) -> list[tuple[int, int]]:
+        first_col = int(rect.left // self.cell_width)
+        last_col = int((rect.right - 1) // self.cell_width)
+        first_row = int(rect.top // self.cell_height)
+        last_row = int((rect.bottom - 1) // self.cell_height)
+        return [(col, row)
+                for row in range(first_row, last_row + 1)
+                for col in range(first_col, last_col + 1)]
+
+    def contains(self, x: float, y: float) -> bool:
+        return 0 <= x <= SCREEN_WIDTH and 0 <= y <= SCREEN_HEIGHT
+
+    def collides(self, rect: Rect) -> bool:
+        for cell in self._cells(rect):
+            for other in self._collider_cells.get(cell, ()):
+                if other.colliderect(rect):
+                    return True
+        return False
+
+    def interactable_at(self, rect: Rect) -> Tile | None:
+        for cell in self._cells(rect):
+            for other, tile in self._interactable_cells.get(cell, ()):
+                if other.colliderect(rect):
+                    return tile
+        return None
+
+    def exit_time(self, x: float, y: float, vx: float, vy: float, size: float = 8) -> float:
+        """
+        When a size x size box moving from (x, y) by (vx, vy) per second is all the way out of the arena, inf if it never is
+        """
+        times = []
+        if vx:
+            times.append(((SCREEN_WIDTH if vx > 0 else -size) - x) / vx)
+        if vy:
+            times.append(((SCREEN_HEIGHT if vy > 0 else -size) - y) / vy)
+        return max(min(times), 0) if times else math.inf
+
+    def cast(self, x: float, y: float, vx: float, vy: float, size: float = 8) -> tuple[float, bool, bool, Tile | None] | None:
+        """
+        Sweeps a size x size box from (x, y) by (vx, vy) per second against the wall runs and interactable tiles.
+        Returns the time it first touches one, whether the velocity reflects on the x and y axis
+        and the interactable tile if that is what stopped it.
+        None if it leaves the arena without touching anything
+        """
+        if not vx and not vy:
+            return None
+
+        # Rects truncate to whole pixels, so the box overlaps from a pixel closer than its size
+        reach = size - 1
+        inv_x = 1 / vx if vx else 0
+        inv_y = 1 / vy if vy else 0
+        best: tuple[float, bool, bool, Tile | None] | None = None
+        for left, top, right, bottom, tile in self._obstacles:
+            # per axis, when the box starts and stops overlapping it
+            if vx:
+                enter_x, exit_x = (left - reach - x) * inv_x, (right - x) * inv_x
+                if enter_x > exit_x:
+                    enter_x, exit_x = exit_x, enter_x
+            elif left - reach < x < right:
+                enter_x, exit_x = -math.inf, math.inf
+            else:
+                continue
+
+            if vy:
+                enter_y, exit_y = (top - reach - y) * inv_y, (bottom - y) * inv_y
+                if enter_y > exit_y:
+                    enter_y, exit_y = exit_y, enter_y
+            elif top - reach < y < bottom:
+                enter_y, exit_y = -math.inf, math.inf
+            else:
+                continue
+
+            enter, exit = max(enter_x, enter_y), min(exit_x, exit_y)
+            if enter >= exit or exit <= CAST_EPSILON:
+                continue
+
+            time = max(enter, 0)
+            # a wall wins ties, it stops the box before it gets into the tile
+            if best is None or time < best[0] or (time == best[0] and tile is None and best[3] is not None):
+                best = (time, enter_x >= enter_y, enter_y >= enter_x, tile)
+            elif time == best[0] and tile is None:
+                best = (time, best[1] or enter_x >= enter_y, best[2] or enter_y >= enter_x, None)
+        return best
+
 if __name__ == "__main__":
     arena = Arena("arena")
     print(arena.map)
@@ -0,0 +1,30 @@
+"""
+Offline benchmarks, run from the repository root:
+
+    python -m benchmarks.ui_draw
+"""
+import os
+import time
+
+
+def headless() -> None:
+    """
+    Route SDL to dummy drivers so pygame can render without a display or sound card.
+    Must be called before pygame is initialised.
+    """
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+
+def measure(fn, iterations: int, repeat: int = 5) -> float:
+    """
+    Returns the best mean time per call in seconds over `repeat` runs
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        best = min(best, (time.perf_counter() - start) / iterations)
+    return best
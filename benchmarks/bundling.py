@@ -0,0 +1,91 @@
+"""
+Datagrams and bytes per client with and without bundling a tick's messages into one datagram.
+
+Runs bots in a firefight on a HeadlessServer for a fixed stretch of virtual time, once sending
+every message in its own datagram and once bundled, and reports per client datagrams/s, bytes/s
+and how much of those bytes are headers rather than payload. The bots send COORDINATES, nearly
+everything they get is an UPDATE and there is little to bundle it with.
+
+Then the same for the clients of benchmarks.input_commands, whose tanks the server moves.
+Each of them gets an INPUT_STATE with every UPDATE.
+
+    python -m benchmarks.bundling
+"""
+import contextlib
+import io
+import random
+
+from benchmarks import input_commands
+from headless import Bot, HeadlessServer
+from packet import Bundle, Packet
+from settings import SIMULATION_TICK_RATE
+from shared import ProjectileType
+
+PLAYERS = 4  # the most any arena has room for
+DURATION = 60
+
+
+class CountingServer(HeadlessServer):
+    def __init__(self, seed: int) -> None:
+        super().__init__(seed)
+        self.payload_bytes = 0
+
+    def _send(self, data: bytes, address: tuple[str, int]) -> None:
+        self.payload_bytes += sum(len(message.payload) for message in Bundle.unpack(Packet.deserialize(data)))
+        super()._send(data, address)
+
+
+def run(bundling: bool, players: int = PLAYERS, seed: int = 1) -> dict[str, float]:
+    rng = random.Random(seed)
+    server = CountingServer(seed)
+    server.bundling = bundling
+    bots = [Bot(server, (f"10.0.0.{i}", 1), tuple(rng.sample(list(ProjectileType), 2)), rng) for i in range(players)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        for bot in bots:
+            bot.connect()
+
+        dt = 1 / SIMULATION_TICK_RATE
+        while server.now < DURATION:
+            for bot in bots:
+                bot.step(server.now, dt)
+            server.step(dt)
+
+    per_client = players * server.now
+    return {
+        "datagrams_per_s": server.sent_datagrams / per_client,
+        "bytes_per_s": server.sent_bytes / per_client,
+        "header_share": 1 - server.payload_bytes / server.sent_bytes,
+        "messages": sum(server.messages_sent.values.values()),
+    }
+
+
+def run_input_commands(bundling: bool) -> dict[str, float]:
+    result = input_commands.run(True, 0, bundling=bundling)
+    return {
+        "datagrams_per_s": result["received_datagrams_per_s"],
+        "bytes_per_s": result["received_bytes_per_s"],
+    }
+
+
+def bench() -> dict[str, float]:
+    results = {}
+    for name, bundling in (("unbundled", False), ("bundled", True)):
+        for key, value in run(bundling).items():
+            results[f"bundling.{name}.{key}"] = value
+        for key, value in run_input_commands(bundling).items():
+            results[f"bundling.input.{name}.{key}"] = value
+    return results
+
+
+if __name__ == "__main__":
+    print(f"{PLAYERS} bots for {DURATION} s of virtual time, per client")
+    print(f"{'':<10} {'datagrams/s':>12} {'bytes/s':>9} {'headers':>8} {'messages':>9}")
+    for name, bundling in (("unbundled", False), ("bundled", True)):
+        result = run(bundling)
+        print(f"{name:<10} {result['datagrams_per_s']:12.1f} {result['bytes_per_s']:9.0f} "
+              f"{result['header_share']:8.1%} {result['messages']:9.0f}")
+
+    print(f"{input_commands.CLIENTS} clients sending INPUT for {input_commands.DURATION} s, per client")
+    for name, bundling in (("unbundled", False), ("bundled", True)):
+        result = run_input_commands(bundling)
+        print(f"{name:<10} {result['datagrams_per_s']:12.1f} {result['bytes_per_s']:9.0f}")
@@ -0,0 +1,97 @@
+"""
+Compares two benchmark.suite result files and flags regressions.
+
+    python -m benchmarks.compare baseline.json current.json [--threshold .1]
+
+A result regresses when it moved more than `threshold` (relative to the baseline) in the wrong
+direction. Timings, latencies, errors and packet counts are lower is better, the names in
+HIGHER_IS_BETTER are the other way around and NEUTRAL ones describe behaviour and are only listed.
+Exits with status 1 when anything regressed.
+"""
+import argparse
+import json
+import sys
+
+# by the last component of the result name
+HIGHER_IS_BETTER = {"accuracy", "delivered", "delivered_per_s", "in_order", "per_s", "speedup"}
+NEUTRAL = {"sent_per_s", "mean_rate"}
+
+
+def direction(name: str) -> int:
+    """
+    1 when higher is better, -1 when lower is better, 0 when neither
+    """
+    metric = name.rsplit(".", 1)[-1]
+    if metric in HIGHER_IS_BETTER:
+        return 1
+    if metric in NEUTRAL:
+        return 0
+    return -1
+
+
+def relative_change(baseline: float, current: float) -> float:
+    if baseline == 0:
+        return current
+    return (current - baseline) / abs(baseline)
+
+
+def compare(baseline: dict[str, float], current: dict[str, float], threshold: float) -> tuple[list, list, list]:
+    """
+    Regressions, improvements and neutral changes beyond the threshold, as (name, baseline, current, change)
+    """
+    regressions, improvements, changes = [], [], []
+    for name in sorted(set(baseline) & set(current)):
+        change = relative_change(baseline[name], current[name])
+        if abs(change) <= threshold:
+            continue
+
+        row = (name, baseline[name], current[name], change)
+        sign = direction(name)
+        if sign == 0:
+            changes.append(row)
+        elif change * sign < 0:
+            regressions.append(row)
+        else:
+            improvements.append(row)
+    return regressions, improvements, changes
+
+
+def print_rows(title: str, rows: list) -> None:
+    if not rows:
+        return
+    print(f"{title}:")
+    for name, baseline, current, change in rows:
+        print(f"  {name:<52} {baseline:12.6g} -> {current:12.6g} {change:+8.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark suite runs")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=.1, help="relative change that counts, default 10%%")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    print(f"{baseline.get('commit') or args.baseline} -> {current.get('commit') or args.current}")
+    if (baseline.get("python"), baseline.get("platform")) != (current.get("python"), current.get("platform")):
+        print("warning: the runs come from different interpreters or machines, timings are not comparable")
+
+    regressions, improvements, changes = compare(baseline["results"], current["results"], args.threshold)
+    print_rows("regressions", regressions)
+    print_rows("improvements", improvements)
+    print_rows("changed", changes)
+
+    missing = sorted(set(baseline["results"]) - set(current["results"]))
+    added = sorted(set(current["results"]) - set(baseline["results"]))
+    if missing:
+        print(f"{len(missing)} results missing from current, e.g. {missing[0]}")
+    if added:
+        print(f"{len(added)} results new in current, e.g. {added[0]}")
+    if not (regressions or improvements or changes):
+        print(f"no changes beyond {args.threshold:.0%}")
+
+    sys.exit(1 if regressions else 0)
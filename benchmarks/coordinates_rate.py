@@ -0,0 +1,106 @@
+"""
+COORDINATES traffic with and without client throttling and server coalescing.
+
+Four clients render at 120 FPS for a scripted 30 s session (idle, driving,
+aiming). Datagrams reach the server with jitter so they arrive in clumps, the
+server counts what it received and what it actually handled. Every client stays
+under FLOOD_RATE, the server's rate limits drop nothing.
+
+    python -m benchmarks.coordinates_rate
+"""
+import math
+import random
+
+from benchmarks.sim import SimServer
+from client import PositionThrottle
+from packet import Packet, PacketType, PayloadFormat
+from settings import SIMULATION_TICK_RATE
+
+CLIENTS = 4
+CLIENT_FPS = 120
+DURATION = 30
+JITTER = .03
+
+
+def tank_state(t: float, phase: float) -> tuple[float, float, float, float]:
+    t += phase
+    cycle = t % 20
+    if cycle < 5:
+        # idle
+        return 100, 100, 0, 0
+    if cycle < 12:
+        # driving in an arc
+        return 100 + (cycle - 5) * 40, 100 + math.sin(cycle) * 30, (cycle - 5) * 20, 0
+    if cycle < 15:
+        # parked, aiming with the mouse
+        return 380, 100 + math.sin(12) * 30, 140, (cycle - 12) * 90
+    return 380 - (cycle - 15) * 50, 100, 140 + (cycle - 15) * 30, 270
+
+
+def run(throttled: bool, coalesced: bool, seed: int = 1) -> dict[str, int]:
+    rng = random.Random(seed)
+    server = SimServer()
+    addresses = [(f"10.0.0.{i}", 1) for i in range(CLIENTS)]
+    arrivals: list[tuple[float, bytes, tuple[str, int]]] = []
+
+    for i, addr in enumerate(addresses):
+        player_id = server.connect(addr)
+        throttle = PositionThrottle()
+        for frame in range(DURATION * CLIENT_FPS):
+            now = frame / CLIENT_FPS
+            x, y, rotation, barrel_rotation = tank_state(now, i * 3.3)
+            if throttled and not throttle.should_send(now, x, y, rotation, barrel_rotation):
+                continue
+            data = Packet(PacketType.COORDINATES, frame, PayloadFormat.COORDINATES.pack(
+                player_id, x, y, rotation, barrel_rotation)).serialize()
+            arrivals.append((now + rng.uniform(0, JITTER), data, addr))
+
+    arrivals.sort(key=lambda arrival: arrival[0])
+    dt = 1 / SIMULATION_TICK_RATE
+    index = 0
+    for tick in range(DURATION * SIMULATION_TICK_RATE + 1):
+        now = tick * dt
+        # the flood buckets refill on the server's clock
+        server.now = now
+        while index < len(arrivals) and arrivals[index][0] <= now:
+            _, data, addr = arrivals[index]
+            if coalesced:
+                server.receive(data, addr)
+            else:
+                server.packets_received.inc(PacketType.COORDINATES)
+                server.handle_request(data, addr)
+            index += 1
+        server.handle_pending_requests()
+
+    dropped = sum(server.datagrams_dropped.values.values())
+    assert not dropped, f"the rate limits dropped {dropped} datagrams, nothing would be measured"
+    return {
+        "received": server.packets_received[PacketType.COORDINATES],
+        "handled": server.packets_handled[PacketType.COORDINATES],
+    }
+
+
+CONFIGURATIONS = [
+    ("every frame", False, False),
+    ("coalesced", False, True),
+    ("throttled", True, False),
+    ("throttled + coalesced", True, True),
+]
+
+
+def bench() -> dict[str, float]:
+    results = {}
+    for name, throttled, coalesced in CONFIGURATIONS:
+        counts = run(throttled, coalesced)
+        key = name.replace(" + ", "_").replace(" ", "_")
+        results[f"coordinates.{key}.received_per_s"] = counts["received"] / DURATION
+        results[f"coordinates.{key}.handled_per_s"] = counts["handled"] / DURATION
+    return results
+
+
+if __name__ == "__main__":
+    print(f"{CLIENTS} clients, {DURATION} s")
+    print(f"{'':<24} {'received/s':>10} {'handled/s':>10}")
+    for name, throttled, coalesced in CONFIGURATIONS:
+        counts = run(throttled, coalesced)
+        print(f"{name:<24} {counts['received'] / DURATION:10.1f} {counts['handled'] / DURATION:10.1f}")
@@ -0,0 +1,189 @@
+"""
+A match between bots while one player floods the server, with and without the rate limits.
+
+Three bots play as usual. The fourth player sends FLOOD_SHOTS SHOOT packets every simulation
+tick, far past any cooldown, and FLOOD_GARBAGE datagrams a tick that do not decode, each from
+its own address. Reported are how long simulation ticks took on this machine, the projectiles
+alive at the worst moment, what was dropped or rejected, and how many errors were logged.
+
+Before that, every CRAFTED datagram is sent to a server of its own, with and without the rate
+limits. The server has to keep ticking, landing lobbed projectiles and serving its metrics afterwards.
+
+    python -m benchmarks.flood [seconds]
+"""
+import contextlib
+import io
+import itertools
+import logging
+import math
+import random
+import sys
+import time
+
+from headless import Bot, HeadlessServer
+from packet import Packet, PacketType, PayloadFormat
+from server import LOGGER
+from settings import INPUT_MAX_LEAD, SIMULATION_TICK_RATE
+from shared import LifecycleType, ProjectileType
+
+BOTS = 3
+FLOOD_SHOTS = 20
+FLOOD_GARBAGE = 20
+DURATION = 20
+CRAFTED_SECONDS = 3
+
+NAN, INF = math.nan, math.inf
+# what the datagram is, its type and payload, each one once took the server down
+CRAFTED = [
+    ("SHOOT from NaN", PacketType.SHOOT, PayloadFormat.SHOOT.pack(0, NAN, 100, 1, 0, ProjectileType.BULLET, 0, 0)),
+    ("SHOOT towards inf", PacketType.SHOOT, PayloadFormat.SHOOT.pack(0, 100, 100, INF, 0, ProjectileType.LASER, 0, 0)),
+    ("CLUSTER towards NaN", PacketType.SHOOT, PayloadFormat.SHOOT.pack(0, 100, 100, NAN, 100, ProjectileType.CLUSTER, 0, 0)),
+    ("SHOOT that stands still", PacketType.SHOOT, PayloadFormat.SHOOT.pack(0, 100, 100, 0, 0, ProjectileType.BULLET, 0, 0)),
+    ("SHOOT away from the arena", PacketType.SHOOT, PayloadFormat.SHOOT.pack(0, -50, 100, -1, 0, ProjectileType.BULLET, 0, 0)),
+    ("SHOCKWAVE towards inf", PacketType.SHOOT, PayloadFormat.SHOOT.pack(0, 100, 100, 100, INF, ProjectileType.SHOCKWAVE, 0, 0)),
+    ("COORDINATES at NaN", PacketType.COORDINATES, PayloadFormat.COORDINATES.pack(0, NAN, NAN, 0, 0)),
+    ("COORDINATES at -inf", PacketType.COORDINATES, PayloadFormat.COORDINATES.pack(0, -INF, 100, 0, 0)),
+    ("COORDINATES far outside the arena", PacketType.COORDINATES, PayloadFormat.COORDINATES.pack(0, 1e9, 1e9, 0, 0)),
+    # the last command sets where the server starts, the ones before are ever further ahead of it
+    ("INPUT from the far future", PacketType.INPUT, b"".join(
+        PayloadFormat.INPUT.pack(tick, 0) for tick in [*range(10 ** 6, 10 ** 6 + 160), 1])),
+    ("a packet type that does not exist", 99, b""),
+]
+
+
+class CountingHandler(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.records = 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.records += 1
+
+
+@contextlib.contextmanager
+def counted_logs():
+    """
+    Counts what the server logs instead of printing it
+    """
+    handler = CountingHandler()
+    LOGGER.addHandler(handler)
+    propagate, LOGGER.propagate = LOGGER.propagate, False
+    try:
+        yield handler
+    finally:
+        LOGGER.removeHandler(handler)
+        LOGGER.propagate = propagate
+
+
+def crafted() -> int:
+    """
+    Sends every CRAFTED datagram from a connected player just before a CLUSTER from the other one lands,
+    then another CLUSTER that has to land within CRAFTED_SECONDS. Raises if one of them broke the server,
+    returns how many there were
+    """
+    for (what, packet_type, payload), rate_limits in itertools.product(CRAFTED, (True, False)):
+        server = HeadlessServer(1)
+        server.rate_limits = rate_limits
+        with contextlib.redirect_stdout(io.StringIO()), counted_logs():
+            players = [Bot(server, (f"10.0.0.{i}", 1), (ProjectileType.LASER, ProjectileType.CLUSTER), random.Random(i))
+                       for i in range(2)]
+            for player in players:
+                player.connect()
+            server.step()
+
+            cluster = PayloadFormat.SHOOT.pack(0, 0, 0, 40, 40, ProjectileType.CLUSTER, players[1].id, 0)
+            try:
+                # the datagram arrives right before a blast, the tank boxes it measures span the rewind window
+                players[1]._send(PacketType.SHOOT, cluster)
+                server.step()
+                landing = min(proj.impact_time for proj in server.lobbed_projectiles.values())
+                while server.now + 2 / SIMULATION_TICK_RATE < landing:
+                    server.step()
+                players[0]._send(packet_type, payload)
+                players[1]._send(PacketType.SHOOT, cluster)
+                for _ in range(CRAFTED_SECONDS * SIMULATION_TICK_RATE):
+                    server.step()
+                server.metrics.render()
+            except Exception as e:
+                raise AssertionError(f"{what} broke the server") from e
+            assert not server.lobbed_projectiles, f"lobbed projectiles stopped landing after {what}"
+            assert all(map(math.isfinite, (proj.impact_time for proj in server.projectiles.values()))), \
+                f"{what} left a projectile that is never spent"
+            for conn in server.connections.values():
+                assert len(conn.commands) <= INPUT_MAX_LEAD, f"{what} left {len(conn.commands)} commands waiting"
+    return len(CRAFTED)
+
+
+def flood(server: HeadlessServer, attacker: Bot, rng: random.Random) -> None:
+    conn = server.connections.get(attacker.addr)
+    if conn is None or server.lifecycle_state != LifecycleType.PLAYING:
+        return
+
+    x, y = conn.position
+    for _ in range(FLOOD_SHOTS):
+        aim = rng.uniform(0, math.tau)
+        attacker._send(PacketType.SHOOT, PayloadFormat.SHOOT.pack(
+            0, x, y, math.cos(aim), math.sin(aim), ProjectileType.BULLET, attacker.id, 0))
+
+    for _ in range(FLOOD_GARBAGE):
+        address = (f"10.1.{rng.randrange(256)}.{rng.randrange(256)}", rng.randrange(1, 65536))
+        server.receive(rng.randbytes(Packet.HEADER_SIZE + 8), address)
+
+
+def run(rate_limits: bool, seconds: float = DURATION, seed: int = 1) -> dict[str, float]:
+    rng = random.Random(seed)
+    server = HeadlessServer(seed)
+    server.rate_limits = rate_limits
+    bots = [Bot(server, (f"10.0.0.{i}", 1), (ProjectileType.LASER, ProjectileType.BULLET), rng) for i in range(BOTS)]
+    attacker = Bot(server, ("10.0.0.99", 1), (ProjectileType.SNIPER, ProjectileType.SHOCKWAVE), rng)
+
+    ticks: list[float] = []
+    most_projectiles = 0
+    with contextlib.redirect_stdout(io.StringIO()), counted_logs() as handler:
+        for bot in bots + [attacker]:
+            bot.connect()
+
+        dt = 1 / SIMULATION_TICK_RATE
+        while server.now < seconds:
+            start = time.perf_counter()
+            for bot in bots:
+                bot.step(server.now, dt)
+            attacker.step(server.now, dt)
+            flood(server, attacker, rng)
+            server.step(dt)
+            ticks.append(time.perf_counter() - start)
+            most_projectiles = max(most_projectiles, len(server.projectiles) + len(server.lobbed_projectiles))
+
+    ticks.sort()
+    return {
+        "tick_mean": sum(ticks) / len(ticks),
+        "tick_p99": ticks[int(len(ticks) * .99)],
+        "projectiles_max": most_projectiles,
+        "dropped": sum(server.datagrams_dropped.values.values()),
+        "shots_rejected": sum(server.shots_rejected.values.values()),
+        "decode_errors": server.decode_errors[None],
+        "errors_logged": handler.records,
+    }
+
+
+def bench() -> dict[str, float]:
+    crafted()
+    limited = run(True, 10)
+    unlimited = run(False, 10)
+    return {
+        "flood.limited.tick_mean": limited["tick_mean"],
+        "flood.limited.tick_p99": limited["tick_p99"],
+        "flood.unlimited.tick_mean": unlimited["tick_mean"],
+        "flood.unlimited.tick_p99": unlimited["tick_p99"],
+    }
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else DURATION
+    print(f"{crafted()} crafted datagrams, the server kept running after each")
+    print(f"{BOTS} bots for {seconds:.0f} s, one player sending {FLOOD_SHOTS} SHOOT and {FLOOD_GARBAGE} garbage datagrams a tick")
+    print(f"{'':<10} {'tick mean':>10} {'tick p99':>10} {'projectiles':>12} {'dropped':>8} {'rejected':>9} {'bad':>7} {'logged':>7}")
+    for name, rate_limits in (("limited", True), ("unlimited", False)):
+        result = run(rate_limits, seconds)
+        print(f"{name:<10} {result['tick_mean'] * 1e3:8.2f}ms {result['tick_p99'] * 1e3:8.2f}ms {result['projectiles_max']:12.0f} "
+              f"{result['dropped']:8.0f} {result['shots_rejected']:9.0f} {result['decode_errors']:7.0f} {result['errors_logged']:7.0f}")
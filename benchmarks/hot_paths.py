@@ -0,0 +1,220 @@
+"""
+Microbenchmarks of the packet, simulation and render hot paths, seconds per call.
+
+Simulation paths run against a SimServer filled with connections and projectiles
+scattered over the arena, rebuilt before every repeat so projectiles that bounced out
+or hit somebody do not thin out the later runs.
+
+    python -m benchmarks.hot_paths
+"""
+import math
+import os
+import random
+import time
+
+from benchmarks import headless, measure
+
+headless()
+
+import pygame
+
+pygame.init()
+
+from arena import Arena
+from benchmarks.sim import SimServer
+from benchmarks.ui_draw import build_game
+from packet import Packet, PacketType, PayloadFormat
+from settings import SIMULATION_TICK_RATE
+from rendering import render_stack
+from shared import Projectile, ProjectileType
+
+PLAYERS = 8
+PROJECTILE_COUNTS = (100, 1000)
+MIXED_PROJECTILES = 2000
+LANDING_SHOCKWAVES = 50
+IDLE_PEERS = 5000
+TICKS = 30
+DT = 1 / SIMULATION_TICK_RATE
+
+
+def measure_ticks(build, step, ticks: int = TICKS, repeat: int = 3) -> float:
+    """
+    Best mean time per step over `repeat` freshly built fixtures
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        fixture = build()
+        start = time.perf_counter()
+        for _ in range(ticks):
+            step(fixture)
+        best = min(best, (time.perf_counter() - start) / ticks)
+    return best
+
+
+def build_server(players: int, projectiles: int, lobbed: float = 0, seed: int = 1) -> SimServer:
+    """
+    `lobbed` is the share of SHOCKWAVE and CLUSTER among the projectiles, the rest are direct shots
+    """
+    rng = random.Random(seed)
+    server = SimServer()
+    server.current_arena = 1
+    spawns = server.arena.spawn_positions
+    for i in range(players):
+        addr = (f"10.0.0.{i + 1}", 1)
+        server.connect(addr)
+        server.connections[addr].position = spawns[i % len(spawns)]
+
+    width, height = server.arena.width * server.arena_runtime.cell_width, server.arena.height * server.arena_runtime.cell_height
+    for i in range(projectiles):
+        if rng.random() < lobbed:
+            proj = Projectile(rng.choice([ProjectileType.SHOCKWAVE, ProjectileType.CLUSTER]))
+        else:
+            proj = Projectile(rng.choice([ProjectileType.LASER, ProjectileType.SNIPER, ProjectileType.BULLET]))
+        proj.id = i
+        proj.position = (rng.uniform(0, width), rng.uniform(0, height))
+        if proj.lobbed:
+            proj.velocity = (rng.uniform(0, width), rng.uniform(0, height))
+        else:
+            angle = rng.uniform(0, math.tau)
+            proj.velocity = (math.cos(angle), math.sin(angle))
+        proj.sender_id = 1 + i % players
+        server.add_projectile(proj, 0)
+    server._projectile_index = projectiles
+    return server
+
+
+def add_landing_shockwaves(server: SimServer, count: int, seed: int = 2) -> SimServer:
+    """
+    Shockwaves that land on the next tick, each right on top of an existing projectile
+    """
+    rng = random.Random(seed)
+    targets = rng.sample(list(server.projectiles.values()), count)
+    for target in targets:
+        proj = Projectile(ProjectileType.SHOCKWAVE)
+        proj.id = server._projectile_index
+        server._projectile_index += 1
+        proj.position = target.position
+        proj.velocity = target.position
+        proj.sender_id = 1
+        server.add_projectile(proj, 0)
+    return server
+
+
+def add_long_flights(server: SimServer, count: int, seed: int = 3) -> SimServer:
+    """
+    Lobbed projectiles that stay in the air for longer than a benchmark run
+    """
+    rng = random.Random(seed)
+    for _ in range(count):
+        proj = Projectile(rng.choice([ProjectileType.SHOCKWAVE, ProjectileType.CLUSTER]))
+        proj.id = server._projectile_index
+        server._projectile_index += 1
+        proj.position = (rng.uniform(0, 100), rng.uniform(0, 100))
+        proj.velocity = (proj.position[0] + 1000, proj.position[1] + 1000)
+        proj.sender_id = 1
+        server.add_projectile(proj, 0)
+    return server
+
+
+def step_projectiles(server: SimServer) -> None:
+    server.now += DT
+    server.update_projectiles(server.now)
+
+
+def bench_packets() -> dict[str, float]:
+    payload = b"".join(PayloadFormat.UPDATE.pack(i, 100., 200., 90., 45., 3, True, False) for i in range(PLAYERS))
+    packet = Packet(PacketType.UPDATE, 1, payload)
+    data = packet.serialize()
+    return {
+        "hot_paths.packet.serialize": measure(packet.serialize, 20000),
+        "hot_paths.packet.deserialize": measure(lambda: Packet.deserialize(data), 20000),
+        "hot_paths.packet.peek": measure(lambda: Packet.peek(data), 20000),
+    }
+
+
+def bench_simulation() -> dict[str, float]:
+    results = {}
+    server = build_server(PLAYERS, 0)
+    tick = [0.]
+
+    def send_updates():
+        tick[0] += 1 / 60
+        server.send_updates(tick[0])
+        server.flush_outboxes(tick[0])
+
+    results[f"hot_paths.send_updates.players{PLAYERS}"] = measure(send_updates, 2000)
+    server.check_lifecycle(0)
+    results[f"hot_paths.check_lifecycle.players{PLAYERS}"] = measure(lambda: server.check_lifecycle(tick[0]), 20000)
+
+    crowd = build_server(IDLE_PEERS, 0)
+    cleanup_tick = [0.]
+
+    def cleanup_stale_connections():
+        cleanup_tick[0] += 1 / 20
+        crowd.cleanup_stale_connections(cleanup_tick[0] % 1)
+
+    results[f"hot_paths.cleanup_stale_connections.peers{IDLE_PEERS}"] = measure(cleanup_stale_connections, 200)
+
+    # tracing a bounce path when a shot is fired
+    rng = random.Random(4)
+    shots = []
+    for _ in range(200):
+        angle = rng.uniform(0, math.tau)
+        proj = Projectile(ProjectileType.SNIPER)
+        proj.position = rng.choice(server.arena.spawn_positions)
+        proj.velocity = (math.cos(angle), math.sin(angle))
+        shots.append(proj)
+    shot = iter(shots * 20)
+    results["hot_paths.launch.sniper"] = measure(lambda: next(shot).launch(0, server.arena_runtime), 200)
+
+    for count in PROJECTILE_COUNTS:
+        results[f"hot_paths.update_projectiles.direct{count}"] = measure_ticks(
+            lambda: build_server(PLAYERS, count),
+            step_projectiles)
+        results[f"hot_paths.update_projectiles.lobbed{count}"] = measure_ticks(
+            lambda: build_server(PLAYERS, count, lobbed=1),
+            step_projectiles)
+        results[f"hot_paths.update_projectiles.in_flight{count}"] = measure_ticks(
+            lambda: add_long_flights(build_server(PLAYERS, 0), count),
+            step_projectiles)
+        results[f"hot_paths.check_tank_hit.projectiles{count}"] = measure_ticks(
+            lambda: build_server(PLAYERS, count),
+            lambda server: server.check_tank_hit(0))
+
+    def projectile_tick(server: SimServer) -> None:
+        step_projectiles(server)
+        server.check_tank_hit(server.now)
+
+    results[f"hot_paths.projectile_tick.mixed{MIXED_PROJECTILES}"] = measure_ticks(
+        lambda: build_server(PLAYERS, MIXED_PROJECTILES, lobbed=.1), projectile_tick)
+    results[f"hot_paths.projectile_tick.shockwaves{LANDING_SHOCKWAVES}_{MIXED_PROJECTILES}"] = measure_ticks(
+        lambda: add_landing_shockwaves(build_server(PLAYERS, MIXED_PROJECTILES), LANDING_SHOCKWAVES), projectile_tick, ticks=1, repeat=10)
+    return results
+
+
+def bench_render() -> dict[str, float]:
+    game = build_game()
+    sprites = game.player.sprites
+    surface = pygame.Surface((320, 180))
+    position = pygame.Vector2(160, 90)
+    rotation = [0]
+
+    def stack():
+        rotation[0] = (rotation[0] + 7) % 360
+        render_stack(surface, sprites, position, rotation[0])
+
+    arena_path = os.path.join("arenas", sorted(os.listdir("arenas"))[1])
+    return {
+        "hot_paths.arena.load": measure(lambda: Arena(arena_path), 200),
+        "hot_paths.render_stack.tank": measure(stack, 2000),
+        "hot_paths.draw_arena": measure(lambda: game.draw_arena(DT), 30),
+    }
+
+
+def bench() -> dict[str, float]:
+    return bench_packets() | bench_simulation() | bench_render()
+
+
+if __name__ == "__main__":
+    for name, seconds in bench().items():
+        print(f"{name:<44} {seconds * 1e6:10.2f} us")
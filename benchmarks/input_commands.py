@@ -0,0 +1,203 @@
+"""
+Traffic to the server and prediction error of input commands, against COORDINATES.
+
+Four clients drive a scripted session (idle, driving and turning, reversing, aiming while
+parked) with the shared Tank at 120 FPS. With COORDINATES they report where they ended up
+through PositionThrottle. With input commands they send INPUT through InputSender, predict
+with InputPrediction and the server moves their tanks. Datagrams both ways take LATENCY plus
+up to JITTER and a share of them is lost. Runs on a virtual clock.
+
+Reported per client are datagrams and bytes per second to the server, and for input commands
+how often a client had to replay its commands and how far off its prediction was when it did.
+The server placing each tank on its spawn costs one replay per client even without loss.
+
+    python -m benchmarks.input_commands [loss]
+"""
+import contextlib
+import heapq
+import io
+import math
+import random
+import sys
+
+from benchmarks.sim import SimServer
+from client import InputPrediction, InputSender, PositionThrottle
+from packet import SCHEMAS, Bundle, Packet, PacketType, PayloadFormat
+from reliability import ReliableChannel
+from settings import SIMULATION_TICK_RATE
+from shared import InputButton, Tank
+
+CLIENTS = 4
+CLIENT_FPS = 120
+DURATION = 60
+LATENCY = .03
+JITTER = .01
+LOSS = .02
+
+
+def script(t: float) -> tuple[int, tuple[float, float]]:
+    """
+    The buttons held and where the mouse is at `t` seconds into the session
+    """
+    cycle = t % 16
+    aim = (360., 240.)
+    if cycle < 3:
+        return 0, aim
+    if cycle < 8:
+        turn = InputButton.RIGHT if 4 <= cycle < 5 else InputButton.LEFT if 6 <= cycle < 6.5 else 0
+        return InputButton.FORWARD | turn, aim
+    if cycle < 9.5:
+        return InputButton.BACKWARD, aim
+    if cycle < 12:
+        sweep = math.radians((cycle - 9.5) * 90)
+        return 0, (360 + math.cos(sweep) * 200, 240 + math.sin(sweep) * 200)
+    return InputButton.FORWARD | InputButton.RIGHT, aim
+
+
+class Link:
+    """
+    Both directions between the clients and the server, datagrams wait in a heap until they arrive
+    """
+    def __init__(self, rng: random.Random, loss: float) -> None:
+        self.rng = rng
+        self.loss = loss
+        self.queue: list[tuple[float, int, object, bytes]] = []
+        self.order = 0
+
+    def send(self, now: float, destination: object, data: bytes) -> None:
+        if self.rng.random() < self.loss:
+            return
+        self.order += 1
+        heapq.heappush(self.queue, (now + LATENCY + self.rng.uniform(0, JITTER), self.order, destination, data))
+
+    def due(self, now: float):
+        while self.queue and self.queue[0][0] <= now:
+            yield heapq.heappop(self.queue)
+
+
+class ScriptedClient:
+    def __init__(self, server: SimServer, link: Link, index: int, input_commands: bool) -> None:
+        self.server = server
+        self.link = link
+        self.addr = (f"10.0.0.{index}", 1)
+        self.phase = index * 3.3
+        self.input_commands = input_commands
+        self.tank = Tank()
+        self.channel = ReliableChannel()
+        self.throttle = PositionThrottle()
+        self.sender = InputSender()
+        self.prediction = InputPrediction()
+        self.sequence_number = 0
+        self.sent_datagrams = 0
+        self.sent_bytes = 0
+        self.errors: list[float] = []  # how far off the prediction was, whenever the server disagreed
+
+        server.peers[self.addr] = self
+        self.id = server.connect(self.addr)
+        spawn_positions = server.arena.spawn_positions
+        self.tank.place(spawn_positions[index % len(spawn_positions)])
+
+    def send(self, now: float, packet_type: PacketType, payload: bytes) -> None:
+        self.sequence_number += 1
+        packet = self.channel.prepare(Packet(packet_type, self.sequence_number, payload), now)
+        packet.time = now
+        data = packet.serialize()
+        self.sent_datagrams += 1
+        self.sent_bytes += len(data)
+        self.link.send(now, self.server, (self.addr, data))
+
+    def deliver(self, data: bytes) -> None:
+        self.link.send(self.server.now, self, data)
+
+    def receive(self, now: float, data: bytes) -> None:
+        for message in Bundle.unpack(Packet.deserialize(data)):
+            for packet in self.channel.receive(message, now):
+                if packet.packet_type == PacketType.FORCE_MOVE:
+                    _, x, y, rotation, _ = SCHEMAS[PacketType.FORCE_MOVE].unpack(packet.payload)
+                    self.tank.place((x, y), rotation)
+                elif packet.packet_type == PacketType.INPUT_STATE:
+                    tick, *state = SCHEMAS[PacketType.INPUT_STATE].unpack(packet.payload)
+                    predicted = next((entry[2] for entry in self.prediction.history if entry[0] == tick), None)
+                    if self.prediction.reconcile(self.tank, tick, tuple(state), self.server.arena_runtime) and predicted:
+                        self.errors.append(math.dist(predicted[:2], state[:2]))
+
+    def frame(self, now: float, dt: float) -> None:
+        buttons, aim = script(now + self.phase)
+        x, y = self.tank.position
+        self.tank.barrel_rotation = math.degrees(math.atan2(-(aim[1] - y), aim[0] - x)) % 360
+
+        if self.input_commands:
+            for tick, bits in self.prediction.step(self.tank, buttons, self.server.arena_runtime, dt):
+                payload = self.sender.push(now, tick, bits)
+                if payload is not None:
+                    self.send(now, PacketType.INPUT, payload)
+        else:
+            self.tank.move(buttons, self.server.arena_runtime, dt)
+            x, y = self.tank.position
+            if self.throttle.should_send(now, x, y, self.tank.rotation, self.tank.barrel_rotation):
+                self.send(now, PacketType.COORDINATES, PayloadFormat.COORDINATES.pack(
+                    self.id, x, y, self.tank.rotation, self.tank.barrel_rotation))
+
+        if self.channel.needs_ack(now):
+            self.send(now, PacketType.ACK, b"")
+
+
+def run(input_commands: bool, loss: float = LOSS, seed: int = 1, bundling: bool = True) -> dict[str, float]:
+    rng = random.Random(seed)
+    server = SimServer()
+    server.bundling = bundling
+    link = Link(rng, loss)
+    with contextlib.redirect_stdout(io.StringIO()):
+        clients = [ScriptedClient(server, link, i, input_commands) for i in range(CLIENTS)]
+
+    frame_dt = 1 / CLIENT_FPS
+    server_dt = 1 / SIMULATION_TICK_RATE
+    for frame in range(DURATION * CLIENT_FPS):
+        now = frame * frame_dt
+        for _, _, destination, data in link.due(now):
+            if destination is server:
+                addr, datagram = data
+                server.receive(datagram, addr)
+            else:
+                destination.receive(now, data)
+
+        for client in clients:
+            client.frame(now, frame_dt)
+        while server.now + server_dt <= now + frame_dt / 2:
+            server.step(server_dt)
+
+    per_client = CLIENTS * DURATION
+    errors = [error for client in clients for error in client.errors]
+    return {
+        "datagrams_per_s": sum(client.sent_datagrams for client in clients) / per_client,
+        "bytes_per_s": sum(client.sent_bytes for client in clients) / per_client,
+        "replays_per_s": len(errors) / per_client,
+        "replay_error": sum(errors) / len(errors) if errors else 0,
+        "replay_error_max": max(errors, default=0),
+        # the other way, from the server
+        "received_datagrams_per_s": server.sent_datagrams / per_client,
+        "received_bytes_per_s": server.sent_bytes / per_client,
+    }
+
+
+def bench() -> dict[str, float]:
+    coordinates = run(False)
+    inputs = run(True)
+    return {
+        "input_commands.coordinates.datagrams_per_s": coordinates["datagrams_per_s"],
+        "input_commands.coordinates.bytes_per_s": coordinates["bytes_per_s"],
+        "input_commands.input.datagrams_per_s": inputs["datagrams_per_s"],
+        "input_commands.input.bytes_per_s": inputs["bytes_per_s"],
+        "input_commands.input.replays_per_s": inputs["replays_per_s"],
+        "input_commands.input.replay_error": inputs["replay_error"],
+    }
+
+
+if __name__ == "__main__":
+    loss = float(sys.argv[1]) if len(sys.argv) > 1 else LOSS
+    print(f"{CLIENTS} clients for {DURATION} s, {LATENCY * 1000:.0f} ms + {JITTER * 1000:.0f} ms jitter, {loss:.0%} loss, per client")
+    print(f"{'':<12} {'datagrams/s':>12} {'bytes/s':>8} {'replays/s':>10} {'mean error':>11} {'max error':>10}")
+    for name, input_commands in (("COORDINATES", False), ("INPUT", True)):
+        result = run(input_commands, loss)
+        print(f"{name:<12} {result['datagrams_per_s']:12.1f} {result['bytes_per_s']:8.0f} {result['replays_per_s']:10.2f} "
+              f"{result['replay_error']:9.2f}px {result['replay_error_max']:8.2f}px")
@@ -0,0 +1,122 @@
+"""
+Headless jitter and loss simulation for remote tank rendering.
+
+A tank drives a curved path on the server, which sends 20 Hz UPDATEs through a
+simulated link with latency, jitter, loss and reordering. The client renders at
+120 FPS, both with the old per-frame lerp and with InterpolationBuffer.
+Visual error is the distance between the drawn position and where the tank
+actually was at the moment the client is trying to show.
+
+    python -m benchmarks.interpolation_sim
+"""
+import math
+import random
+
+from interpolation import InterpolationBuffer, ServerClock
+from settings import INTERPOLATION_DELAY
+from shared import lerp
+
+SERVER_RATE = 20
+CLIENT_FPS = 120
+DURATION = 30
+CLOCK_OFFSET = 1234.5  # server and client clocks disagree
+
+
+def tank_position(t: float) -> tuple[float, float]:
+    return 360 + 200 * math.cos(t * .8), 240 + 150 * math.sin(t * 1.3)
+
+
+def simulate_link(latency: float, jitter: float, loss: float, rng: random.Random) -> list[tuple[float, int, float]]:
+    """
+    Returns (arrival local time, sequence number, server time) for every delivered UPDATE
+    """
+    arrivals = []
+    for sequence_number in range(int(DURATION * SERVER_RATE)):
+        server_time = sequence_number / SERVER_RATE
+        if rng.random() < loss:
+            continue
+        arrival = server_time + latency + rng.uniform(0, jitter)
+        arrivals.append((arrival - CLOCK_OFFSET, sequence_number, server_time))
+    arrivals.sort()
+    return arrivals
+
+
+def error_stats(errors: list[float]) -> tuple[float, float]:
+    errors = sorted(errors)
+    return sum(errors) / len(errors), errors[int(len(errors) * .99)]
+
+
+def run_legacy(arrivals, latency: float) -> tuple[float, float]:
+    # lerp(old_position, position, t), t += .2 per frame, reset on every UPDATE
+    old_position, position, t = None, None, 0.
+    errors = []
+    index = 0
+    for frame in range(DURATION * CLIENT_FPS):
+        now = frame / CLIENT_FPS - CLOCK_OFFSET
+        while index < len(arrivals) and arrivals[index][0] <= now:
+            _, _, server_time = arrivals[index]
+            old_position, position, t = position, tank_position(server_time), 0
+            index += 1
+        if position is None:
+            continue
+        if old_position:
+            drawn = lerp(old_position[0], position[0], t), lerp(old_position[1], position[1], t)
+            t = min(t + .2, 1)
+        else:
+            drawn = position
+        # the legacy path shows roughly one network delay plus the lerp time behind
+        shown_time = now + CLOCK_OFFSET - latency - 5 / CLIENT_FPS
+        truth = tank_position(shown_time)
+        errors.append(math.dist(drawn, truth))
+    return error_stats(errors)
+
+
+def run_buffered(arrivals) -> tuple[float, float]:
+    buffer = InterpolationBuffer()
+    clock = ServerClock()
+    errors = []
+    index = 0
+    for frame in range(DURATION * CLIENT_FPS):
+        now = frame / CLIENT_FPS - CLOCK_OFFSET
+        while index < len(arrivals) and arrivals[index][0] <= now:
+            arrival, sequence_number, server_time = arrivals[index]
+            clock.observe(server_time, arrival)
+            buffer.push(server_time, sequence_number, tank_position(server_time), 0)
+            index += 1
+        sample = buffer.sample(clock.server_time(now))
+        if sample is None:
+            continue
+        truth = tank_position(clock.server_time(now) - INTERPOLATION_DELAY)
+        errors.append(math.dist(sample[0], truth))
+    return error_stats(errors)
+
+
+SCENARIOS = [
+    ("lan", .005, .002, 0),
+    ("jitter 30ms", .04, .03, 0),
+    ("jitter 30ms, 5% loss", .04, .03, .05),
+    ("jitter 60ms, 20% loss", .08, .06, .2),
+]
+
+
+def run_scenarios(seed: int = 1) -> list[tuple[str, tuple[float, float], tuple[float, float]]]:
+    rows = []
+    for name, latency, jitter, loss in SCENARIOS:
+        arrivals = simulate_link(latency, jitter, loss, random.Random(seed))
+        rows.append((name, run_legacy(arrivals, latency), run_buffered(arrivals)))
+    return rows
+
+
+def bench() -> dict[str, float]:
+    results = {}
+    for name, legacy, buffered in run_scenarios():
+        key = name.replace(" ", "").replace(",", "_").replace("%", "pct")
+        results[f"interpolation.legacy.{key}.mean_px"], results[f"interpolation.legacy.{key}.p99_px"] = legacy
+        results[f"interpolation.buffer.{key}.mean_px"], results[f"interpolation.buffer.{key}.p99_px"] = buffered
+    return results
+
+
+if __name__ == "__main__":
+    print(f"{'scenario':<24} {'legacy mean/p99 px':>20} {'buffer mean/p99 px':>20}")
+    for name, legacy, buffered in run_scenarios():
+        print(f"{name:<24} {legacy[0]:9.2f} / {legacy[1]:7.2f}   {buffered[0]:9.2f} / {buffered[1]:7.2f}")
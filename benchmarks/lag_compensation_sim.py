@@ -0,0 +1,121 @@
+"""
+Hit registration accuracy under injected latency, with and without lag compensation.
+
+A target strafes on a LAN link while a shooter with a given round trip time fires
+sniper shots at where it sees the target (INTERPOLATION_DELAY plus one way latency
+behind). A shot "should" hit when it hits in the shooter's view. The server is driven
+on a virtual clock through handle_request and the simulation loop steps, accuracy
+is how often the server's verdict agrees with the shooter's.
+
+    python -m benchmarks.lag_compensation_sim
+"""
+import math
+import random
+
+from benchmarks.sim import SimServer
+from lag_compensation import PositionHistory
+from packet import Packet, PacketType, PayloadFormat
+from server import Server
+from settings import INTERPOLATION_DELAY, LAG_COMPENSATION_WINDOW, SIMULATION_TICK_RATE
+from shared import Projectile, ProjectileType, check_collision
+
+SHOOTER = ("10.0.0.1", 1)
+TARGET = ("10.0.0.2", 1)
+SHOTS = 200
+SHOT_INTERVAL = 1.5
+TARGET_Y = 60
+SHOOTER_Y = 420
+
+
+def target_position(t: float) -> tuple[float, float]:
+    return 220 + 80 * math.sin(t * 1.7) + 30 * math.sin(t * 4.1), TARGET_Y
+
+
+def shooter_sees_hit(server: Server, x: float, view_time: float, dt: float) -> bool:
+    proj = Projectile(ProjectileType.SNIPER)
+    proj.position = (x, SHOOTER_Y)
+    proj.velocity = (0, -1)
+    proj.launch(0, server.arena_runtime)
+    t = 0.
+    while proj.remaining_bounces and proj.position[1] > 0:
+        t += dt
+        proj.advance(t)
+        tx, ty = target_position(view_time + t)
+        if check_collision((proj.position[0], proj.position[1], 8, 8), (tx, ty, 16, 16)):
+            return True
+    return False
+
+
+def run(rtt: float, compensate: bool, seed: int = 1) -> float:
+    rng = random.Random(seed)
+    server = SimServer()
+    # a shot every SHOT_INTERVAL is more often than the sniper's cooldown allows
+    server.rate_limits = False
+    if not compensate:
+        server.position_history = PositionHistory(0, SIMULATION_TICK_RATE)
+
+    shooter_id = server.connect(SHOOTER)
+    target_id = server.connect(TARGET)
+    server.connections[SHOOTER].position = (600, SHOOTER_Y)
+
+    dt = 1 / SIMULATION_TICK_RATE
+    one_way = rtt / 2
+    pending: list[tuple[float, bytes]] = []  # arrival time, SHOOT datagram
+    expected: dict[int, bool] = {}
+    next_shot = 1.
+    shot = 0
+    tick = 0
+
+    while shot < SHOTS or pending or server.projectiles:
+        now = tick * dt
+        server.now = now
+
+        x, y = target_position(now)
+        server.handle_request(Packet(PacketType.COORDINATES, tick, PayloadFormat.COORDINATES.pack(
+            target_id, x, y, 0, 0)).serialize(), TARGET)
+
+        if shot < SHOTS and now >= next_shot:
+            view_time = now - one_way - INTERPOLATION_DELAY
+            seen_x, _ = target_position(view_time)
+            shot_x = seen_x + 4 + rng.uniform(-16, 16)
+            shot += 1
+            expected[shot] = shooter_sees_hit(server, shot_x, view_time, dt)
+
+            packet = Packet(PacketType.SHOOT, shot, PayloadFormat.SHOOT.pack(
+                0, shot_x, SHOOTER_Y, 0, -1, ProjectileType.SNIPER, shooter_id, shot))
+            packet.time = view_time
+            pending.append((now + one_way, packet.serialize()))
+            next_shot += SHOT_INTERVAL
+
+        for arrival, data in list(pending):
+            if arrival <= now:
+                pending.remove((arrival, data))
+                server.handle_request(data, SHOOTER)
+
+        server.record_positions(now)
+        server.update_projectiles(now)
+        server.check_tank_hit(now)
+        tick += 1
+
+    # projectile ids are handed out in shot order starting at 0
+    registered = {proj_id + 1 for proj_id, hit_id in server.hits if hit_id == target_id}
+    agree = sum(1 for s, hit in expected.items() if hit == (s in registered))
+    return agree / len(expected)
+
+
+LATENCIES = [0, .05, .1, .2, .3]
+
+
+def bench() -> dict[str, float]:
+    results = {}
+    for rtt in LATENCIES:
+        results[f"lag_compensation.off.rtt{int(rtt * 1000)}ms.accuracy"] = run(rtt, False)
+        results[f"lag_compensation.on.rtt{int(rtt * 1000)}ms.accuracy"] = run(rtt, True)
+    return results
+
+
+if __name__ == "__main__":
+    print(f"window {LAG_COMPENSATION_WINDOW * 1000:.0f} ms, interpolation delay {INTERPOLATION_DELAY * 1000:.0f} ms")
+    print(f"{'rtt':>8} {'uncompensated':>14} {'compensated':>12}")
+    for rtt in LATENCIES:
+        print(f"{rtt * 1000:6.0f}ms {run(rtt, False):13.1%} {run(rtt, True):12.1%}")
@@ -0,0 +1,191 @@
+"""
+Reliable channel over a lossy loopback proxy.
+
+Runs a real Server and Client on localhost with a UDP proxy between them that
+drops datagrams in both directions. The server broadcasts a burst of
+LIFECYCLE_CHANGE packets and we check that the client applies every one of
+them, in order.
+
+Two channel level checks run first: a peer numbering reliable packets far
+ahead cannot make a channel hold on to more than RELIABLE_RECEIVE_WINDOW of them, and
+packets after one the sender gave up on are still delivered.
+
+    python -m benchmarks.lossy_proxy [loss]
+"""
+import random
+import socket
+import sys
+import threading
+import time
+
+from client import Client
+from packet import Packet, PacketType, PayloadFormat
+from reliability import ReliableChannel
+from server import Server
+from settings import RELIABLE_GAP_TIMEOUT, RELIABLE_RECEIVE_WINDOW
+from shared import LifecycleType
+
+MESSAGES = 200
+TIMEOUT = 10
+FIRST_CONTEXT = 1000  # keeps our messages apart from real lifecycle changes
+
+
+class LossyProxy:
+    """
+    Forwards datagrams between one client and the server, dropping `loss` of them each way
+    """
+    def __init__(self, server_address: tuple[str, int], loss: float, seed: int = 1) -> None:
+        self.server_address = server_address
+        self.loss = loss
+        self.rng = random.Random(seed)
+        self.downstream = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.downstream.bind(("127.0.0.1", 0))
+        self.upstream = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.upstream.bind(("127.0.0.1", 0))
+        self.client_address: tuple[str, int] | None = None
+        self.forwarded = 0
+        self.dropped = 0
+
+    @property
+    def port(self) -> int:
+        return self.downstream.getsockname()[1]
+
+    def _forward(self, data: bytes, sock: socket.socket, address: tuple[str, int]) -> None:
+        if self.rng.random() < self.loss:
+            self.dropped += 1
+            return
+        self.forwarded += 1
+        sock.sendto(data, address)
+
+    def _client_to_server(self) -> None:
+        while True:
+            data, self.client_address = self.downstream.recvfrom(4096)
+            self._forward(data, self.upstream, self.server_address)
+
+    def _server_to_client(self) -> None:
+        while True:
+            data, _ = self.upstream.recvfrom(4096)
+            if self.client_address:
+                self._forward(data, self.downstream, self.client_address)
+
+    def start(self) -> None:
+        threading.Thread(target=self._client_to_server, daemon=True).start()
+        threading.Thread(target=self._server_to_client, daemon=True).start()
+
+
+class RecordingClient(Client):
+    def __init__(self) -> None:
+        super().__init__()
+        self.contexts: list[int] = []
+
+    def handle_lifecycle_change(self, state: LifecycleType, context: float) -> None:
+        if context >= FIRST_CONTEXT:
+            self.contexts.append(int(context) - FIRST_CONTEXT)
+        super().handle_lifecycle_change(state, context)
+
+
+def check_window(sent: int = 10000) -> int:
+    """
+    Reliable packets numbered far past the one we wait for, returns how many the channel held on to
+    """
+    channel = ReliableChannel()
+    for sequence_number in range(2, sent):
+        channel.receive(Packet(PacketType.HIT, sequence_number, PayloadFormat.HIT.pack(0, 0)), 0)
+    held = len(channel._buffered)
+    assert held <= RELIABLE_RECEIVE_WINDOW, f"{held} packets held back waiting for the first one"
+    return held
+
+
+def check_give_up(dt: float = .05) -> float:
+    """
+    The first of three reliable packets never arrives. Once its sender gives up, the other two
+    have to be delivered. Returns how long after the sender gave up that was
+    """
+    sender, receiver = ReliableChannel(), ReliableChannel()
+    sent = [sender.prepare(Packet(PacketType.HIT, 0, PayloadFormat.HIT.pack(i, 0)), 0) for i in range(3)]
+    delivered: list[Packet] = []
+    gave_up = None
+    now = 0.
+    while now < RELIABLE_GAP_TIMEOUT * 2 and len(delivered) < 2:
+        # acks both ways stand in for the rest of the traffic
+        for packet in sent + [sender.prepare(Packet(PacketType.ACK, 0, b""), now)]:
+            if packet.sequence_number != 1 or not packet.reliable:
+                delivered += receiver.receive(packet, now)
+        sender.receive(receiver.prepare(Packet(PacketType.ACK, 0, b""), now), now)
+
+        now += dt
+        sent = sender.retransmit(now)
+        if gave_up is None and 1 not in sender.pending:
+            gave_up = now
+
+    assert [PayloadFormat.HIT.unpack(packet.payload)[0] for packet in delivered] == [1, 2], "the gap was never skipped"
+    assert gave_up is not None and gave_up <= now, "skipped a packet the sender was still sending"
+    return now - gave_up
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def run(loss: float) -> dict[str, float]:
+    port = free_port()
+    server = Server()
+    threading.Thread(target=server.start, kwargs={"address": "127.0.0.1", "port": port, "metrics_port": 0}, daemon=True).start()
+
+    proxy = LossyProxy(("127.0.0.1", port), loss)
+    proxy.start()
+
+    client = RecordingClient()
+    client.port = proxy.port
+    client.start()
+    # CONNECT is not reliable, keep asking until we are onboarded
+    while not client.id:
+        client.connect("127.0.0.1")
+        for _ in range(10):
+            client.poll()
+            time.sleep(.01)
+
+    start = time.time()
+    for i in range(MESSAGES):
+        server.broadcast(Packet(PacketType.LIFECYCLE_CHANGE, 0, PayloadFormat.LIFECYCLE_CHANGE.pack(
+            LifecycleType.WAITING_ROOM, FIRST_CONTEXT + i)))
+
+    while len(client.contexts) < MESSAGES and time.time() - start < TIMEOUT:
+        client.poll()
+        client.send_position(0, 0, 0, 0)
+        time.sleep(1 / 120)
+    elapsed = time.time() - start
+
+    server.running = False
+    channel = server.channels[proxy.upstream.getsockname()]
+    return {
+        "delivered": len(client.contexts),
+        "in_order": client.contexts == list(range(len(client.contexts))),
+        "seconds": elapsed,
+        "retransmissions": channel.retransmissions,
+        "srtt_ms": (channel.srtt or 0) * 1000,
+        "dropped": proxy.dropped,
+    }
+
+
+def bench() -> dict[str, float]:
+    check_window()
+    check_give_up()
+    result = run(.3)
+    return {
+        "lossy_proxy.loss30pct.delivered": result["delivered"] / MESSAGES,
+        "lossy_proxy.loss30pct.in_order": float(result["in_order"]),
+        "lossy_proxy.loss30pct.seconds": result["seconds"],
+    }
+
+
+if __name__ == "__main__":
+    loss = float(sys.argv[1]) if len(sys.argv) > 1 else .3
+    print(f"{check_window()} far ahead reliable packets held back, at most {RELIABLE_RECEIVE_WINDOW}")
+    print(f"gap skipped {check_give_up():.2f} s after the sender gave up on it")
+    result = run(loss)
+    print(f"loss {loss:.0%} each way, {MESSAGES} LIFECYCLE_CHANGE broadcasts")
+    print(f"delivered {result['delivered']}/{MESSAGES} in order: {result['in_order']} in {result['seconds']:.2f} s")
+    print(f"server retransmissions {result['retransmissions']}, srtt {result['srtt_ms']:.1f} ms, proxy dropped {result['dropped']}")
@@ -0,0 +1,79 @@
+"""
+Full matches between scripted bots on a HeadlessServer, as fast as the CPU allows.
+
+Every match runs on its own virtual clock through the real lifecycle, from the waiting room
+until a bot reaches DECISIVE_SCORE. Matches are spread over a process pool, reported are
+matches per wall clock second, how much faster than real time the server ran and the win rate
+of each projectile type across loadouts.
+
+    python -m benchmarks.matches [count] [workers]
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from headless import run_match
+from shared import ProjectileType
+
+MATCHES = 32
+PLAYERS = 2
+
+
+def play(seed: int) -> dict:
+    with contextlib.redirect_stdout(io.StringIO()):
+        return run_match(seed, PLAYERS)
+
+
+def run(count: int = MATCHES, workers: int | None = None) -> tuple[list[dict], float]:
+    """
+    Results in seed order and the wall clock seconds it took
+    """
+    start = time.perf_counter()
+    if workers == 1:
+        results = [play(seed) for seed in range(count)]
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            results = list(pool.map(play, range(count), chunksize=max(1, count // (4 * (workers or os.cpu_count() or 1)))))
+    return results, time.perf_counter() - start
+
+
+def win_rates(results: list[dict]) -> dict[ProjectileType, tuple[int, int]]:
+    """
+    Matches won and played per projectile type in the winner's loadout
+    """
+    played, won = Counter(), Counter()
+    for result in results:
+        for i, loadout in enumerate(result["loadouts"]):
+            for projectile_type in loadout:
+                played[projectile_type] += 1
+                won[projectile_type] += result["winner"] == i
+    return {ProjectileType(t): (won[t], played[t]) for t in sorted(played)}
+
+
+def bench() -> dict[str, float]:
+    results, wall = run(8, 1)
+    simulated = sum(result["seconds"] for result in results)
+    return {
+        "matches.per_s": len(results) / wall,
+        "matches.speedup": simulated / wall,
+    }
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else MATCHES
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    results, wall = run(count, workers)
+
+    simulated = sum(result["seconds"] for result in results)
+    timeouts = sum(result["winner"] is None for result in results)
+    rounds = sum(result["rounds"] for result in results)
+    print(f"{count} matches of {PLAYERS} bots on {workers or os.cpu_count()} workers in {wall:.1f} s")
+    print(f"{count / wall:.2f} matches/s, {simulated / wall:.0f}x real time, "
+          f"{simulated / count:.0f} s and {rounds / count:.1f} rounds per match, {timeouts} timed out")
+    print(f"{'projectile':<10} {'won':>5} {'played':>7} {'win rate':>9}")
+    for projectile_type, (won, played) in win_rates(results).items():
+        print(f"{projectile_type.name.lower():<10} {won:5d} {played:7d} {won / played:9.1%}")
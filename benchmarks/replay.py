@@ -0,0 +1,76 @@
+"""
+Replays a match recorded with `server.py --record <file>` as fast as possible.
+
+Inbound datagrams go through Server.receive and the recorded update and
+simulation ticks are stepped on a virtual clock, in the order they were
+recorded. Reports how much faster than real time the server got through the
+match and compares what it sent with what the live server sent.
+
+    python -m benchmarks.replay match.rec [repeat]
+"""
+import contextlib
+import io
+import sys
+import time
+from collections import Counter
+
+from benchmarks.sim import SimServer
+from packet import Bundle, Packet, PacketType
+from recording import DT, SEED, Record, RecordType, read_recording
+
+
+def replay(records: list[Record]) -> SimServer:
+    server = SimServer()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for record in records:
+            server.now = record.time
+            match record.record_type:
+                case RecordType.SEED:
+                    server.random.seed(SEED.unpack(record.payload)[0])
+                case RecordType.INBOUND:
+                    server.receive(record.payload, record.address)
+                case RecordType.UPDATE_TICK:
+                    server.update_tick(record.time)
+                case RecordType.SIMULATION_TICK:
+                    server.simulation_tick(record.time, DT.unpack(record.payload)[0])
+    return server
+
+
+def run(path: str, repeat: int = 3) -> dict[str, float]:
+    records = list(read_recording(path))
+    ticks = [record for record in records if record.record_type in (RecordType.UPDATE_TICK, RecordType.SIMULATION_TICK)]
+    match_seconds = ticks[-1].time - ticks[0].time if ticks else 0
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        server = replay(records)
+        best = min(best, time.perf_counter() - start)
+
+    # messages, recordings from before bundling have one per datagram
+    recorded = Counter(message.packet_type
+                       for record in records if record.record_type == RecordType.OUTBOUND
+                       for message in Bundle.unpack(Packet.deserialize(record.payload)))
+    replayed = Counter(server.messages_sent.values)
+    return {
+        "records": len(records),
+        "inbound": sum(1 for record in records if record.record_type == RecordType.INBOUND),
+        "match_seconds": match_seconds,
+        "replay_seconds": best,
+        "speedup": match_seconds / best if best else 0,
+        "recorded_outbound": dict(recorded),
+        "replayed_outbound": dict(replayed),
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        raise SystemExit(__doc__)
+
+    result = run(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 3)
+    print(f"{result['records']} records, {result['inbound']} inbound datagrams, {result['match_seconds']:.1f} s of match")
+    print(f"replayed in {result['replay_seconds'] * 1000:.1f} ms, {result['speedup']:.0f}x real time")
+    print(f"{'outbound':<18} {'recorded':>9} {'replayed':>9}")
+    for packet_type in sorted(set(result["recorded_outbound"]) | set(result["replayed_outbound"])):
+        print(f"{PacketType(packet_type).name:<18} {result['recorded_outbound'].get(packet_type, 0):9} "
+              f"{result['replayed_outbound'].get(packet_type, 0):9}")
@@ -0,0 +1,148 @@
+"""
+Round trips every packet type through its schema and compares table dispatch with an if-chain.
+
+Every SCHEMAS and REQUEST_SCHEMAS entry is packed from sample values, bundled with the others,
+serialized and decoded again, the values have to come back unchanged and payloads a byte
+too short or too long have to be rejected.
+
+Dispatch is timed on a SimServer over the client packets of a real match in their usual mix,
+once through Server.handle_packet and once through an if-chain shaped like the one it replaced.
+Both end in handlers that do nothing, so only decoding and dispatch are measured.
+
+    python -m benchmarks.schemas
+"""
+import contextlib
+import io
+
+from benchmarks import measure
+from benchmarks.sim import SimServer
+from packet import REQUEST_SCHEMAS, SCHEMAS, Bundle, Packet, PacketType, PayloadFormat, Schema
+from settings import BUFF_SIZE
+
+SAMPLES = {"I": 7, "H": 11, "f": 1.5, "d": 2.25}
+RECORDS = 3
+# client packets that reach handle_packet per match, roughly
+MIX = [(PacketType.COORDINATES, 1032), (PacketType.SHOOT, 88), (PacketType.READY, 3)]
+
+
+def sample(schema: Schema, offset: int) -> tuple:
+    """
+    Distinct values for every field of a record
+    """
+    values = tuple(True if code == "?" else SAMPLES[code] + i + offset
+                   for i, code in enumerate(schema.struct.format.lstrip("@=<>!")))
+    return values + ((b"sample %d" % offset,) if schema.text else ())
+
+
+def broken(schema: Schema, payload: bytes) -> list[bytes]:
+    """
+    Payloads a byte short of the fixed fields or a byte more than fits
+    """
+    fixed = payload[:schema.size] if schema.text else payload
+    short = [fixed[:-1]] if fixed else []
+    return short + [fixed + bytes(Schema.MAX_TEXT + 1 if schema.text else 1)]
+
+
+def round_trip() -> int:
+    """
+    Checks every schema, returns how many messages made the trip
+    """
+    cases = [(packet_type, schema) for packet_type, schema in SCHEMAS.items()]
+    cases += [(packet_type, schema) for packet_type, schema in REQUEST_SCHEMAS.items() if schema is not SCHEMAS[packet_type]]
+
+    packets, expected = [], []
+    for offset, (packet_type, schema) in enumerate(cases):
+        if schema.repeated:
+            values = [sample(schema, offset + i) for i in range(RECORDS)]
+            payload = b"".join(schema.pack(*record) for record in values)
+        else:
+            values = sample(schema, offset)
+            payload = schema.pack(*values)
+
+        packets.append(Packet(packet_type, offset, payload))
+        expected.append((schema, values))
+
+        assert schema.unpack(payload) == values, f"{packet_type.name} came back as {schema.unpack(payload)}, not {values}"
+        for wrong in broken(schema, payload):
+            with contextlib.suppress(ValueError):
+                schema.unpack(wrong)
+                raise AssertionError(f"{packet_type.name} accepted a {len(wrong)} byte payload")
+
+    messages = []
+    for datagram in Bundle.pack(packets, 0, BUFF_SIZE):
+        messages += Bundle.unpack(Packet.deserialize(datagram.serialize()))
+    assert len(messages) == len(packets), f"{len(messages)} of {len(packets)} messages came back"
+    for message, packet, (schema, values) in zip(messages, packets, expected):
+        assert message.packet_type == packet.packet_type and message.sequence_number == packet.sequence_number
+        assert schema.unpack(message.payload) == values, f"{PacketType(message.packet_type).name} changed on the wire"
+    return len(messages)
+
+
+def if_chain(server: SimServer, packet: Packet, addr) -> None:
+    """
+    Server.handle_packet before the handler table
+    """
+    server.packets_handled.inc(packet.packet_type)
+
+    if packet.packet_type == PacketType.CONNECT:
+        server.handle_connect(packet, addr, packet.payload)
+
+    if packet.packet_type == PacketType.DISCONNECT:
+        server.handle_disconnect(packet, addr, packet.payload)
+
+    if addr not in server.connections:
+        return
+
+    if packet.packet_type == PacketType.COORDINATES:
+        server.handle_coordinates(packet, addr, *PayloadFormat.COORDINATES.unpack(packet.payload))
+
+    if packet.packet_type == PacketType.READY:
+        server.handle_ready(packet, addr, *PayloadFormat.READY.unpack(packet.payload))
+
+    if packet.packet_type == PacketType.SHOOT:
+        server.handle_shoot(packet, addr, *PayloadFormat.SHOOT.unpack(packet.payload))
+
+
+def build_dispatch() -> tuple[SimServer, list[Packet], tuple[str, int]]:
+    server = SimServer()
+    addr = ("10.0.0.1", 1)
+    with contextlib.redirect_stdout(io.StringIO()):
+        server.connect(addr)
+
+    noop = lambda *args: None
+    for packet_type in list(server.handlers):
+        server.handlers[packet_type] = noop
+    server.handle_connect = server.handle_disconnect = noop
+    server.handle_coordinates = server.handle_ready = server.handle_shoot = noop
+
+    packets = []
+    for packet_type, count in MIX:
+        schema = SCHEMAS[packet_type]
+        packets += [Packet(packet_type, i, schema.pack(*sample(schema, i))) for i in range(count)]
+    packets.sort(key=lambda packet: packet.sequence_number)
+    return server, packets, addr
+
+
+def bench() -> dict[str, float]:
+    server, packets, addr = build_dispatch()
+
+    def table():
+        for packet in packets:
+            server.handle_packet(packet, addr)
+
+    def chain():
+        for packet in packets:
+            if_chain(server, packet, addr)
+
+    messages = round_trip()
+    return {
+        "schemas.round_trip": measure(round_trip, 200) / messages,
+        "schemas.dispatch.table": measure(table, 50) / len(packets),
+        "schemas.dispatch.if_chain": measure(chain, 50) / len(packets),
+    }
+
+
+if __name__ == "__main__":
+    print(f"{round_trip()} messages round tripped, every schema rejects payloads of the wrong size")
+    for name, seconds in bench().items():
+        print(f"{name:<32} {seconds * 1e6:8.2f} us")
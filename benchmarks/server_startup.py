@@ -0,0 +1,59 @@
+"""
+Cold start of a dedicated server process: importing server.py and building a Server,
+measured in a fresh interpreter each time together with its peak RSS.
+
+The peak comes from VmHWM in /proc/self/status, so Linux only. ru_maxrss would not do, it
+carries over the peak of the process that forked the interpreter, here the benchmark suite.
+
+    python -m benchmarks.server_startup [runs]
+"""
+import json
+import subprocess
+import sys
+
+RUNS = 10
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import server
+server.Server()
+elapsed = time.perf_counter() - start
+with open("/proc/self/status") as status:
+    max_rss_kib = next(int(line.split()[1]) for line in status if line.startswith("VmHWM:"))
+print(json.dumps({
+    "seconds": elapsed,
+    "max_rss_kib": max_rss_kib,
+    "pygame": "pygame" in sys.modules,
+    "modules": len(sys.modules),
+}))
+"""
+
+
+def probe() -> dict:
+    output = subprocess.run([sys.executable, "-c", PROBE], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def run(runs: int = RUNS) -> dict[str, float]:
+    samples = [probe() for _ in range(runs)]
+    return {
+        "seconds": min(sample["seconds"] for sample in samples),
+        "max_rss_kib": min(sample["max_rss_kib"] for sample in samples),
+        "pygame": samples[0]["pygame"],
+        "modules": samples[0]["modules"],
+    }
+
+
+def bench() -> dict[str, float]:
+    result = run()
+    return {
+        "server_startup.seconds": result["seconds"],
+        "server_startup.max_rss_kib": result["max_rss_kib"],
+    }
+
+
+if __name__ == "__main__":
+    result = run(int(sys.argv[1]) if len(sys.argv) > 1 else RUNS)
+    print(f"import server + Server(): {result['seconds'] * 1000:.1f} ms, peak RSS {result['max_rss_kib'] / 1024:.1f} MiB, "
+          f"{result['modules']} modules loaded, pygame imported: {result['pygame']}")
@@ -0,0 +1,26 @@
+"""
+Helpers for driving a Server without a socket on a virtual clock
+"""
+import contextlib
+import io
+
+from headless import HeadlessServer
+from packet import Packet, PacketType
+
+
+class SimServer(HeadlessServer):
+    """
+    HeadlessServer that records hits
+    """
+    def __init__(self) -> None:
+        super().__init__()
+        self.hits: list[tuple[int, int]] = []
+
+    def send_hit(self, proj_id: int, hit_it: int):
+        self.hits.append((proj_id, hit_it))
+        super().send_hit(proj_id, hit_it)
+
+    def connect(self, addr: tuple[str, int]) -> int:
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.handle_request(Packet(PacketType.CONNECT, 0, b"sim").serialize(), addr)
+        return self.connections[addr].id
@@ -0,0 +1,84 @@
+"""
+Runs every benchmark's bench() and stores the results as JSON, for benchmarks.compare.
+
+    python -m benchmarks.suite [--output results.json] [--only hot_paths,ui_draw] [--replay match.rec]
+
+Recordings are not checked in, the replay benchmark only runs when one is given.
+"""
+import argparse
+import importlib
+import json
+import platform
+import subprocess
+import sys
+import time
+
+from benchmarks import headless
+
+headless()
+
+BENCHMARKS = [
+    "hot_paths",
+    "ui_draw",
+    "interpolation_sim",
+    "lag_compensation_sim",
+    "coordinates_rate",
+    "update_rate",
+    "bundling",
+    "schemas",
+    "input_commands",
+    "flood",
+    "matches",
+    "lossy_proxy",
+    "server_startup",
+]
+
+
+def commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run(names: list[str], replay: str | None = None) -> dict:
+    results: dict[str, float] = {}
+    durations: dict[str, float] = {}
+    for name in names:
+        start = time.perf_counter()
+        module = importlib.import_module(f"benchmarks.{name}")
+        results.update(module.bench())
+        durations[name] = time.perf_counter() - start
+        print(f"{name:<24} {len(results):4d} results {durations[name]:7.1f} s", file=sys.stderr)
+
+    if replay:
+        from benchmarks.replay import run as run_replay
+
+        start = time.perf_counter()
+        result = run_replay(replay)
+        results["replay.replay_seconds"] = result["replay_seconds"]
+        results["replay.speedup"] = result["speedup"]
+        durations["replay"] = time.perf_counter() - start
+
+    return {
+        "commit": commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "durations": durations,
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the benchmark suite")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--only", help="comma separated benchmark modules, defaults to all of them")
+    parser.add_argument("--replay", help="recording made with server.py --record")
+    args = parser.parse_args()
+
+    names = args.only.split(",") if args.only else BENCHMARKS
+    report = run(names, args.replay)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"{len(report['results'])} results written to {args.output}")
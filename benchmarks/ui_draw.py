@@ -0,0 +1,45 @@
+"""
+Microbenchmark of UI.draw cost per frame.
+
+    python -m benchmarks.ui_draw
+"""
+from benchmarks import headless, measure
+
+headless()
+
+import pygame
+
+pygame.init()
+
+from client import Player as ClientPlayer
+from main import Game
+from shared import LifecycleType
+
+
+def build_game() -> Game:
+    game = Game()
+    for i in range(1, 3):
+        player = ClientPlayer()
+        player.id = i
+        player.score = i
+        game.client.players[i] = player
+    game.shoot_cooldown = [0.02, 0.3]
+    return game
+
+
+def bench(iterations: int = 2000) -> dict[str, float]:
+    game = build_game()
+    players = list(game.client.players.values())
+    results = {}
+    for state in [LifecycleType.WAITING_ROOM, LifecycleType.PLAYING, LifecycleType.DONE]:
+        per_frame = measure(
+            lambda: game.ui.draw(players, state, 0, game),
+            iterations
+        )
+        results[f"ui_draw.{state.name.lower()}"] = per_frame
+    return results
+
+
+if __name__ == "__main__":
+    for name, seconds in bench().items():
+        print(f"{name:<28} {seconds * 1e6:8.1f} us/frame")
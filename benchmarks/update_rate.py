@@ -0,0 +1,144 @@
+"""
+UPDATE rate control against simulated links, fixed 20 Hz versus adaptive.
+
+Each link is a bottleneck queue: packets are serviced at `capacity` per second,
+the queue holds `buffer` packets and drops the rest, random loss and a base one way
+delay come on top. The server side runs LinkStats and SendRateController the way
+Server.send_updates and Server.send_pings do, the client side reports the UPDATE
+stream back in PONGs like Client.answer_ping. Runs on a virtual clock.
+
+Random loss is no congestion, on the lossy wifi link the adaptive rate has to
+deliver at least as much as the fixed one.
+
+    python -m benchmarks.update_rate
+"""
+import heapq
+import random
+from collections import deque
+
+from network_stats import LinkStats, SendRateController
+from settings import NETWORK_STATS_INTERVAL, UPDATE_MAX_RATE, UPDATE_MIN_RATE, UPDATE_RATE
+
+DURATION = 60
+WARMUP = 10  # seconds before we start measuring, the adaptive rate needs a few intervals to settle
+
+# name, capacity (packets/s), buffer (packets), random loss, one way delay
+LINKS = [
+    ("lan", 1000, 64, 0, .001),
+    ("broadband", 200, 32, .005, .02),
+    ("mobile", 15, 8, .02, .08),
+    ("lossy wifi", 200, 32, .1, .01),
+]
+
+
+class Bottleneck:
+    def __init__(self, capacity: float, buffer: int, loss: float, delay: float, rng: random.Random) -> None:
+        self.interval = 1 / capacity
+        self.buffer = buffer
+        self.loss = loss
+        self.delay = delay
+        self.rng = rng
+        self.queue: deque[float] = deque()  # departure times of queued packets
+
+    def send(self, now: float) -> float | None:
+        """
+        Arrival time at the far end, None if the packet is dropped
+        """
+        while self.queue and self.queue[0] <= now:
+            self.queue.popleft()
+
+        if len(self.queue) >= self.buffer or self.rng.random() < self.loss:
+            return None
+
+        departure = max(self.queue[-1] if self.queue else now, now) + self.interval
+        self.queue.append(departure)
+        return departure + self.delay
+
+
+def run(capacity: float, buffer: int, loss: float, delay: float, adaptive: bool, seed: int = 1) -> dict[str, float]:
+    rng = random.Random(seed)
+    downlink = Bottleneck(capacity, buffer, loss, delay, rng)
+    link = LinkStats()
+    rate = SendRateController(UPDATE_RATE)
+    downstream = LinkStats()
+
+    events: list[tuple[float, int, str, int, float]] = []  # arrival, order, kind, sequence number, sent time
+    order = 0
+    sequence_number = 1
+    sent = delivered = 0
+    transit = 0.
+    rates = []
+
+    dt = 1 / UPDATE_MAX_RATE
+    for tick in range(int(DURATION * UPDATE_MAX_RATE)):
+        now = tick * dt
+        measuring = now >= WARMUP
+
+        while events and events[0][0] <= now:
+            arrival, _, kind, number, sent_time = heapq.heappop(events)
+            if kind == "update":
+                downstream.on_packet(number, sent_time, arrival)
+                if sent_time >= WARMUP:
+                    delivered += 1
+                    transit += arrival - sent_time
+            elif kind == "ping":
+                downstream.close_interval(arrival)
+                # the uplink is not the bottleneck
+                if rng.random() >= loss:
+                    order += 1
+                    heapq.heappush(events, (arrival + delay, order, "pong", 0, sent_time))
+            else:
+                link.on_pong(sent_time, arrival)
+                link.peer_loss, link.peer_jitter, link.peer_queueing_delay = (
+                    downstream.loss, downstream.jitter, downstream.queueing_delay)
+
+        if rate.due(now):
+            arrival = downlink.send(now)
+            if measuring:
+                sent += 1
+                rates.append(rate.rate)
+            if arrival is not None:
+                order += 1
+                heapq.heappush(events, (arrival, order, "update", sequence_number, now))
+            sequence_number += 1
+
+        if link.ping_due(now):
+            link.close_interval(now)
+            if adaptive:
+                rate.adapt(link)
+            arrival = downlink.send(now)
+            if arrival is not None:
+                order += 1
+                heapq.heappush(events, (arrival, order, "ping", 0, now))
+
+    seconds = DURATION - WARMUP
+    return {
+        "sent_per_s": sent / seconds,
+        "delivered_per_s": delivered / seconds,
+        "loss": 1 - delivered / sent if sent else 0,
+        "latency_ms": transit / delivered * 1000 if delivered else 0,
+        "mean_rate": sum(rates) / len(rates) if rates else 0,
+    }
+
+
+def bench() -> dict[str, float]:
+    results = {}
+    for name, *link in LINKS:
+        for mode, adaptive in (("fixed", False), ("adaptive", True)):
+            for metric, value in run(*link, adaptive).items():
+                results[f"update_rate.{name.replace(' ', '_')}.{mode}.{metric}"] = value
+
+    fixed, adaptive = (results[f"update_rate.lossy_wifi.{mode}.delivered_per_s"] for mode in ("fixed", "adaptive"))
+    assert adaptive >= fixed, f"the adaptive rate backed off from random loss, {adaptive:.1f}/s against {fixed:.1f}/s fixed"
+    return results
+
+
+if __name__ == "__main__":
+    print(f"{DURATION} s per link, measured after {WARMUP} s, rate limits {UPDATE_MIN_RATE}-{UPDATE_MAX_RATE} Hz, "
+          f"adapted every {NETWORK_STATS_INTERVAL} s")
+    print(f"{'':<12} {'':<9} {'sent/s':>7} {'recv/s':>7} {'loss':>6} {'latency':>9}")
+    for name, *link in LINKS:
+        for mode, adaptive in (("fixed", False), ("adaptive", True)):
+            result = run(*link, adaptive)
+            print(f"{name:<12} {mode:<9} {result['sent_per_s']:7.1f} {result['delivered_per_s']:7.1f} "
+                  f"{result['loss']:6.1%} {result['latency_ms']:7.1f}ms")
@@ -0,0 +1,88 @@
+from __future__ import annotations
+import math
+from typing import Generic, TypeVar
+
+from settings import BROADPHASE_CELL_SIZE, BROADPHASE_MAX_CELLS
+
+T = TypeVar("T")
+
+
+class SpatialGrid(Generic[T]):
+    """
+    Uniform grid broadphase, rebuilt every tick.
+
+    Items are inserted with a bounding box and bucketed into every cell it overlaps.
+    Queries return every item sharing a cell with the query box, in insertion order and without duplicates.
+    That is a superset of what actually overlaps, callers still do the exact test.
+    Boxes and points that are not finite have no cell, they are left out and never found.
+    Boxes over more than BROADPHASE_MAX_CELLS cells are kept aside and returned by every query
+    """
+    def __init__(self, cell_size: float = BROADPHASE_CELL_SIZE) -> None:
+        self.cell_size = cell_size
+        self.items: list[T] = []
+        self.cells: dict[tuple[int, int], list[int]] = {}
+        self.oversized: list[int] = []
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def clear(self) -> None:
+        self.items.clear()
+        self.cells.clear()
+        self.oversized.clear()
+
+    def insert(self, item: T, x: float, y: float, w: float = 0, h: float = 0) -> None:
+        if not (math.isfinite(x + w) and math.isfinite(y + h)):
+            return
+
+        index = len(self.items)
+        self.items.append(item)
+
+        size = self.cell_size
+        first_col, last_col = int(x // size), int((x + w) // size)
+        first_row, last_row = int(y // size), int((y + h) // size)
+        if (last_col - first_col + 1) * (last_row - first_row + 1) > BROADPHASE_MAX_CELLS:
+            self.oversized.append(index)
+            return
+
+        for row in range(first_row, last_row + 1):
+            for col in range(first_col, last_col + 1):
+                self.cells.setdefault((col, row), []).append(index)
+
+    def insert_point(self, item: T, x: float, y: float) -> None:
+        if not (math.isfinite(x) and math.isfinite(y)):
+            return
+
+        size = self.cell_size
+        cell = (int(x // size), int(y // size))
+        bucket = self.cells.get(cell)
+        if bucket is None:
+            self.cells[cell] = [len(self.items)]
+        else:
+            bucket.append(len(self.items))
+        self.items.append(item)
+
+    def query_rect(self, x: float, y: float, w: float, h: float) -> list[T]:
+        if not (math.isfinite(x + w) and math.isfinite(y + h)):
+            return []
+
+        size = self.cell_size
+        first_col, last_col = int(x // size), int((x + w) // size)
+        first_row, last_row = int(y // size), int((y + h) // size)
+        found: list[int] = self.oversized.copy()
+        if (last_col - first_col + 1) * (last_row - first_row + 1) > len(self.cells):
+            # a box wider than everything in the grid, the occupied cells are fewer to look at
+            for (col, row), bucket in self.cells.items():
+                if first_col <= col <= last_col and first_row <= row <= last_row:
+                    found.extend(bucket)
+        else:
+            for row in range(first_row, last_row + 1):
+                for col in range(first_col, last_col + 1):
+                    found.extend(self.cells.get((col, row), ()))
+
+        if len(found) > 1:
+            found = sorted(set(found))
+        return [self.items[index] for index in found]
+
+    def query_radius(self, x: float, y: float, radius: float) -> list[T]:
+        return self.query_rect(x - radius, y - radius, radius * 2, radius * 2)
@@ -1,12 +1,35 @@
+from collections import deque
 from enum import IntEnum, auto
+import itertools
+import math
 import time
 import socket
 import logging
 import threading
 
-from packet import Packet, PacketType, PayloadFormat
-from settings import BUFF_SIZE, WAITING_ROOM_ID
-from shared import LifecycleType, OnboardType, Projectile, ProjectileType
+from arena import ArenaRuntime
+from interpolation import InterpolationBuffer, ServerClock
+from network_stats import LinkStats
+from packet import SCHEMAS, Bundle, Packet, PacketType, PayloadFormat
+from reliability import ReliableChannel
+from scheduler import EventScheduler
+from settings import (
+    BUFF_SIZE,
+    COORDINATES_KEEPALIVE,
+    COORDINATES_SEND_RATE,
+    INPUT_HISTORY,
+    INPUT_REDUNDANCY,
+    INPUT_SEND_RATE,
+    INPUT_TICK_RATE,
+    INTERPOLATION_DELAY,
+    POSITION_SEND_THRESHOLD,
+    PREDICTION_TIMEOUT,
+    RECONCILE_THRESHOLD,
+    ROTATION_SEND_THRESHOLD,
+    SNAPSHOT_BUFFER_SIZE,
+    WAITING_ROOM_ID,
+)
+from shared import BUTTON_BITS, LifecycleType, OnboardType, Projectile, ProjectileType, Tank, pack_input, unpack_input
 
 
 LOGGER = logging.getLogger("Client")
@@ -17,6 +40,7 @@ class EventType(IntEnum):
     HIT = auto()
     RESSURECT = auto()
     WINNER = auto()
+    RECONCILE = auto()
 
 
 class Event:
@@ -24,17 +48,27 @@ class Event:
         self.event_type: EventType
         self.data: tuple
 
+class Snapshot:
+    """
+    Decoded UPDATE packet, built on the receive worker and applied by Client.poll
+    """
+    def __init__(self, sequence_number: int, time: float, received: float, players: list[tuple]) -> None:
+        self.sequence_number = sequence_number
+        self.time = time
+        self.received = received
+        self.players = players
+
+
 class Player:
     def __init__(self) -> None:
         # used for interpolation
-        self.old_position: tuple[float, float] | None = None
+        self.buffer = InterpolationBuffer()
         self.position: tuple[float, float] = (0, 0)
         self.rotation = 0
         self.barrel_rotation: float = 0
         self.id = 0
         self.name = ""
         self.score = 0
-        self.interpolation_t: float = 0
         self.alive = True
         self.ready = False
         self.has_crown = False
@@ -43,20 +77,182 @@ class Player:
         return f"<Player {self.name}, {self.position}, {self.score}>"
 
 
+class PositionThrottle:
+    """
+    Decides when our position is worth sending.
+    At most `rate` times a second and only when something moved past the thresholds,
+    with a keepalive so the server does not consider us stale
+    """
+    def __init__(self, rate: float = COORDINATES_SEND_RATE, position_threshold: float = POSITION_SEND_THRESHOLD,
+                 rotation_threshold: float = ROTATION_SEND_THRESHOLD, keepalive: float = COORDINATES_KEEPALIVE) -> None:
+        self.interval = 1 / rate
+        self.position_threshold = position_threshold
+        self.rotation_threshold = rotation_threshold
+        self.keepalive = keepalive
+        self.last_time = float("-inf")
+        self.last_sent: tuple[float, float, float, float] | None = None
+
+    def should_send(self, now: float, x: float, y: float, rotation: float, barrel_rotation: float) -> bool:
+        elapsed = now - self.last_time
+        if elapsed < self.interval:
+            return False
+
+        if self.last_sent is not None and elapsed < self.keepalive:
+            last_x, last_y, last_rotation, last_barrel_rotation = self.last_sent
+            moved = abs(x - last_x) >= self.position_threshold or abs(y - last_y) >= self.position_threshold
+            turned = (abs(rotation - last_rotation) >= self.rotation_threshold
+                      or abs(barrel_rotation - last_barrel_rotation) >= self.rotation_threshold)
+            if not moved and not turned:
+                return False
+
+        self.last_time = now
+        self.last_sent = (x, y, rotation, barrel_rotation)
+        return True
+
+
+class InputSender:
+    """
+    Decides when our input commands are worth sending and what goes in the INPUT.
+    Only changes are sent, a new button right away and a turned barrel at most `rate` times a second,
+    with a keepalive. Each INPUT repeats the latest `redundancy` changes in case one was lost
+    and ends with the current tick, so the server knows how far along we are
+    """
+    def __init__(self, rate: float = INPUT_SEND_RATE, keepalive: float = COORDINATES_KEEPALIVE,
+                 redundancy: int = INPUT_REDUNDANCY) -> None:
+        self.interval = 1 / rate
+        self.keepalive = keepalive
+        self.changes: deque[tuple[int, int]] = deque(maxlen=redundancy)  # (tick, bits)
+        self.changed = False
+        self.last_time = float("-inf")
+
+    def push(self, now: float, tick: int, bits: int) -> bytes | None:
+        """
+        The INPUT payload to send for this tick's command, None if it can wait
+        """
+        urgent = False
+        if not self.changes or self.changes[-1][1] != bits:
+            button_mask = (1 << BUTTON_BITS) - 1
+            urgent = not self.changes or (self.changes[-1][1] ^ bits) & button_mask != 0
+            self.changes.append((tick, bits))
+            self.changed = True
+
+        elapsed = now - self.last_time
+        if not urgent and (elapsed < self.interval or (not self.changed and elapsed < self.keepalive)):
+            return None
+
+        self.last_time = now
+        self.changed = False
+        commands = list(self.changes)
+        if commands[-1][0] != tick:
+            commands.append((tick, bits))
+        return b"".join(PayloadFormat.INPUT.pack(*command) for command in commands)
+
+
+class InputPrediction:
+    """
+    Our side of input commands. Our tank moves in fixed ticks of 1 / INPUT_TICK_RATE right away,
+    the server steps its copy through the same commands once they arrive, see Server.move_tanks.
+    The state after every tick is kept until the server tells us where it had the tank after it
+    """
+    def __init__(self, history: int = INPUT_HISTORY, threshold: float = RECONCILE_THRESHOLD) -> None:
+        self.tick = 0
+        self.time = 0.
+        self.step_time = 1 / INPUT_TICK_RATE
+        self.threshold = threshold
+        self.history: deque[tuple[int, int, tuple]] = deque(maxlen=history)  # tick, command, state after it
+        self.replays = 0
+
+    def step(self, tank: Tank, buttons: int, arena_runtime: ArenaRuntime, dt: float, moving: bool = True) -> list[tuple[int, int]]:
+        """
+        Moves the tank through the ticks that passed in `dt`, returns their (tick, command) to send
+        """
+        commands = []
+        self.time += dt
+        while self.time >= self.step_time:
+            self.time -= self.step_time
+            self.tick += 1
+            bits = pack_input(buttons, tank.barrel_rotation)
+            if moving:
+                tank.move(buttons, arena_runtime, self.step_time)
+            self.history.append((self.tick, bits, tank.state()))
+            commands.append((self.tick, bits))
+        return commands
+
+    def reconcile(self, tank: Tank, tick: int, state: tuple, arena_runtime: ArenaRuntime, moving: bool = True) -> bool:
+        """
+        If we predicted the tank anywhere else than the server had it after `tick`,
+        starts over from the server's state and replays the commands since. True if it did
+        """
+        while self.history and self.history[0][0] < tick:
+            self.history.popleft()
+        if not self.history or self.history[0][0] != tick:
+            return False
+
+        predicted = self.history[0][2]
+        if all(abs(ours - theirs) <= self.threshold for ours, theirs in zip(predicted[:3], state[:3])):
+            return False
+
+        self.replays += 1
+        tank.restore(state)
+        replayed: deque[tuple[int, int, tuple]] = deque(maxlen=self.history.maxlen)
+        for i, (tick, bits, _) in enumerate(self.history):
+            if i and moving:
+                tank.move(unpack_input(bits)[0], arena_runtime, self.step_time)
+            replayed.append((tick, bits, tank.state()))
+        self.history = replayed
+        return True
+
+
 class Client:
     def __init__(self) -> None:
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.address: str = "127.0.0.1"
         self.port: int = 30000
-        self._sequence_number = 0
+        # next() on a count is atomic, the receive worker sends PONGs as well
+        self._sequence_numbers = itertools.count()
         self.players: dict[int, Player] = {}
         self.projectiles: list[Projectile] = []
+        # landings of lobbed projectiles, on the time.time() clock, see due_impacts
+        self.impacts: EventScheduler[Projectile] = EventScheduler()
+        # own projectiles waiting for the server's SHOOT broadcast, keyed by local id
+        self.predicted_projectiles: dict[int, tuple[Projectile, float]] = {}
+        self._local_projectile_index = 0
         self.id = 0
         self.running = False
         self.current_arena = 0
         self.spectating = False
-
-        self.event_queue: list[Event] = []
+        self.clock = ServerClock()
+        self.position_throttle = PositionThrottle()
+        self.input_sender = InputSender()
+        self.channel = ReliableChannel()
+        # our link as measured by the server, refreshed by every PING
+        self.rtt: float | None = None
+        self.jitter: float = 0
+        self.loss: float = 0
+        # the UPDATE stream as we see it, reported back in PONGs
+        self.downstream = LinkStats()
+
+        # written by the receive worker, drained by poll on the render thread
+        self.snapshots: deque[Snapshot] = deque(maxlen=SNAPSHOT_BUFFER_SIZE)
+        self.inbox: deque[tuple[PacketType, tuple]] = deque()  # decoded fields, see handlers
+        # handled on the receive worker as soon as they arrive
+        self.receivers = {
+            PacketType.UPDATE: self.receive_update,
+            PacketType.PING: self.answer_ping,
+        }
+        # applied by poll, they get the fields of the packet type's schema
+        self.handlers = {
+            PacketType.ONBOARD: self.handle_onboard,
+            PacketType.DISCONNECT: self.handle_disconnect,
+            PacketType.LIFECYCLE_CHANGE: self.handle_lifecycle_change,
+            PacketType.FORCE_MOVE: self.handle_force_move,
+            PacketType.HIT: self.handle_hit,
+            PacketType.SHOOT: self.handle_shoot,
+            PacketType.SHOOT_REJECTED: self.handle_shoot_rejected,
+            PacketType.INPUT_STATE: self.handle_input_state,
+        }
+
+        self.event_queue: deque[Event] = deque()
         self.lifecycle_state: LifecycleType = LifecycleType.WAITING_ROOM
         self.lifecycle_context: float = 0
 
@@ -64,22 +260,27 @@ class Client:
         for player in self.players.values():
             # Resurrecting all players
             player.alive = True
+            # arena changes teleport everyone, don't interpolate across it
+            player.buffer.clear()
 
         self.projectiles.clear()
+        self.impacts.clear()
+
+    def server_time(self) -> float:
+        return self.clock.server_time(time.time())
 
     @property
     def sequence_number(self):
         """
         getting this property increments sequence_number
         """
-        n = self._sequence_number
-        self._sequence_number += 1
-        return n
+        return next(self._sequence_numbers)
 
     def _send(self, data: bytes) -> None:
         self.sock.sendto(data, (self.address, self.port))
 
     def _send_packet(self, packet: Packet) -> None:
+        packet = self.channel.prepare(packet, time.time())
         self._send(packet.serialize())
 
     def connect(self, address: str) -> None:
@@ -89,8 +290,8 @@ class Client:
         self._send_packet(packet)
 
     def disconnect(self) -> None:
-        packet = Packet(PacketType.DISCONNECT,
-                        self.sequence_number, b"disconnecting!")
+        # numbered by the reliable channel
+        packet = Packet(PacketType.DISCONNECT, 0, b"disconnecting!")
         self._send_packet(packet)
         self.running = False
 
@@ -99,23 +300,20 @@ class Client:
                         self.sequence_number, PayloadFormat.READY.pack(ready))
         self._send_packet(packet)
 
-    def handle_update_packet(self, packet: Packet) -> None:
-        size = PayloadFormat.UPDATE.size
-        player_count = len(packet.payload) // size
-
-        for i in range(player_count):
-            data = packet.payload[i * size: size + size * i]
-            id, x, y, rotation, barrel_rotation, score, ready, has_crown = PayloadFormat.UPDATE.unpack(data)
+    def decode_update_packet(self, packet: Packet) -> Snapshot:
+        players = SCHEMAS[PacketType.UPDATE].unpack(packet.payload)
+        return Snapshot(packet.sequence_number, packet.time, time.time(), players)
 
-            buff = self.players.copy()
-            if id in buff.keys():
-                player = buff[id]
-                player.old_position = player.position
-                player.position = (x, y)
-                player.interpolation_t = 0
+    def apply_snapshot(self, snapshot: Snapshot) -> None:
+        self.clock.observe(snapshot.time, snapshot.received)
+        for id, x, y, rotation, barrel_rotation, score, ready, has_crown in snapshot.players:
+            if id in self.players:
+                player = self.players[id]
             else:
                 player = Player()
-                player.position = (x, y)
+
+            player.position = (x, y)
+            player.buffer.push(snapshot.time, snapshot.sequence_number, (x, y), rotation)
 
             player.score = score
             player.id = id
@@ -161,71 +359,136 @@ class Client:
             self.reset()
 
     def handle_response(self, data: bytes, addr) -> None:
+        """
+        Runs on the receive worker, only decodes and queues. State is applied by poll
+        """
         LOGGER.debug("handling data: %s from %s", data, addr)
         try:
-            packet = Packet.deserialize(data)
+            messages = Bundle.unpack(Packet.deserialize(data))
         except ValueError as e:
             LOGGER.error(e)
             return
 
-        if packet.packet_type == PacketType.UPDATE:
-            self.handle_update_packet(packet)
-
-        if packet.packet_type == PacketType.ONBOARD:
-            onboard_type, data = PayloadFormat.ONBOARD.unpack(packet.payload)
-            onboard_type = OnboardType(onboard_type)
-            if onboard_type == OnboardType.PLAY:
-                self.id = data
-                self.spectating = False
-            else:  #if onboard_type == OnboardType.SPECTATE
-                self.id = 0
-                self.spectating = True
-                self.current_arena = data
-
-        if packet.packet_type == PacketType.DISCONNECT:
-            player_id, = PayloadFormat.DISCONNECT.unpack(packet.payload)
-            if player_id in self.players.keys():
-                del self.players[player_id]
-
-        if packet.packet_type == PacketType.LIFECYCLE_CHANGE:
-            state, context = PayloadFormat.LIFECYCLE_CHANGE.unpack(
-                packet.payload)
-            self.handle_lifecycle_change(state, context)
-
-        if packet.packet_type == PacketType.FORCE_MOVE:
-            id, x, y, rotation, barrel_rotation = PayloadFormat.COORDINATES.unpack(packet.payload)
-            event = Event()
-            event.event_type = EventType.FORCE_MOVE
-            event.data = (x, y, rotation, barrel_rotation)
-            self.event_queue.append(event)
+        for message in messages:
+            # the channel has taken and will ack these, one we cannot decode must not cost the others
+            for packet in self.channel.receive(message, time.time()):
+                try:
+                    self.receive_packet(packet)
+                except ValueError as e:
+                    LOGGER.error(e)
+
+    def receive_packet(self, packet: Packet) -> None:
+        receiver = self.receivers.get(packet.packet_type)
+        if receiver is not None:
+            receiver(packet)
+        elif packet.packet_type in self.handlers:
+            self.inbox.append((packet.packet_type, SCHEMAS[packet.packet_type].unpack(packet.payload)))
+
+    def receive_update(self, packet: Packet) -> None:
+        self.downstream.on_packet(packet.sequence_number, packet.time, time.time())
+        self.snapshots.append(self.decode_update_packet(packet))
+
+    def answer_ping(self, packet: Packet) -> None:
+        """
+        Echoes the PING time right away, waiting for poll would add up to a frame to the RTT
+        """
+        rtt, self.jitter, self.loss = SCHEMAS[PacketType.PING].unpack(packet.payload)
+        self.rtt = rtt or None
 
-        if packet.packet_type == PacketType.HIT:
-            proj_id, hit_id = PayloadFormat.HIT.unpack(packet.payload)
-            if hit_id not in self.players.keys():
-                return
+        self.downstream.close_interval(time.time())
+        pong = Packet(PacketType.PONG, self.sequence_number, PayloadFormat.PONG.pack(
+            self.downstream.loss, self.downstream.jitter, self.downstream.queueing_delay))
+        pong.time = packet.time
+        self._send_packet(pong)
 
-            self.players[hit_id].alive = self.lifecycle_state in [LifecycleType.WAITING_ROOM, LifecycleType.STARTING]
-            event = Event()
-            event.event_type = EventType.HIT
-            event.data = (proj_id, hit_id)
-            self.event_queue.append(event)
+    def poll(self) -> None:
+        """
+        Applies everything received since the last call and services the reliable channel.
+        Called once per frame from the render loop so game state is only mutated on that thread
+        """
+        while self.snapshots:
+            self.apply_snapshot(self.snapshots.popleft())
+
+        while self.inbox:
+            self.apply_packet(*self.inbox.popleft())
+
+        now = time.time()
+        self.expire_predictions(now)
+
+        for packet in self.channel.retransmit(now):
+            self._send(packet.serialize())
+        if self.channel.needs_ack(now):
+            self._send_packet(Packet(PacketType.ACK, self.sequence_number, b""))
+
+    def apply_packet(self, packet_type: PacketType, fields: tuple) -> None:
+        self.handlers[packet_type](*fields)
+
+    def handle_onboard(self, onboard_type: int, data: int) -> None:
+        if OnboardType(onboard_type) == OnboardType.PLAY:
+            self.id = data
+            self.spectating = False
+        else:  #if onboard_type == OnboardType.SPECTATE
+            self.id = 0
+            self.spectating = True
+            self.current_arena = data
+
+    def handle_disconnect(self, player_id: int) -> None:
+        if player_id in self.players.keys():
+            del self.players[player_id]
+
+    def handle_force_move(self, id: int, x: float, y: float, rotation: float, barrel_rotation: float) -> None:
+        event = Event()
+        event.event_type = EventType.FORCE_MOVE
+        event.data = (x, y, rotation, barrel_rotation)
+        self.event_queue.append(event)
+
+    def handle_hit(self, proj_id: int, hit_id: int) -> None:
+        if hit_id not in self.players.keys():
+            return
+
+        self.players[hit_id].alive = self.lifecycle_state in [LifecycleType.WAITING_ROOM, LifecycleType.STARTING]
+        event = Event()
+        event.event_type = EventType.HIT
+        event.data = (proj_id, hit_id)
+        self.event_queue.append(event)
+
+    def handle_shoot(self, id: int, x_pos: float, y_pos: float, x_vel: float, y_vel: float,
+                     projectile_type: int, sender_id: int, local_id: int) -> None:
+        if sender_id == self.id and local_id in self.predicted_projectiles:
+            proj, _ = self.predicted_projectiles.pop(local_id)
+            if proj in self.projectiles:
+                self.reconcile_projectile(proj, id, (x_pos, y_pos), (x_vel, y_vel))
+            return
+
+        proj = Projectile(projectile_type)
+        proj.position = (x_pos, y_pos)
+        proj.velocity = (x_vel, y_vel)
+        proj.start_position = (x_pos, y_pos)
+        proj.id = id
+        proj.sender_id = sender_id
+        self.add_projectile(proj)
 
-        if packet.packet_type == PacketType.SHOOT:
-            id, x_pos, y_pos, x_vel, y_vel, projectile_type, sender_id = PayloadFormat.SHOOT.unpack(
-                packet.payload)
-            proj = Projectile(projectile_type)
-            proj.position = (x_pos, y_pos)
-            proj.velocity = (x_vel, y_vel)
-            proj.start_position = (x_pos, y_pos)
-            proj.id = id
-            proj.sender_id = sender_id
-            self.projectiles.append(proj)
+    def handle_shoot_rejected(self, local_id: int) -> None:
+        if local_id not in self.predicted_projectiles:
+            return
+
+        proj, _ = self.predicted_projectiles.pop(local_id)
+        if proj in self.projectiles:
+            self.projectiles.remove(proj)
+
+    def handle_input_state(self, tick: int, *state: float) -> None:
+        event = Event()
+        event.event_type = EventType.RECONCILE
+        event.data = (tick, state)
+        self.event_queue.append(event)
 
     def listen(self) -> None:
+        """
+        Single receive worker, see handle_response
+        """
         while self.running:
             data, addr = self.sock.recvfrom(BUFF_SIZE)
-            threading.Thread(target=self.handle_response,
-                             args=(data, addr)).start()
+            self.handle_response(data, addr)
 
     def start(self) -> None:
         self.running = True
@@ -235,6 +498,9 @@ class Client:
         if not self.running or self.spectating:
             return
 
+        if not self.position_throttle.should_send(time.time(), x, y, rotation, barrel_rotation):
+            return
+
         packet = Packet(PacketType.COORDINATES, self.sequence_number,
                         PayloadFormat.COORDINATES.pack(
                             self.id, x, y,
@@ -242,10 +508,39 @@ class Client:
                         ))
         self._send_packet(packet)
 
-    def send_shoot(self, position: tuple[float, float], velocity: tuple[float, float], packet_type: ProjectileType) -> None:
+    def send_input(self, tick: int, bits: int) -> None:
+        """
+        Instead of send_position when the server moves our tank, `bits` is a shared.pack_input command
+        """
+        if not self.running or self.spectating:
+            return
+
+        payload = self.input_sender.push(time.time(), tick, bits)
+        if payload is None:
+            return
+
+        self._send_packet(Packet(PacketType.INPUT, self.sequence_number, payload))
+
+    def send_shoot(self, position: tuple[float, float], velocity: tuple[float, float], packet_type: ProjectileType) -> Projectile | None:
+        """
+        Sends SHOOT and returns a predicted projectile, it is already in self.projectiles
+        and gets its server id once the SHOOT broadcast comes back, see reconcile_projectile
+        """
         if not self.running or self.spectating:
             return
 
+        self._local_projectile_index += 1
+        local_id = self._local_projectile_index
+
+        proj = Projectile(packet_type)
+        proj.position = position
+        proj.velocity = velocity
+        proj.start_position = position
+        proj.sender_id = self.id
+        proj.local_id = local_id
+        self.add_projectile(proj)
+        self.predicted_projectiles[local_id] = (proj, time.time())
+
         packet = Packet(PacketType.SHOOT, self.sequence_number,
                         PayloadFormat.SHOOT.pack(
                             0,  # un-initialized
@@ -254,9 +549,69 @@ class Client:
                             velocity[0],
                             velocity[1],
                             packet_type,
-                            self.id
+                            self.id,
+                            local_id
                         ))
+        # what we are looking at, the server rewinds the other tanks to this for hit tests
+        packet.time = self.server_time() - INTERPOLATION_DELAY
         self._send_packet(packet)
+        return proj
+
+    def reconcile_projectile(self, proj: Projectile, id: int, position: tuple[float, float], velocity: tuple[float, float]) -> None:
+        """
+        Adopts the server id and state of a predicted projectile.
+        The simulated position jumps to the authoritative one, the drawn one eases over via render_offset
+        """
+        error_x = position[0] - proj.start_position[0]
+        error_y = position[1] - proj.start_position[1]
+
+        proj.id = id
+        proj.velocity = velocity
+        proj.start_position = position
+        proj.position = (proj.position[0] + error_x, proj.position[1] + error_y)
+        proj.render_offset = (proj.render_offset[0] - error_x, proj.render_offset[1] - error_y)
+        if proj.lobbed:
+            # same flight from the server's start, the landing we scheduled before is skipped in due_impacts
+            proj.position = position
+            proj.launch(proj.launch_time)
+            if math.isfinite(proj.impact_time):
+                self.impacts.schedule(proj.impact_time, proj)
+        else:
+            # traced again from the server's start on the next frame, see Game.run
+            proj.position = position
+            proj.path = None
+
+    def add_projectile(self, proj: Projectile) -> None:
+        """
+        Lobbed projectiles are launched right away, direct ones need the arena and are launched
+        from launch_time by the render loop
+        """
+        proj.launch_time = time.time()
+        if proj.lobbed:
+            proj.launch(proj.launch_time)
+            if math.isfinite(proj.impact_time):
+                self.impacts.schedule(proj.impact_time, proj)
+        self.projectiles.append(proj)
+
+    def due_impacts(self, now: float) -> list[Projectile]:
+        """
+        Lobbed projectiles landing by `now` that are still around
+        """
+        landed = []
+        for proj in self.impacts.pop_due(now):
+            if proj.remaining_bounces and proj.impact_time <= now and proj not in landed and proj in self.projectiles:
+                landed.append(proj)
+        return landed
+
+    def expire_predictions(self, now: float) -> None:
+        for local_id, (proj, shot_time) in list(self.predicted_projectiles.items()):
+            if now - shot_time < PREDICTION_TIMEOUT:
+                continue
+
+            # the server never confirmed it
+            del self.predicted_projectiles[local_id]
+            if proj in self.projectiles:
+                self.projectiles.remove(proj)
 
 
 if __name__ == "__main__":
@@ -265,4 +620,5 @@ if __name__ == "__main__":
     s.start()
 
     while True:
+        s.poll()
         time.sleep(.1)
@@ -0,0 +1,152 @@
+from __future__ import annotations
+import cProfile
+import io
+import os
+import pstats
+import time
+from collections import deque
+
+import pygame
+
+from settings import FRAME_PROFILE_REFRESH, FRAME_PROFILE_WINDOW, PROFILE_DUMP_DIRECTORY
+
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(samples: list[float], p: float) -> float:
+    """
+    Nearest rank percentile of already sorted samples
+    """
+    if not samples:
+        return 0
+    index = min(len(samples) - 1, max(0, round(p / 100 * len(samples)) - 1))
+    return samples[index]
+
+
+class FrameProfiler:
+    """
+    Times each stage of a frame with perf_counter.
+
+    Game.run calls begin_frame once per frame and mark after each stage, a stage lasts from the
+    previous mark. The last FRAME_PROFILE_WINDOW frames are kept per stage and drawn as percentiles.
+    Separately, start_capture/stop_capture wrap frames in cProfile and dump the result to PROFILE_DUMP_DIRECTORY.
+    Everything is a no-op while disabled.
+    """
+    def __init__(self, enabled: bool = False, window: int = FRAME_PROFILE_WINDOW) -> None:
+        self.enabled = enabled
+        self.window = window
+        self.stages: dict[str, deque[float]] = {}
+        self.frames: deque[float] = deque(maxlen=window)
+        self._frame_start = 0.
+        self._last_mark = 0.
+
+        self.font = pygame.font.Font(None, 20)
+        self._overlay: pygame.Surface | None = None
+        self._overlay_time = float("-inf")
+
+        self._capture: cProfile.Profile | None = None
+
+    @property
+    def capturing(self) -> bool:
+        return self._capture is not None
+
+    def toggle(self) -> None:
+        self.enabled = not self.enabled
+        self.stages.clear()
+        self.frames.clear()
+        self._frame_start = 0.
+        self._overlay = None
+
+    def begin_frame(self) -> None:
+        if not self.enabled:
+            return
+
+        now = time.perf_counter()
+        if self._frame_start:
+            self.frames.append(now - self._frame_start)
+        self._frame_start = now
+        self._last_mark = now
+
+    def mark(self, stage: str) -> None:
+        if not self.enabled:
+            return
+
+        now = time.perf_counter()
+        samples = self.stages.get(stage)
+        if samples is None:
+            samples = self.stages[stage] = deque(maxlen=self.window)
+        samples.append(now - self._last_mark)
+        self._last_mark = now
+
+    def summary(self) -> dict[str, tuple[float, ...]]:
+        """
+        Percentiles per stage in seconds, "frame" is the full frame including the wait for the next tick
+        """
+        result = {}
+        for stage, samples in list(self.stages.items()) + [("frame", self.frames)]:
+            ordered = sorted(samples)
+            result[stage] = tuple(percentile(ordered, p) for p in PERCENTILES)
+        return result
+
+    def draw(self, surface: pygame.Surface) -> None:
+        """
+        Overlay in the top right corner, re-rendered every FRAME_PROFILE_REFRESH seconds
+        """
+        if not self.enabled:
+            return
+
+        now = time.perf_counter()
+        if self._overlay is None or now - self._overlay_time >= FRAME_PROFILE_REFRESH:
+            self._overlay = self._render_overlay()
+            self._overlay_time = now
+
+        surface.blit(self._overlay, (surface.get_width() - self._overlay.get_width() - 4, 4))
+
+    def _render_overlay(self) -> pygame.Surface:
+        rows = [["ms"] + [f"p{p}" for p in PERCENTILES]]
+        for stage, values in self.summary().items():
+            rows.append([stage] + [f"{value * 1000:.2f}" for value in values])
+        if self.capturing:
+            rows.append(["cProfile..."])
+
+        column_width, line_height = 56, self.font.get_linesize()
+        name_width = 88
+        overlay = pygame.Surface((name_width + column_width * len(PERCENTILES) + 8, line_height * len(rows) + 8), pygame.SRCALPHA)
+        overlay.fill((0, 0, 0, 160))
+        for i, row in enumerate(rows):
+            y = 4 + i * line_height
+            overlay.blit(self.font.render(row[0], True, (255, 255, 255)), (4, y))
+            for j, cell in enumerate(row[1:]):
+                # right aligned
+                text = self.font.render(cell, True, (255, 255, 255))
+                overlay.blit(text, (name_width + column_width * (j + 1) - text.get_width(), y))
+        return overlay
+
+    def start_capture(self) -> None:
+        self._capture = cProfile.Profile()
+        self._capture.enable()
+
+    def stop_capture(self) -> str:
+        """
+        Stops cProfile, writes the .prof file and prints the top functions by cumulative time.
+        Returns the path written
+        """
+        capture, self._capture = self._capture, None
+        assert capture is not None
+        capture.disable()
+
+        os.makedirs(PROFILE_DUMP_DIRECTORY, exist_ok=True)
+        path = os.path.join(PROFILE_DUMP_DIRECTORY, time.strftime("frame-%Y%m%d-%H%M%S.prof"))
+        capture.dump_stats(path)
+
+        report = io.StringIO()
+        pstats.Stats(capture, stream=report).sort_stats("cumulative").print_stats(25)
+        print(f"cProfile written to {path}\n{report.getvalue()}")
+        return path
+
+    def toggle_capture(self) -> str | None:
+        if self.capturing:
+            return self.stop_capture()
+        self.start_capture()
+        return None
@@ -0,0 +1,119 @@
+from __future__ import annotations
+import math
+from typing import Iterator
+
+
+class Rect:
+    """
+    Integer rectangle with the pygame.Rect semantics the simulation relies on:
+    coordinates are truncated towards zero and edges that only touch do not collide.
+    Keeps the server free of pygame, pygame.Rect is accepted wherever a Rect is read
+    """
+    __slots__ = ("x", "y", "w", "h")
+
+    def __init__(self, x: float, y: float, w: float, h: float) -> None:
+        self.x = int(x)
+        self.y = int(y)
+        self.w = int(w)
+        self.h = int(h)
+
+    @property
+    def left(self) -> int:
+        return self.x
+
+    @property
+    def top(self) -> int:
+        return self.y
+
+    @property
+    def right(self) -> int:
+        return self.x + self.w
+
+    @property
+    def bottom(self) -> int:
+        return self.y + self.h
+
+    @property
+    def width(self) -> int:
+        return self.w
+
+    @property
+    def height(self) -> int:
+        return self.h
+
+    def colliderect(self, other: Rect) -> bool:
+        return (self.w > 0 and self.h > 0 and other.w > 0 and other.h > 0
+                and self.x < other.x + other.w and other.x < self.x + self.w
+                and self.y < other.y + other.h and other.y < self.y + self.h)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter((self.x, self.y, self.w, self.h))
+
+    def __len__(self) -> int:
+        return 4
+
+    def __getitem__(self, index: int) -> int:
+        return (self.x, self.y, self.w, self.h)[index]
+
+    def __eq__(self, other: object) -> bool:
+        return tuple(self) == tuple(other)  # pyright: ignore
+
+    def __repr__(self) -> str:
+        return f"Rect({self.x}, {self.y}, {self.w}, {self.h})"
+
+
+class Vector2:
+    """
+    Two dimensional float vector, the part of pygame.Vector2 the simulation uses
+    """
+    __slots__ = ("x", "y")
+
+    def __init__(self, x: float | tuple[float, float] | Vector2 = 0, y: float | None = None) -> None:
+        if y is None:
+            x, y = x  # pyright: ignore
+        self.x = float(x)  # pyright: ignore
+        self.y = float(y)
+
+    def __iter__(self) -> Iterator[float]:
+        return iter((self.x, self.y))
+
+    def __len__(self) -> int:
+        return 2
+
+    def __getitem__(self, index: int) -> float:
+        return (self.x, self.y)[index]
+
+    def __bool__(self) -> bool:
+        return bool(self.x or self.y)
+
+    def __add__(self, other: Vector2 | tuple[float, float]) -> Vector2:
+        return Vector2(self.x + other[0], self.y + other[1])
+
+    def __sub__(self, other: Vector2 | tuple[float, float]) -> Vector2:
+        return Vector2(self.x - other[0], self.y - other[1])
+
+    def __mul__(self, scalar: float) -> Vector2:
+        return Vector2(self.x * scalar, self.y * scalar)
+
+    __rmul__ = __mul__
+
+    def __eq__(self, other: object) -> bool:
+        return tuple(self) == tuple(other)  # pyright: ignore
+
+    def length(self) -> float:
+        return math.hypot(self.x, self.y)
+
+    def distance_to(self, other: Vector2 | tuple[float, float]) -> float:
+        return math.hypot(self.x - other[0], self.y - other[1])
+
+    def normalize(self) -> Vector2:
+        length = self.length()
+        if not length:
+            raise ValueError("Can't normalize Vector of length zero")
+        return Vector2(self.x / length, self.y / length)
+
+    def copy(self) -> Vector2:
+        return Vector2(self.x, self.y)
+
+    def __repr__(self) -> str:
+        return f"Vector2({self.x}, {self.y})"
@@ -0,0 +1,186 @@
+from __future__ import annotations
+import math
+import random
+
+from geometry import Rect
+from packet import SCHEMAS, Bundle, Packet, PacketType, PayloadFormat
+from reliability import ReliableChannel
+from server import Server
+from settings import COOLDOWN_TIME_SCALE, COORDINATES_SEND_RATE, DECISIVE_SCORE, SIMULATION_TICK_RATE, UPDATE_MAX_RATE
+from shared import LifecycleType, OnboardType, Projectile, ProjectileType
+
+
+class HeadlessServer(Server):
+    """
+    Server on a virtual clock without a socket or threads.
+    step() runs one simulation tick and the update tick whenever one is due, as fast as the CPU allows.
+    Requests wait for the next simulation tick like on a live server. Datagrams are counted instead of sent,
+    datagrams for a registered peer are handed to it
+    """
+    def __init__(self, seed: int | None = None) -> None:
+        super().__init__()
+        self.now = 0.
+        self.clock = lambda: self.now
+        if seed is not None:
+            self.random.seed(seed)
+        self._next_update = 0.
+        self.sent_datagrams = 0
+        self.sent_bytes = 0
+        self.peers: dict[tuple[str, int], Bot] = {}
+
+    def _send(self, data: bytes, address: tuple[str, int]) -> None:
+        self.sent_datagrams += 1
+        self.sent_bytes += len(data)
+        peer = self.peers.get(address)
+        if peer is not None:
+            peer.deliver(data)
+
+    def step(self, dt: float = 1 / SIMULATION_TICK_RATE) -> None:
+        self.now += dt
+        self.simulation_tick(self.now, dt)
+        if self.now >= self._next_update:
+            self._next_update = max(self._next_update + 1 / UPDATE_MAX_RATE, self.now)
+            self.update_tick(self.now)
+
+
+class Bot:
+    """
+    Scripted player talking to a server through Server.receive, the way a Client would.
+    Wanders around, aims at the closest living opponent and fires its two bullet types on cooldown.
+    Only the reliable channel and its ONBOARD are kept up from what the server sends, the bot reads positions off the server directly
+    """
+    SPEED = 100  # as the client's Player.ACCELERATION
+    TANK_SIZE = 16
+
+    def __init__(self, server: Server, addr: tuple[str, int], bullets: tuple[ProjectileType, ProjectileType], rng: random.Random) -> None:
+        self.server = server
+        self.addr = addr
+        self.bullets = bullets
+        self.rng = rng
+        self.id = 0
+        self.heading = rng.uniform(0, math.tau)
+        self.cooldowns = [0., 0.]
+        self.channel = ReliableChannel()
+        self._sequence_number = 0
+        self._last_coordinates = float("-inf")
+        self._sent_ready = False
+
+    def _send(self, packet_type: PacketType, payload: bytes) -> None:
+        self._sequence_number += 1
+        packet = Packet(packet_type, self._sequence_number, payload)
+        packet = self.channel.prepare(packet, self.server.clock())
+        packet.time = self.server.clock()
+        self.server.receive(packet.serialize(), self.addr)
+
+    def deliver(self, data: bytes) -> None:
+        for message in Bundle.unpack(Packet.deserialize(data)):
+            for packet in self.channel.receive(message, self.server.clock()):
+                if packet.packet_type == PacketType.ONBOARD:
+                    onboard_type, player_id = SCHEMAS[PacketType.ONBOARD].unpack(packet.payload)
+                    if onboard_type == OnboardType.PLAY:
+                        self.id = player_id
+
+    def connect(self) -> None:
+        """
+        Handled on the server's next step, the id comes with the ONBOARD after it and step() sends READY
+        """
+        self.server.peers[self.addr] = self
+        self._send(PacketType.CONNECT, b"bot")
+
+    def target(self, position: tuple[float, float]) -> tuple[float, float] | None:
+        opponents = [conn.position for conn in self.server.connections.values() if conn.alive and conn.id != self.id]
+        if not opponents:
+            return None
+        return min(opponents, key=lambda other: math.dist(other, position))
+
+    def step(self, now: float, dt: float) -> None:
+        conn = self.server.connections.get(self.addr)
+        if conn is None:
+            return
+
+        if not self._sent_ready:
+            # like a client, once the server took us in, anything else before that is dropped
+            self._sent_ready = True
+            self._send(PacketType.READY, PayloadFormat.READY.pack(True))
+
+        if self.channel.needs_ack(now):
+            self._send(PacketType.ACK, b"")
+
+        x, y = conn.position
+        if conn.alive and self.server.lifecycle_state == LifecycleType.PLAYING:
+            if self.rng.random() < dt:
+                self.heading += self.rng.uniform(-1.5, 1.5)
+
+            new_x = x + math.cos(self.heading) * self.SPEED * dt
+            new_y = y + math.sin(self.heading) * self.SPEED * dt
+            if self.server.arena_runtime.collides(Rect(new_x, new_y, self.TANK_SIZE, self.TANK_SIZE)):
+                self.heading = self.rng.uniform(0, math.tau)
+            else:
+                x, y = new_x, new_y
+
+            self.shoot(now, dt, (x, y))
+
+        # dead tanks keep sending, the server would drop them as stale otherwise
+        if now - self._last_coordinates >= 1 / COORDINATES_SEND_RATE:
+            self._last_coordinates = now
+            self._send(PacketType.COORDINATES, PayloadFormat.COORDINATES.pack(
+                self.id, x, y, math.degrees(self.heading) + 90, 0))
+
+    def shoot(self, now: float, dt: float, position: tuple[float, float]) -> None:
+        target = self.target(position)
+        if target is None:
+            return
+
+        for i, projectile_type in enumerate(self.bullets):
+            self.cooldowns[i] = max(0, self.cooldowns[i] - dt)
+            if self.cooldowns[i]:
+                continue
+
+            # the client counts cooldowns down slower than real time
+            self.cooldowns[i] = Projectile.get_cooldown(projectile_type) * COOLDOWN_TIME_SCALE
+            aim = math.atan2(target[1] - position[1], target[0] - position[0]) + self.rng.gauss(0, .1)
+            if Projectile.is_lobbed(projectile_type):
+                velocity = target  # lobbed projectiles carry the target instead
+            else:
+                velocity = (math.cos(aim), math.sin(aim))
+            self._send(PacketType.SHOOT, PayloadFormat.SHOOT.pack(
+                0, *position, *velocity, projectile_type, self.id, 0))
+
+
+def run_match(seed: int, players: int = 2, max_seconds: float = 900) -> dict:
+    """
+    One match between bots with random loadouts, from the waiting room until someone reaches DECISIVE_SCORE.
+    Returns the loadouts, the winner and how long it took on the virtual clock
+    """
+    rng = random.Random(seed)
+    server = HeadlessServer(seed)
+    loadouts = [tuple(rng.sample(list(ProjectileType), 2)) for _ in range(players)]
+    bots = [Bot(server, (f"10.0.{i // 256}.{i % 256}", 1), loadout, rng) for i, loadout in enumerate(loadouts)]
+    for bot in bots:
+        bot.connect()
+
+    dt = 1 / SIMULATION_TICK_RATE
+    rounds = 0
+    while server.now < max_seconds:
+        for bot in bots:
+            bot.step(server.now, dt)
+        state = server.lifecycle_state
+        server.step(dt)
+        if server.lifecycle_state != state and server.lifecycle_state == LifecycleType.NEW_ROUND:
+            rounds += 1
+        if server.lifecycle_state == LifecycleType.DONE:
+            break
+
+    winner = None
+    for bot in bots:
+        conn = server.connections.get(bot.addr)
+        if conn and conn.score >= DECISIVE_SCORE:
+            winner = bot
+    return {
+        "seed": seed,
+        "loadouts": [[int(t) for t in loadout] for loadout in loadouts],
+        "winner": bots.index(winner) if winner else None,
+        "rounds": rounds,
+        "seconds": server.now,
+        "projectiles": server._projectile_index,
+    }
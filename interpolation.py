@@ -0,0 +1,96 @@
+from __future__ import annotations
+import bisect
+
+from settings import INTERPOLATION_BUFFER_SIZE, INTERPOLATION_DELAY, MAX_EXTRAPOLATION
+from shared import lerp
+
+
+class ServerClock:
+    """
+    Estimates the offset between the server clock (Packet.time) and the local clock
+    """
+    SMOOTHING = .1
+
+    def __init__(self) -> None:
+        self.offset: float | None = None
+
+    def observe(self, server_time: float, local_time: float) -> None:
+        sample = server_time - local_time
+        if self.offset is None:
+            self.offset = sample
+        else:
+            self.offset += (sample - self.offset) * self.SMOOTHING
+
+    def server_time(self, local_time: float) -> float:
+        return local_time + (self.offset or 0)
+
+
+class InterpolationBuffer:
+    """
+    Time indexed snapshots of a remote tank.
+    Sampled a fixed delay in the past so there are usually two snapshots to interpolate between,
+    when there are not (loss) the last known velocity is extrapolated for a short while.
+    """
+    def __init__(self, delay: float = INTERPOLATION_DELAY, max_extrapolation: float = MAX_EXTRAPOLATION, size: int = INTERPOLATION_BUFFER_SIZE) -> None:
+        self.delay = delay
+        self.max_extrapolation = max_extrapolation
+        self.size = size
+        self.times: list[float] = []
+        self.states: list[tuple[int, tuple[float, float], float]] = []  # sequence number, position, rotation
+
+    def push(self, time: float, sequence_number: int, position: tuple[float, float], rotation: float) -> None:
+        if self.states and sequence_number <= self.states[0][0]:
+            # duplicate or older than anything we still care about
+            return
+
+        index = bisect.bisect_left(self.times, time)
+        if index < len(self.times) and self.states[index][0] == sequence_number:
+            return
+
+        self.times.insert(index, time)
+        self.states.insert(index, (sequence_number, position, rotation))
+
+        if len(self.times) > self.size:
+            del self.times[0]
+            del self.states[0]
+
+    def clear(self) -> None:
+        self.times.clear()
+        self.states.clear()
+
+    def sample(self, server_time: float) -> tuple[tuple[float, float], float] | None:
+        """
+        Returns position and rotation as seen `delay` seconds before server_time
+        """
+        if not self.times:
+            return None
+
+        render_time = server_time - self.delay
+        index = bisect.bisect_right(self.times, render_time)
+
+        if index == 0:
+            _, position, rotation = self.states[0]
+            return position, rotation
+
+        if index < len(self.times):
+            start_time, end_time = self.times[index - 1], self.times[index]
+            _, start_position, start_rotation = self.states[index - 1]
+            _, end_position, end_rotation = self.states[index]
+        else:
+            if len(self.times) < 2:
+                _, position, rotation = self.states[-1]
+                return position, rotation
+
+            # extrapolate from the last two snapshots
+            start_time, end_time = self.times[-2], self.times[-1]
+            _, start_position, start_rotation = self.states[-2]
+            _, end_position, end_rotation = self.states[-1]
+            render_time = min(render_time, end_time + self.max_extrapolation)
+
+        span = end_time - start_time
+        f = (render_time - start_time) / span if span > 0 else 1
+        position = (
+            lerp(start_position[0], end_position[0], f),
+            lerp(start_position[1], end_position[1], f)
+        )
+        return position, lerp(start_rotation, end_rotation, f)
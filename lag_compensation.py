@@ -0,0 +1,52 @@
+from __future__ import annotations
+import bisect
+import math
+from collections import deque
+
+from shared import lerp
+
+
+class PositionHistory:
+    """
+    Ring buffer of player positions, one entry per simulation tick.
+    Lets hit tests rewind to what a shooter saw, memory is bounded by window * tick_rate entries.
+    """
+    def __init__(self, window: float, tick_rate: int) -> None:
+        self.window = window
+        self.capacity = math.ceil(window * tick_rate) + 2
+        self.times: deque[float] = deque(maxlen=self.capacity)
+        self.positions: deque[dict[int, tuple[float, float]]] = deque(maxlen=self.capacity)
+
+    def record(self, now: float, positions: dict[int, tuple[float, float]]) -> None:
+        self.times.append(now)
+        self.positions.append(positions)
+
+    def clear(self) -> None:
+        self.times.clear()
+        self.positions.clear()
+
+    def clamp_rewind(self, rewind: float) -> float:
+        if not math.isfinite(rewind):
+            return 0
+        return min(max(rewind, 0), self.window)
+
+    def position_at(self, player_id: int, time: float) -> tuple[float, float] | None:
+        """
+        Position of a player at `time`, interpolated between the recorded ticks around it.
+        None if there is nothing recorded for the player at that time
+        """
+        index = bisect.bisect_right(self.times, time)
+        if index == len(self.times):
+            return None
+
+        end = self.positions[index].get(player_id)
+        if index == 0 or end is None:
+            return end
+
+        start = self.positions[index - 1].get(player_id)
+        if start is None:
+            return end
+
+        start_time, end_time = self.times[index - 1], self.times[index]
+        f = (time - start_time) / (end_time - start_time) if end_time > start_time else 1
+        return lerp(start[0], end[0], f), lerp(start[1], end[1], f)
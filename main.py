@@ -6,16 +6,19 @@ import sys
 import math
 import random
 
-from arena import Arena, Tile
+from arena import Arena, ArenaRuntime, Tile
 from assets import AssetLoader
+from broadphase import SpatialGrid
+from frame_profiler import FrameProfiler
 from server import Server
-from client import Client, Event, EventType, Projectile
+from client import Client, Event, EventType, InputPrediction, Projectile
 from client import Player as ClientPlayer
 from particles import Particle, Ripple, Spark
+from rendering import outline, render_stack
 from settings import (
-    ARENA_WALL_COLOR, ARENA_WALL_COLOR_SHADE, DISPLAY_WIDTH, DISPLAY_HEIGHT, FONT_SIZE, LARGE_FONT_SIZE, PLAYER_CIRCLE_RADIUS, PLAYER_SHADOW_COLOR, READY_INTERVAL, RIPPLE_LIFETIME, SHOCKWAVE_KNOCKBACK, TRACK_LIFETIME, SCREEN_HEIGHT, SCREEN_WIDTH, TRACK_INTERVAL
+    ARENA_WALL_COLOR, ARENA_WALL_COLOR_SHADE, COOLDOWN_TIME_SCALE, DISPLAY_WIDTH, DISPLAY_HEIGHT, FONT_SIZE, INPUT_COMMANDS, LARGE_FONT_SIZE, PLAYER_CIRCLE_RADIUS, PLAYER_SHADOW_COLOR, PROJECTILE_CORRECTION_TIME, READY_INTERVAL, RIPPLE_LIFETIME, SHOCKWAVE_KNOCKBACK, TRACK_LIFETIME, SCREEN_HEIGHT, SCREEN_WIDTH, TRACK_INTERVAL, UI_TEXT_CACHE_SIZE
 )
-from shared import NON_LETHAL_LIFECYCLES, LifecycleType, ProjectileType, gaussian_value, get_distance, is_within_radius, lerp, outline, render_stack
+from shared import NON_LETHAL_LIFECYCLES, InputButton, LifecycleType, ProjectileType, Tank, gaussian_value, get_distance, is_within_radius, lerp
 
 pygame.mixer.init()
 
@@ -35,15 +38,17 @@ class Track:
         self.rotation = rotation
 
 
-class Player:
-    ACCELERATION = 100
-    ROTATION_SPEED = 120
-    MAX_SPEED = 120
+class Player(Tank):
+    KEYS = {
+        pygame.K_w: InputButton.FORWARD,
+        pygame.K_s: InputButton.BACKWARD,
+        pygame.K_a: InputButton.LEFT,
+        pygame.K_d: InputButton.RIGHT,
+    }
 
     def __init__(self, sprites: list[pygame.Surface], barrel_sprites: list[pygame.Surface], broken_sprites: list[pygame.Surface]) -> None:
+        super().__init__()
         self.position = pygame.Vector2()
-        self.rotation = 0
-        self.barrel_rotation: float = 0
         self.velocity = pygame.Vector2()
         self.alive = True
         self.bullets = [ProjectileType.LASER, ProjectileType.SHOCKWAVE]
@@ -54,56 +59,19 @@ class Player:
         self.barrel_sprites = barrel_sprites
         self.broken_sprites = broken_sprites
 
-    def handle_input(self, keys, collision_list: list[pygame.Rect], dt: float) -> None:
-        # TODO: refactor
-        rotation_speed = self.ROTATION_SPEED * dt
+    def buttons(self, keys, mouse: tuple[bool, ...] = (False, False, False)) -> int:
+        buttons = 0
+        for key, button in self.KEYS.items():
+            if keys[key]:
+                buttons |= button
+        if mouse[0]:
+            buttons |= InputButton.FIRE_PRIMARY
+        if mouse[2]:
+            buttons |= InputButton.FIRE_SECONDARY
+        return buttons
 
-        rad = math.radians(self.rotation)
-        vel_x, vel_y = math.sin(rad), -math.cos(rad)
-        velocity = self.ACCELERATION * dt
-
-        if keys[pygame.K_a]:
-            self.rotation -= rotation_speed
-        if keys[pygame.K_d]:
-            self.rotation += rotation_speed
-
-        start_pos = self.position.copy()
-
-        if keys[pygame.K_w]:
-            self.velocity.y = vel_y * velocity
-            self.velocity.x = vel_x * velocity
-
-        elif keys[pygame.K_s]:
-            self.velocity.y = -vel_y * velocity
-            self.velocity.x = -vel_x * velocity
-
-        else:
-            self.velocity *= .5
-
-        damping_factor = 0.1  # Adjust this value between 0 and 1 for different damping rates
-        self.knockback *= damping_factor ** dt
-        if self.knockback.length() < 20:
-            self.knockback = pygame.Vector2(0,0)
-        self.position.x -= self.knockback.x * dt
-        self.position.x += self.velocity.x
-
-        for rect in collision_list:
-            if self.check_collision(rect):
-                self.position.x = start_pos.x
-
-        self.position.y -= self.knockback.y * dt
-        self.position.y += self.velocity.y
-        for rect in collision_list:
-            if self.check_collision(rect):
-                self.position.y = start_pos.y
-
-    def check_collision(self, other_rect: pygame.Rect) -> bool:
-        rect = pygame.Rect(
-            self.position.x, self.position.y,
-            16, 16
-        )
-
-        return rect.colliderect(other_rect)
+    def handle_input(self, keys, arena_runtime: ArenaRuntime, dt: float) -> None:
+        self.move(self.buttons(keys), arena_runtime, dt)
 
     def draw(self, screen: pygame.Surface):
         local_position = self.position
@@ -146,6 +114,8 @@ class Player:
 
 
 class UI:
+    ICON_SIZE = 16
+
     def __init__(self, ui_screen: pygame.Surface, asset_loader: AssetLoader) -> None:
         self.ui_screen = ui_screen
         self.font_size = FONT_SIZE
@@ -153,22 +123,63 @@ class UI:
         self.font = pygame.font.Font(None, self.font_size)
         self.arena_font = asset_loader.fonts['arena-screen']
 
+        # rendered text keyed by content, see render_text
+        self._text_cache: dict[tuple[pygame.font.Font, str, tuple], pygame.Surface] = {}
+
+        # icons and overlays are prescaled once per resolution, see _prepare_icons
+        self._icon_resolution: tuple[tuple[int, int], int] | None = None
+        self._icons: dict[ProjectileType, pygame.Surface] = {}
+        self._cooldown_cover = pygame.Surface((0, 0))
+        self._dead_cover = pygame.Surface((0, 0))
+        self._cd_surf = pygame.Surface((0, 0))
+
+    def render_text(self, font: pygame.font.Font, text: str, color: tuple) -> pygame.Surface:
+        key = (font, text, color)
+        surf = self._text_cache.get(key)
+        if surf is None:
+            if len(self._text_cache) >= UI_TEXT_CACHE_SIZE:
+                self._text_cache.clear()
+            surf = font.render(text, True, color)
+            self._text_cache[key] = surf
+        return surf
+
+    def _prepare_icons(self, resolution: tuple[int, int], bullet_count: int) -> None:
+        if self._icon_resolution == (resolution, bullet_count):
+            return
+
+        size = bullet_count * self.ICON_SIZE
+        sprite_sheets = self.asset_loader.sprite_sheets
+        icon_sheets = {
+            ProjectileType.LASER: sprite_sheets['bullet-lazer'],
+            ProjectileType.BULLET: sprite_sheets['bullet'],
+            ProjectileType.SHOCKWAVE: sprite_sheets['bullet-shockwave'],
+            ProjectileType.SNIPER: sprite_sheets['bullet-sniper'],
+            ProjectileType.CLUSTER: sprite_sheets['bullet-cluster'],
+        }
+        self._icons = {
+            projectile_type: pygame.transform.scale(sheet[4], (size, size))
+            for projectile_type, sheet in icon_sheets.items()
+        }
+
+        self._cooldown_cover = pygame.Surface((size, size), pygame.SRCALPHA)
+        self._cooldown_cover.fill((255, 255, 255, 200))
+        self._dead_cover = pygame.Surface((size, size), pygame.SRCALPHA)
+        self._dead_cover.fill((0, 0, 0, 200))
+
+        self._cd_surf = pygame.Surface((size, size))
+        self._cd_surf.set_colorkey((0, 0, 0))
+
+        self._icon_resolution = (resolution, bullet_count)
+
     def draw(self, players: list[ClientPlayer], lifecycle_state: LifecycleType, context: float, game: 'Game') -> None:
         position_map = [
             {"topleft": (10, 10)},
             {"topright": (game.display_resolution[0] - 10, 10)}
         ]
 
-        bullet_icon_map = {
-            ProjectileType.LASER: self.asset_loader.sprite_sheets['bullet-lazer'][4].copy(),
-            ProjectileType.BULLET: self.asset_loader.sprite_sheets['bullet'][4].copy(),
-            ProjectileType.SHOCKWAVE: self.asset_loader.sprite_sheets['bullet-shockwave'][4].copy(),
-            ProjectileType.SNIPER: self.asset_loader.sprite_sheets['bullet-sniper'][4].copy(),
-            ProjectileType.CLUSTER: self.asset_loader.sprite_sheets['bullet-cluster'][4].copy(),
-        }
         for i, player in enumerate(players[:2]):
-            player_text = self.font.render(
-                f"Player {player.id}: {player.score}", True, (0, 0, 0))
+            player_text = self.render_text(
+                self.font, f"Player {player.id}: {player.score}", (0, 0, 0))
 
             # Calculate text positions
             rect = player_text.get_rect(**position_map[i])
@@ -181,7 +192,7 @@ class UI:
         if lifecycle_state in [LifecycleType.NEW_ROUND, LifecycleType.STARTING]:
             now = time.time()
             countdown = context - now
-            text = self.arena_font.render(f"{countdown:.0f}", True, (0, 0, 0))
+            text = self.render_text(self.arena_font, f"{countdown:.0f}", (0, 0, 0))
             rect = text.get_rect(topleft=(
                 display_width  // 2 - text.get_width() // 2, display_height  // 2 - text.get_height() // 2))
 
@@ -191,7 +202,7 @@ class UI:
         elif lifecycle_state in [LifecycleType.DONE]:
             # FIXME
             player = int(game.client.lifecycle_context)
-            text = self.arena_font.render(f"Player {player} won!", True, (0, 0, 0))
+            text = self.render_text(self.arena_font, f"Player {player} won!", (0, 0, 0))
             rect = text.get_rect(topleft=(
                 display_width // 2 - text.get_width() // 2, display_height // 2 - text.get_height() // 2))
 
@@ -199,7 +210,7 @@ class UI:
 
         #  TODO: this is not really 'UI' should be moved
         if game.client.spectating:
-            rc_text = self.font.render(f"You are currently spectating you will join next round", True, (28, 28, 28))
+            rc_text = self.render_text(self.font, f"You are currently spectating you will join next round", (28, 28, 28))
             rect = rc_text.get_rect(topleft=(
                 display_width // 2 - rc_text.get_width() // 2, 10))
 
@@ -207,39 +218,37 @@ class UI:
 
 
         elif lifecycle_state in [LifecycleType.WAITING_ROOM]:
-            count_ready_players = len(list(filter(lambda x: x.ready, players)))
-            rc_text = self.arena_font.render(f"{count_ready_players}/{len(players)}", True, (0, 0, 0) if not game.ready else (120, 220, 120))
+            count_ready_players = sum(1 for p in players if p.ready)
+            rc_text = self.render_text(self.arena_font, f"{count_ready_players}/{len(players)}", (0, 0, 0) if not game.ready else (120, 220, 120))
             rect = rc_text.get_rect(topleft=(
                 display_width // 2 - rc_text.get_width() // 2, display_height // 2 - rc_text.get_height() // 2))
 
             self.ui_screen.blit(rc_text, rect)
 
-            text = self.font.render(f"[R] to {'un-ready' if game.ready else 'ready'}", True, (0, 0, 0, 120))
+            text = self.render_text(self.font, f"[R] to {'un-ready' if game.ready else 'ready'}", (0, 0, 0, 120))
             rect = text.get_rect(topleft=(
                 display_width // 2 - text.get_width() // 2, display_height // 2 + rc_text.get_height() // 2))
 
             self.ui_screen.blit(text, rect)
 
-        icon_size = 16
         bullet_count = len(game.player.bullets)
-        cd_surf = pygame.Surface(
-            (bullet_count * icon_size, bullet_count * icon_size))
-        cd_surf.set_colorkey((0, 0, 0))
+        self._prepare_icons(game.display_resolution, bullet_count)
+
+        cd_surf = self._cd_surf
+        cd_surf.fill((0, 0, 0))
         for i, bullet in enumerate(game.player.bullets):
-            bullet_sprite = bullet_icon_map[bullet]
-            cooldown_cover = pygame.Surface(
-                bullet_sprite.get_size(), pygame.SRCALPHA)
-            cooldown_cover.fill((255, 255, 255, 200))
-            bullet_sprite.blit(cooldown_cover, (0, -bullet_sprite.get_height()
-                               * (1 - (game.shoot_cooldown[i] / Projectile.get_cooldown(bullet)))))
+            icon = self._icons[bullet]
+            icon_pos = (i * self.ICON_SIZE, 0)
+            cd_surf.blit(icon, icon_pos)
 
-            if not game.player.alive:
-                cooldown_cover.fill((0, 0, 0, 200))
-                bullet_sprite.blit(cooldown_cover, (0, 0))
+            # only the covered fraction of the icon is redrawn
+            fraction = min(game.shoot_cooldown[i] / Projectile.get_cooldown(bullet), 1)
+            covered = int(icon.get_height() * fraction)
+            if covered:
+                cd_surf.blit(self._cooldown_cover, icon_pos, (0, 0, icon.get_width(), covered))
 
-            bullet_sprite = pygame.transform.scale(
-                bullet_sprite, (bullet_count * icon_size, bullet_count * icon_size))
-            cd_surf.blit(bullet_sprite, (i * icon_size, 0))
+            if not game.player.alive:
+                cd_surf.blit(self._dead_cover, icon_pos)
 
         pos = (display_width // 2 - cd_surf.get_width(),
                display_height - cd_surf.get_height())
@@ -269,12 +278,17 @@ class Game:
         self.running = False
         self.tracks: list[Track] = []  # x, y, time
         self.particles: list[Particle] = []
+        # F3 toggles the stage overlay, F4 starts and stops a cProfile capture
+        self.profiler = FrameProfiler('--profile' in sys.argv)
+        # with INPUT_COMMANDS the server moves our tank as well
+        self.prediction = InputPrediction()
 
         arena_names = os.listdir('arenas')
         arena_names.sort()
 
         self.arenas = [Arena(os.path.join('arenas', file))
                        for file in arena_names]
+        self.arena_runtimes = [ArenaRuntime(arena) for arena in self.arenas]
         self.player.position = pygame.Vector2(
             random.choice(self.arena.spawn_positions))
 
@@ -282,6 +296,10 @@ class Game:
     def arena(self) -> Arena:
         return self.arenas[int(self.client.current_arena)]
 
+    @property
+    def arena_runtime(self) -> ArenaRuntime:
+        return self.arena_runtimes[int(self.client.current_arena)]
+
     def run_local(self) -> None:
         s = Server()
         threading.Thread(target=s.start, daemon=True).start()
@@ -305,16 +323,12 @@ class Game:
         for track in tracks_to_cleanup:
             self.tracks.remove(track)
 
-    def draw_player(self, player: ClientPlayer, frame_count: int) -> None:
-        if player.old_position:
-            pos_x = lerp(
-                player.old_position[0], player.position[0], player.interpolation_t)
-            pos_y = lerp(
-                player.old_position[1], player.position[1], player.interpolation_t)
-            player.interpolation_t = min(player.interpolation_t + .20, 1)
-            position = pos_x, pos_y
+    def draw_player(self, player: ClientPlayer, frame_count: int, server_time: float) -> None:
+        sample = player.buffer.sample(server_time)
+        if sample:
+            position, rotation = sample
         else:
-            position = player.position
+            position, rotation = player.position, player.rotation
 
         vec_pos = pygame.Vector2(position)
         radius = PLAYER_CIRCLE_RADIUS
@@ -327,13 +341,13 @@ class Game:
                                 vec_pos.y - radius / 2, 16 + radius, 16 + radius), 1)
 
             if not frame_count % TRACK_INTERVAL:
-                self.tracks.append(Track(vec_pos.copy(), player.rotation))
+                self.tracks.append(Track(vec_pos.copy(), rotation))
 
             render_stack(
                 self.screen,
                 self.asset_loader.sprite_sheets['tank'],
                 vec_pos,
-                -player.rotation
+                -rotation
             )
             barrel_pos = vec_pos.copy()
             barrel_pos.y -= 4
@@ -347,7 +361,7 @@ class Game:
                 self.screen,
                 self.asset_loader.sprite_sheets['tank-broken'],
                 vec_pos,
-                -player.rotation
+                -rotation
             )
 
     def draw_arena(self, dt: float) -> None:
@@ -408,18 +422,26 @@ class Game:
             int(rotation)
         )
 
-    def check_projectile_interaction(self, projectile: Projectile, interactable_tiles_list: list[Tile]) -> None:
-        for tile in interactable_tiles_list:
-            if (pygame.Rect(tile.position[0], tile.position[1], tile.width, tile.height)
-                    .colliderect(pygame.Rect(projectile.position[0], projectile.position[1], 8, 8))):
-                projectile.remaining_bounces = 0
-                if projectile.sender_id == self.client.id:
-                    try:
-                        id = self.player.bullets.index(ProjectileType(int(projectile.projectile_type)))
-                    except:
-                        id = 0
-                    self.player.bullets[id] = ProjectileType(int(tile.tile_type))
-                    self.shoot_cooldown = [0., 0.]
+    def check_projectile_interaction(self, projectile: Projectile, arena_runtime: ArenaRuntime) -> None:
+        tile = arena_runtime.interactable_at(
+            pygame.Rect(projectile.position[0], projectile.position[1], 8, 8))
+        if tile:
+            projectile.remaining_bounces = 0
+            self.pick_up(projectile, tile)
+
+    def pick_up(self, projectile: Projectile, tile: Tile) -> None:
+        """
+        Our own projectiles ending in an interactable tile swap the bullet they were fired from for the tile's
+        """
+        if projectile.sender_id != self.client.id:
+            return
+
+        try:
+            id = self.player.bullets.index(ProjectileType(int(projectile.projectile_type)))
+        except:
+            id = 0
+        self.player.bullets[id] = ProjectileType(int(tile.tile_type))
+        self.shoot_cooldown = [0., 0.]
 
     def handle_event(self, event: Event) -> None:
         # FIXME breaking index error
@@ -430,6 +452,10 @@ class Game:
             self.player.barrel_rotation = event.data[3]
             self.player.knockback = pygame.Vector2(0,0)
 
+        elif event.event_type == EventType.RECONCILE:
+            tick, state = event.data
+            self.prediction.reconcile(self.player, tick, state, self.arena_runtime, self.player.alive)
+
         elif event.event_type == EventType.HIT:
             proj_id, hit_id = event.data
 
@@ -513,14 +539,29 @@ class Game:
             # Decreasing part of the curve (quadratic)
             height  = 1 - ((distance_from_start - half_distance) / half_distance)**2
 
-        draw_pos = projectile.position[0], projectile.position[1] - height * 32
+        position = self.drawn_projectile_position(projectile)
+        draw_pos = position[0], position[1] - height * 32
 
         reticle_size = 16
         pygame.draw.ellipse(self.screen, (200, 0, 0), (target_pos[0] - reticle_size / 2, target_pos[1] - reticle_size / 2, reticle_size, reticle_size), width=2)
 
-        pygame.draw.ellipse(self.screen, PLAYER_SHADOW_COLOR, (*projectile.position, 8, 8))
+        pygame.draw.ellipse(self.screen, PLAYER_SHADOW_COLOR, (*position, 8, 8))
         self.draw_projectile(self.screen, draw_pos, 0, projectile.projectile_type)
 
+    def drawn_projectile_position(self, projectile: Projectile) -> tuple[float, float]:
+        return (projectile.position[0] + projectile.render_offset[0],
+                projectile.position[1] + projectile.render_offset[1])
+
+    def ease_projectile_correction(self, projectile: Projectile, dt: float) -> None:
+        if projectile.render_offset == (0, 0):
+            return
+
+        f = max(0, 1 - dt / PROJECTILE_CORRECTION_TIME)
+        offset_x, offset_y = projectile.render_offset[0] * f, projectile.render_offset[1] * f
+        if abs(offset_x) < .5 and abs(offset_y) < .5:
+            offset_x, offset_y = 0, 0
+        projectile.render_offset = (offset_x, offset_y)
+
 
     def incremenet_frame_count(self) -> None:
         self.frame_count += 1
@@ -534,31 +575,26 @@ class Game:
 
         while self.running:
             dt = self.clock.tick(120) / 1000
+            self.profiler.begin_frame()
             self.frame_count += 1
             self.incremenet_frame_count()
             self.screen.fill((128, 128, 128))
             self.draw_and_update_tracks(dt)
+            self.profiler.mark("tracks")
             self.draw_arena(dt)
+            self.profiler.mark("arena")
 
-            event_queue = self.client.event_queue.copy()
-            if event_queue:
-                event = event_queue.pop()
-                self.handle_event(event)
-                self.client.event_queue = event_queue
-            # We get them here every frame
-            # Might not need to
-            # Keep it for no until proven otherwise
-            tile_collisions = [
-                pygame.Rect(
-                    tile.position[0], tile.position[1], tile.width, tile.height)
-                for tile in self.arena.get_colliders()
-            ]
-            interactable_tiles = list(filter(lambda x: x.interactable, self.arena.tiles))
-
-            self.client.send_position(
-                self.player.position.x, self.player.position.y,
-                self.player.rotation, self.player.barrel_rotation
-            )
+            self.client.poll()
+            while self.client.event_queue:
+                self.handle_event(self.client.event_queue.popleft())
+            arena_runtime = self.arena_runtime
+
+            if not INPUT_COMMANDS:
+                self.client.send_position(
+                    self.player.position.x, self.player.position.y,
+                    self.player.rotation, self.player.barrel_rotation
+                )
+            self.profiler.mark("network")
 
             keys = pygame.key.get_pressed()
 
@@ -606,14 +642,23 @@ class Game:
                 if not self.frame_count % TRACK_INTERVAL:
                     self.tracks.append(
                         Track(self.player.position.copy(), self.player.rotation))
-                self.player.handle_input(keys, tile_collisions, dt)
+                if not INPUT_COMMANDS:
+                    self.player.handle_input(keys, arena_runtime, dt)
+
+            if INPUT_COMMANDS and not self.client.spectating:
+                buttons = self.player.buttons(keys, pygame.mouse.get_pressed())
+                for tick, bits in self.prediction.step(self.player, buttons, arena_runtime, dt, self.player.alive):
+                    self.client.send_input(tick, bits)
+            self.profiler.mark("input")
 
             if not self.client.spectating:
                 self.player.draw(self.screen)
 
-            for id, player in self.client.players.copy().items():
+            server_time = self.client.server_time()
+            for id, player in self.client.players.items():
                 self.draw_player(
-                    player, self.frame_count) if id != self.client.id else ...
+                    player, self.frame_count, server_time) if id != self.client.id else ...
+            self.profiler.mark("players")
 
             cleanup = []
             for part in self.particles:
@@ -624,90 +669,93 @@ class Game:
 
             for part in cleanup:
                 self.particles.remove(part)
+            self.profiler.mark("particles")
 
             projs_to_cleanup = []
+            now = time.time()
+            # see Server.land_projectiles, built when the first shockwave lands this frame
+            projectile_grid: SpatialGrid[Projectile] | None = None
+            for projectile in self.client.due_impacts(now):
+                hit_pos = projectile.velocity  # lobbed projectiles carry their target as velocity
+                projectile.remaining_bounces = 0
+                projectile.position = hit_pos
+                self.check_projectile_interaction(projectile, arena_runtime)
+                pos = pygame.Vector2(projectile.position)
+
+                if projectile.projectile_type == ProjectileType.SHOCKWAVE:
+                    new_pos_x, new_pos_y = hit_pos
+                    player_center_pos = self.player.position.x, self.player.position.y
+
+                    direction = player_center_pos[0] - new_pos_x, player_center_pos[1] - new_pos_y
+                    radius = projectile.radius
+                    distance = get_distance(player_center_pos, (new_pos_x, new_pos_y))
+                    if distance < radius:
+                        self.player.knockback = -pygame.Vector2(direction).normalize() * SHOCKWAVE_KNOCKBACK
+
+                    r = Ripple(pygame.Vector2(new_pos_x, new_pos_y), radius, color=pygame.Color(178,178,255,255), width=4)
+                    r.lifetime *= .8
+                    self.particles.append(r)
+
+                    r = Ripple(pygame.Vector2(new_pos_x, new_pos_y), radius, color=pygame.Color(255,255,255,255), width=1, force=1.2)
+                    r.lifetime *= 1
+                    self.particles.append(r)
+
+                    for i in range(0, 6):
+                        self.particles.append(Spark(pygame.Vector2(new_pos_x, new_pos_y), i, (255, 255, 255, 120), .2, force=.12))
+
+                    # the server deflects these as new sniper shots
+                    if projectile_grid is None:
+                        projectile_grid = SpatialGrid()
+                        for proj in self.client.projectiles:
+                            proj.position = proj.position_at(now)
+                            projectile_grid.insert_point(proj, *proj.position)
+
+                    for proj in projectile_grid.query_radius(new_pos_x, new_pos_y, radius):
+                        if proj == projectile:
+                            continue
+
+                        distance = get_distance(proj.position, (new_pos_x, new_pos_y))
+                        if distance < radius:
+                            projs_to_cleanup.append(proj)
+
+                else:
+                    r = Ripple(pos.copy(), 20, force=1.5,
+                               color=pygame.Color(255, 255, 255), width=1)
+                    r.lifetime = RIPPLE_LIFETIME * 1.3
+                    self.particles.append(r)
+                    self.particles.append(Ripple(pos.copy(), 25))
+
+                    r = Ripple(pos.copy(), 20, force=1.5,
+                               color=pygame.Color(255, 189, 189), width=2)
+                    r.lifetime = RIPPLE_LIFETIME * .7
+                    self.particles.append(r)
+                    self.particles.append(Ripple(pos.copy(), 25))
+
+                    for i in range(7):
+                        self.particles.append(Spark(pos.copy(), i, (255, 255, 255), 2, force=.9))
+                        self.particles.append(Spark(pos.copy(), i + .5, (191, 80, 50), 1))
+
+                    for i in range(6):
+                        self.particles.append(
+                            Spark(pos.copy(), i + .5, (0, 0, 0), 1, force=.3))
+
+                    for i in range(6):
+                        self.particles.append(
+                            Spark(pos.copy(), i, (255, 255, 255), 1, force=.2))
+
             for projectile in self.client.projectiles:
+                self.ease_projectile_correction(projectile, dt)
                 if projectile.lobbed:
-                    hit_pos = Projectile.update_lobbed_projectile(projectile, dt)
-                    if hit_pos:
-                        projectile.remaining_bounces = 0
-                        self.check_projectile_interaction(projectile, interactable_tiles)
-                        pos = pygame.Vector2(projectile.position)
-
-
-                        if projectile.projectile_type == ProjectileType.SHOCKWAVE:
-                            new_pos_x, new_pos_y = hit_pos
-                            player_center_pos = self.player.position.x, self.player.position.y
-
-                            direction = player_center_pos[0] - new_pos_x, player_center_pos[1] - new_pos_y
-                            radius = projectile.radius
-                            distance = get_distance(player_center_pos, (new_pos_x, new_pos_y))
-                            if distance < radius:
-                                self.player.knockback = -pygame.Vector2(direction).normalize() * SHOCKWAVE_KNOCKBACK
-
-                            r = Ripple(pygame.Vector2(new_pos_x, new_pos_y), radius, color=pygame.Color(178,178,255,255), width=4)
-                            r.lifetime *= .8
-                            self.particles.append(r)
-
-                            r = Ripple(pygame.Vector2(new_pos_x, new_pos_y), radius, color=pygame.Color(255,255,255,255), width=1, force=1.2)
-                            r.lifetime *= 1
-                            self.particles.append(r)
-
-                            for i in range(0, 6):
-                                self.particles.append(Spark(pygame.Vector2(new_pos_x, new_pos_y), i, (255, 255, 255, 120), .2, force=.12))
-
-                            for proj in self.client.projectiles:
-                                if proj == projectile:
-                                    continue
-
-                                distance = get_distance(proj .position, (new_pos_x, new_pos_y))
-                                if distance < radius:
-                                    direction = proj.position[0] - hit_pos.x, proj.position[1] - hit_pos.y
-                                    vel = pygame.Vector2(direction).normalize()
-
-                                    new_proj = Projectile(ProjectileType.SNIPER)
-                                    new_proj.position = proj.position
-                                    new_proj.velocity = (vel.x, vel.y)
-
-                                    # This should be moved to the server perhaps
-                                    # Did this initialy but encountered some issues
-                                    # Don't remember so will keep it heref for now
-                                    if proj.sender_id == self.client.id:
-                                        self.client.send_shoot(new_proj.position, (vel.x, vel.y), ProjectileType.SNIPER)
-
-                                    # Same problem as on server, we only drop proj if it's not a sniper show
-                                    if proj.projectile_type != ProjectileType.SNIPER:
-                                        projs_to_cleanup.append(proj)
-
-                        else:
-                            r = Ripple(pos.copy(), 20, force=1.5,
-                                       color=pygame.Color(255, 255, 255), width=1)
-                            r.lifetime = RIPPLE_LIFETIME * 1.3
-                            self.particles.append(r)
-                            self.particles.append(Ripple(pos.copy(), 25))
-
-                            r = Ripple(pos.copy(), 20, force=1.5,
-                                       color=pygame.Color(255, 189, 189), width=2)
-                            r.lifetime = RIPPLE_LIFETIME * .7
-                            self.particles.append(r)
-                            self.particles.append(Ripple(pos.copy(), 25))
-
-                            for i in range(7):
-                                self.particles.append(Spark(pos.copy(), i, (255, 255, 255), 2, force=.9))
-                                self.particles.append(Spark(pos.copy(), i + .5, (191, 80, 50), 1))
-
-                            for i in range(6):
-                                self.particles.append(
-                                    Spark(pos.copy(), i + .5, (0, 0, 0), 1, force=.3))
-
-                            for i in range(6):
-                                self.particles.append(
-                                    Spark(pos.copy(), i, (255, 255, 255), 1, force=.2))
+                    projectile.position = projectile.position_at(now)
                     self.draw_lobbed_projectile(projectile)
 
                 else:
-                    self.check_projectile_interaction(projectile, interactable_tiles)
-                    hit_pos = Projectile.update_projectile(projectile, tile_collisions, dt)
+                    if projectile.path is None:
+                        # the arena is only known here, not on the client's receive thread
+                        projectile.launch(projectile.launch_time, arena_runtime)
+                    hit_pos = projectile.advance(now)
+                    if projectile.remaining_bounces == 0 and projectile.path and projectile.path.tile:
+                        self.pick_up(projectile, projectile.path.tile)
                     if hit_pos is not None:
                         new_pos_x, new_pos_y = hit_pos
                         vel_x, vel_y = projectile.velocity
@@ -716,7 +764,7 @@ class Game:
                         self.particles.append(Spark(pygame.Vector2(new_pos_x, new_pos_y), math.atan2(
                             vel_y - .20, vel_x - .20), (255, 255, 255, 120), .2, force=.12))
 
-                    self.draw_projectile(self.screen, projectile.position, projectile.rotation, projectile.projectile_type)
+                    self.draw_projectile(self.screen, self.drawn_projectile_position(projectile), projectile.rotation, projectile.projectile_type)
 
                 if projectile.remaining_bounces == 0:
                     projs_to_cleanup.append(projectile)
@@ -724,29 +772,41 @@ class Game:
             for projectile in set(projs_to_cleanup):
                 if projectile in self.client.projectiles:
                     self.client.projectiles.remove(projectile)
+            self.profiler.mark("projectiles")
 
-            self.shoot_cooldown[0] = max(0, self.shoot_cooldown[0] - dt / 10)
-            self.shoot_cooldown[1] = max(0, self.shoot_cooldown[1] - dt / 10)
+            self.shoot_cooldown[0] = max(0, self.shoot_cooldown[0] - dt / COOLDOWN_TIME_SCALE)
+            self.shoot_cooldown[1] = max(0, self.shoot_cooldown[1] - dt / COOLDOWN_TIME_SCALE)
 
             pygame.transform.scale(
                 self.screen, self.display_resolution, self.display)
+            self.profiler.mark("scale")
 
             self.ui.draw(list(self.client.players.values()),
                          self.client.lifecycle_state,
                          self.client.lifecycle_context,
                          self
                          )
+            self.profiler.mark("ui")
+            self.profiler.draw(self.display)
+            self.profiler.mark("overlay")
 
             pygame.display.flip()
             pygame.event.pump()  # process event queue
+            self.profiler.mark("flip")
 
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     self.running = False
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                    self.profiler.toggle()
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_F4:
+                    self.profiler.toggle_capture()
 
             if keys[pygame.K_q]:
                 self.running = False
 
+        if self.profiler.capturing:
+            self.profiler.stop_capture()
         self.client.disconnect()
         sys.exit()
 
@@ -0,0 +1,178 @@
+from __future__ import annotations
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+
+LOGGER = logging.getLogger("Metrics")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Monotonic count, optionally split by one label.
+    Label values are stored raw and only formatted when scraped, keeping inc cheap on the hot path
+    """
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, label: str | None = None, label_format: Callable[[object], str] = str) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.label_format = label_format
+        self.values: dict[object, float] = {}
+
+    def inc(self, label_value: object = None, amount: float = 1) -> None:
+        # not locked, a lost increment under contention is fine for monitoring
+        self.values[label_value] = self.values.get(label_value, 0) + amount
+
+    def __getitem__(self, label_value: object) -> float:
+        return self.values.get(label_value, 0)
+
+    def format_label(self, label_value: object) -> str:
+        """
+        label_format, or the raw value if that fails, one odd label must not break the scrape
+        """
+        try:
+            return self.label_format(label_value)
+        except Exception:
+            return str(label_value)
+
+    def samples(self) -> list[tuple[str, dict[str, str], float]]:
+        if self.label is None:
+            return [(self.name, {}, self.values.get(None, 0))]
+        return [(self.name, {self.label: self.format_label(value)}, count) for value, count in list(self.values.items())]
+
+
+class Gauge:
+    """
+    Value read from a callback at scrape time, so keeping it current costs nothing.
+    With a label the callback returns a dict of label value to value
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], float | dict], label: str | None = None) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.label = label
+
+    def samples(self) -> list[tuple[str, dict[str, str], float]]:
+        value = self.callback()
+        if self.label is None:
+            return [(self.name, {}, value)]
+        return [(self.name, {self.label: str(label_value)}, v) for label_value, v in value.items()]
+
+
+class Histogram:
+    """
+    Cumulative buckets, sum and count, like a Prometheus histogram
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: list[float]) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self) -> list[tuple[str, dict[str, str], float]]:
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + [float("inf")], self.counts):
+            cumulative += count
+            samples.append((self.name + "_bucket", {"le": _format_value(bound)}, cumulative))
+        samples.append((self.name + "_sum", {}, self.sum))
+        samples.append((self.name + "_count", {}, self.count))
+        return samples
+
+
+class Registry:
+    def __init__(self, prefix: str = "") -> None:
+        self.prefix = prefix
+        self.metrics: list[Counter | Gauge | Histogram] = []
+        self._http: ThreadingHTTPServer | None = None
+
+    def counter(self, name: str, documentation: str, label: str | None = None, label_format: Callable[[object], str] = str) -> Counter:
+        return self._register(Counter(self.prefix + name, documentation, label, label_format))
+
+    def gauge(self, name: str, documentation: str, callback: Callable[[], float | dict], label: str | None = None) -> Gauge:
+        return self._register(Gauge(self.prefix + name, documentation, callback, label))
+
+    def histogram(self, name: str, documentation: str, buckets: list[float]) -> Histogram:
+        return self._register(Histogram(self.prefix + name, documentation, buckets))
+
+    def _register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """
+        Text exposition format
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, address: str, port: int) -> None:
+        """
+        Serves render() on GET /metrics from a daemon thread
+        """
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args) -> None:
+                LOGGER.debug(format, *args)
+
+        self._http = ThreadingHTTPServer((address, port), Handler)
+        self._http.daemon_threads = True
+        threading.Thread(target=self._http.serve_forever, daemon=True).start()
+        LOGGER.info("serving metrics on http://%s:%s/metrics", address, port)
+
+    def shutdown(self) -> None:
+        if self._http:
+            self._http.shutdown()
+            self._http.server_close()
+            self._http = None
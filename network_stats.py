@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+from settings import (
+    NETWORK_STATS_INTERVAL,
+    UPDATE_FULL_INTERVAL,
+    UPDATE_LOSS_INTERVALS,
+    UPDATE_LOSS_THRESHOLD,
+    UPDATE_MAX_RATE,
+    UPDATE_MIN_RATE,
+    UPDATE_QUEUEING_DELAY_THRESHOLD,
+    UPDATE_RATE,
+    UPDATE_RATE_DECREASE,
+    UPDATE_RATE_INCREASE,
+    UPDATE_REDUCED_DETAIL_RATE,
+)
+
+
+class LinkStats:
+    """
+    Round trip time, jitter and loss of the link to one peer.
+
+    RTT comes from PONGs echoing the time of our PING, jitter is the RFC 3550
+    interarrival jitter of the peer's own timestamps. Loss is the share of
+    sequence numbers that never showed up and queueing delay how far transit times
+    sat above the fastest one seen, both recomputed every NETWORK_STATS_INTERVAL.
+    """
+    SMOOTHING = .125
+
+    def __init__(self) -> None:
+        self.rtt: float | None = None
+        self.jitter: float = 0
+        self.loss: float = 0
+        self.queueing_delay: float = 0
+        # what the peer measured on the packets we send it, reported in its PONGs
+        self.peer_loss: float = 0
+        self.peer_jitter: float = 0
+        self.peer_queueing_delay: float = 0
+        self.last_ping = float("-inf")
+
+        self._last_transit: float | None = None
+        # transit includes the clock offset between us, only differences to the minimum mean anything
+        self._min_transit: float | None = None
+        self._interval_delay = 0.
+        self._interval_timed = 0
+        self._max_sequence: int | None = None
+        self._interval_base: int | None = None
+        self._interval_received = 0
+
+    @property
+    def lossy(self) -> bool:
+        return max(self.loss, self.peer_loss) > UPDATE_LOSS_THRESHOLD
+
+    @property
+    def queueing(self) -> bool:
+        return max(self.queueing_delay, self.peer_queueing_delay) > UPDATE_QUEUEING_DELAY_THRESHOLD
+
+    def on_packet(self, sequence_number: int, sent_time: float | None, now: float) -> None:
+        """
+        Every unreliable packet from the peer. `sent_time` is None when the packet is not stamped with the peer's clock
+        """
+        if sent_time is not None:
+            transit = now - sent_time
+            if self._last_transit is not None:
+                self.jitter += (abs(transit - self._last_transit) - self.jitter) / 16
+            self._last_transit = transit
+
+            if self._min_transit is None or transit < self._min_transit:
+                self._min_transit = transit
+            self._interval_delay += transit - self._min_transit
+            self._interval_timed += 1
+
+        if self._max_sequence is None:
+            self._max_sequence = sequence_number
+            self._interval_base = sequence_number - 1
+        self._max_sequence = max(self._max_sequence, sequence_number)
+        self._interval_received += 1
+
+    def on_pong(self, echoed_time: float, now: float) -> None:
+        sample = now - echoed_time
+        if sample < 0:
+            return
+        self.rtt = sample if self.rtt is None else self.rtt + (sample - self.rtt) * self.SMOOTHING
+
+    def ping_due(self, now: float) -> bool:
+        return now - self.last_ping >= NETWORK_STATS_INTERVAL
+
+    def close_interval(self, now: float) -> None:
+        """
+        Updates loss and queueing delay for the packets seen since the last call, called when a PING goes out
+        """
+        self.last_ping = now
+        if self._interval_timed:
+            self.queueing_delay = self._interval_delay / self._interval_timed
+            self._interval_delay = 0
+            self._interval_timed = 0
+
+        if self._max_sequence is None or self._interval_base is None:
+            return
+
+        expected = self._max_sequence - self._interval_base
+        if expected > 0:
+            self.loss = min(max(1 - self._interval_received / expected, 0), 1)
+        self._interval_base = self._max_sequence
+        self._interval_received = 0
+
+
+class SendRateController:
+    """
+    UPDATE rate and detail level for one client.
+
+    AIMD like TCP: the rate grows by UPDATE_RATE_INCREASE every stats interval the link looks fine
+    and is cut by UPDATE_RATE_DECREASE when it shows queueing delay, or loss for UPDATE_LOSS_INTERVALS
+    intervals in a row. A single lossy interval is as likely a wireless link as it is congestion,
+    backing off does nothing against that.
+    At or below UPDATE_REDUCED_DETAIL_RATE only players that changed are sent.
+    """
+    def __init__(self, rate: float = UPDATE_RATE) -> None:
+        self.rate = rate
+        self.next_send = float("-inf")
+        self._last_full = float("-inf")
+        self._last_entries: dict[int, bytes] = {}
+        self._settling: set[int] = set()
+        self._lossy_intervals = 0
+
+    @property
+    def reduced_detail(self) -> bool:
+        return self.rate <= UPDATE_REDUCED_DETAIL_RATE
+
+    def adapt(self, link: LinkStats) -> None:
+        self._lossy_intervals = self._lossy_intervals + 1 if link.lossy else 0
+        if link.queueing or self._lossy_intervals >= UPDATE_LOSS_INTERVALS:
+            self._lossy_intervals = 0
+            self.rate = max(self.rate * UPDATE_RATE_DECREASE, UPDATE_MIN_RATE)
+        else:
+            self.rate = min(self.rate + UPDATE_RATE_INCREASE, UPDATE_MAX_RATE)
+
+    def due(self, now: float) -> bool:
+        if now < self.next_send:
+            return False
+
+        # keeps the average rate when the caller's ticks do not line up with ours, without bursting after a stall
+        interval = 1 / self.rate
+        self.next_send = max(self.next_send + interval, now + interval / 2)
+        return True
+
+    def select(self, entries: dict[int, bytes], now: float) -> bytes:
+        """
+        Payload for the next UPDATE from every player's packed entry.
+        At reduced detail unchanged players are left out, except once right after they changed
+        so the client gets two equal samples and stops extrapolating, and in a full snapshot every UPDATE_FULL_INTERVAL
+        """
+        full = not self.reduced_detail or now - self._last_full >= UPDATE_FULL_INTERVAL
+        if full:
+            self._last_full = now
+
+        selected = []
+        for player_id, entry in entries.items():
+            changed = entry != self._last_entries.get(player_id)
+            if full or changed or player_id in self._settling:
+                selected.append(entry)
+
+            if changed:
+                self._settling.add(player_id)
+            else:
+                self._settling.discard(player_id)
+
+        self._last_entries = entries
+        self._settling &= entries.keys()
+        return b"".join(selected)
@@ -16,24 +16,138 @@ class PacketType(IntEnum):
     LIFECYCLE_CHANGE = auto()
     FORCE_MOVE = auto()
     READY = auto()
+    ACK = auto()
+    PING = auto()
+    PONG = auto()
+    BUNDLE = auto()
+    INPUT = auto()
+    INPUT_STATE = auto()
+    SHOOT_REJECTED = auto()
+
+
+PACKET_TYPES = frozenset(PacketType)
+
+# sent over the reliable ordered channel, see reliability.ReliableChannel
+RELIABLE_PACKET_TYPES = frozenset([
+    PacketType.LIFECYCLE_CHANGE,
+    PacketType.FORCE_MOVE,
+    PacketType.HIT,
+    PacketType.ONBOARD,
+    PacketType.DISCONNECT,
+])
+
+
+class Schema:
+    """
+    The payload layout of a packet type, declared once as (name, struct format) fields.
+    The fields compile to one struct.Struct, pack and unpack are picked for the layout when it is declared.
+    `repeated` payloads are any number of records back to back, a `text` field takes the bytes after the fixed ones
+    """
+    MAX_TEXT = 32
+
+    def __init__(self, *fields: tuple[str, str], repeated: bool = False, text: str | None = None) -> None:
+        self.fields = tuple(name for name, _ in fields) + ((text,) if text else ())
+        self.struct = struct.Struct("".join(code for _, code in fields))
+        self.size = self.struct.size
+        self.repeated = repeated
+        self.text = text
+
+        if repeated:
+            self.pack = self.struct.pack  # one record, senders join them
+            self.unpack = self._unpack_records
+        elif text:
+            self.pack = self._pack_text
+            self.unpack = self._unpack_text
+        else:
+            self.pack = self.struct.pack
+            self.unpack = self._unpack_fixed
+
+    def validate(self, payload: bytes) -> bool:
+        if self.repeated:
+            return len(payload) % self.size == 0
+        if self.text:
+            return self.size <= len(payload) <= self.size + self.MAX_TEXT
+        return len(payload) == self.size
+
+    def _invalid(self, payload: bytes) -> ValueError:
+        return ValueError(f"Invalid payload - {len(payload)} bytes do not fit {self.fields}")
+
+    def _unpack_fixed(self, payload: bytes) -> tuple:
+        if len(payload) != self.size:
+            raise self._invalid(payload)
+        return self.struct.unpack(payload)
+
+    def _unpack_records(self, payload: bytes) -> list[tuple]:
+        if len(payload) % self.size:
+            raise self._invalid(payload)
+        return list(self.struct.iter_unpack(payload))
+
+    def _pack_text(self, *values) -> bytes:
+        return self.struct.pack(*values[:-1]) + values[-1][:self.MAX_TEXT]
+
+    def _unpack_text(self, payload: bytes) -> tuple:
+        if not self.validate(payload):
+            raise self._invalid(payload)
+        return self.struct.unpack_from(payload) + (payload[self.size:],)
+
+
+COORDINATES_FIELDS = (("player_id", "I"), ("x", "f"), ("y", "f"), ("rotation", "f"), ("barrel_rotation", "f"))
+
+# what every packet type carries, as sent by the server. BUNDLE is framing, see Bundle
+SCHEMAS: dict[PacketType, Schema] = {
+    PacketType.CONNECT: Schema(text="name"),
+    PacketType.DISCONNECT: Schema(("player_id", "I")),
+    PacketType.ONBOARD: Schema(("onboard_type", "I"), ("data", "I")),  # data is the player id or the arena to spectate
+    PacketType.SCORE: Schema(("score", "I")),
+    PacketType.COORDINATES: Schema(*COORDINATES_FIELDS),
+    PacketType.SHOOT: Schema(("id", "I"), ("x", "f"), ("y", "f"), ("x_vel", "f"), ("y_vel", "f"),
+                             ("projectile_type", "I"), ("sender_id", "I"), ("local_id", "I")),
+    PacketType.UPDATE: Schema(*COORDINATES_FIELDS, ("score", "I"), ("ready", "?"), ("has_crown", "?"), repeated=True),
+    PacketType.HIT: Schema(("projectile_id", "I"), ("player_id", "I")),
+    PacketType.LIFECYCLE_CHANGE: Schema(("lifecycle_type", "I"), ("context", "d")),
+    PacketType.FORCE_MOVE: Schema(*COORDINATES_FIELDS),
+    PacketType.READY: Schema(("ready", "?")),
+    PacketType.ACK: Schema(),
+    PacketType.PING: Schema(("rtt", "f"), ("jitter", "f"), ("loss", "f")),  # the link as measured by the server
+    PacketType.PONG: Schema(("loss", "f"), ("jitter", "f"), ("queueing_delay", "f")),  # the UPDATE stream as measured by the client
+    # the latest input commands, see shared.pack_input, each holds from its client tick until the next one
+    PacketType.INPUT: Schema(("tick", "I"), ("bits", "H"), repeated=True),
+    # the server's tank of a client sending INPUT, as it was after simulating `tick`, see shared.Tank.state
+    PacketType.INPUT_STATE: Schema(("tick", "I"), ("x", "f"), ("y", "f"), ("rotation", "f"),
+                                   ("x_vel", "f"), ("y_vel", "f"), ("x_knockback", "f"), ("y_knockback", "f")),
+    # a SHOOT the server did not spawn, only to the client that sent it so it drops its predicted projectile
+    PacketType.SHOOT_REJECTED: Schema(("local_id", "I")),
+}
+
+# clients say goodbye in words, the server tells everyone who left
+REQUEST_SCHEMAS: dict[PacketType, Schema] = SCHEMAS | {
+    PacketType.DISCONNECT: Schema(text="reason"),
+}
 
 
 class PayloadFormat:
-    CONNECT = struct.Struct("32s")
-    DISCONNECT  = struct.Struct("I")
-    ONBOARD = struct.Struct("II")
-    SCORE = struct.Struct("I")
-    COORDINATES = struct.Struct("Iffff")
-    READY = struct.Struct("?")
-    HAS_CROWN = struct.Struct("?")
-    UPDATE = struct.Struct(COORDINATES.format + SCORE.format + READY.format + HAS_CROWN.format)  # combines COORDINATES, SCORE, READY and HAS_CROWN
-    SHOOT = struct.Struct("IffffII")
-    HIT = struct.Struct("II")
-    LIFECYCLE_CHANGE = struct.Struct("Id")  # LifecycleType, context
+    """
+    The structs of SCHEMAS by name
+    """
+    DISCONNECT = SCHEMAS[PacketType.DISCONNECT].struct
+    ONBOARD = SCHEMAS[PacketType.ONBOARD].struct
+    SCORE = SCHEMAS[PacketType.SCORE].struct
+    COORDINATES = SCHEMAS[PacketType.COORDINATES].struct
+    READY = SCHEMAS[PacketType.READY].struct
+    UPDATE = SCHEMAS[PacketType.UPDATE].struct
+    SHOOT = SCHEMAS[PacketType.SHOOT].struct
+    HIT = SCHEMAS[PacketType.HIT].struct
+    LIFECYCLE_CHANGE = SCHEMAS[PacketType.LIFECYCLE_CHANGE].struct
+    PING = SCHEMAS[PacketType.PING].struct
+    PONG = SCHEMAS[PacketType.PONG].struct
+    INPUT = SCHEMAS[PacketType.INPUT].struct
+    INPUT_STATE = SCHEMAS[PacketType.INPUT_STATE].struct
+    SHOOT_REJECTED = SCHEMAS[PacketType.SHOOT_REJECTED].struct
 
 
 class Packet:
-    HEADER_SIZE = struct.calcsize('IIIII')
+    HEADER = struct.Struct('=IdIIIII')  # magic number, time, packet type, sequence number, payload length, ack, ack bits
+    HEADER_SIZE = HEADER.size
     MAGIC_NUMBER = 0xDEADBEEF
 
     def __init__(self, packet_type: PacketType, sequence_number: int, payload: bytes):
@@ -41,37 +155,132 @@ class Packet:
         self.sequence_number = sequence_number
         self.time = time.time()
         self.payload = payload
+        # piggybacked acknowledgement of the peer's reliable packets
+        self.ack = 0
+        self.ack_bits = 0
 
     def serialize(self):
-        magic_number_bytes = struct.pack('I', self.MAGIC_NUMBER)
-        time_bytes = struct.pack('f', self.time)
-        packet_type_bytes = struct.pack('I', self.packet_type)
-        sequence_number_bytes = struct.pack('I', self.sequence_number)
-        payload_length_bytes = struct.pack('I', len(self.payload))
-
-        headers = magic_number_bytes + time_bytes + packet_type_bytes + \
-            sequence_number_bytes + payload_length_bytes
+        headers = self.HEADER.pack(self.MAGIC_NUMBER, self.time, self.packet_type,
+                                   self.sequence_number, len(self.payload), self.ack, self.ack_bits)
         serialized_packet = headers + self.payload
 
         return serialized_packet
 
+    @classmethod
+    def peek(cls, serialized_data) -> tuple[int, int, float]:
+        """
+        Packet type, sequence number and time, without decoding the rest of the packet
+        """
+        if len(serialized_data) < Packet.HEADER_SIZE:
+            raise ValueError("Invalid packet - packet is too short")
+
+        magic_number, time, packet_type, sequence_number, *_ = Packet.HEADER.unpack_from(serialized_data)
+        if magic_number != Packet.MAGIC_NUMBER:
+            raise ValueError(
+                "Invalid packet - magic number mis-match of packets. \npacket will be disqualified")
+        if packet_type not in PACKET_TYPES:
+            raise ValueError(f"Invalid packet - unknown packet type {packet_type}")
+        return packet_type, sequence_number, time
+
     @classmethod
     def deserialize(cls, serialized_data):
         if len(serialized_data) < Packet.HEADER_SIZE:
             raise ValueError("Invalid packet - packet is too short")
 
-        magic_number, time, packet_type, sequence_number, payload_length = struct.unpack(
-            'IIIII', serialized_data[:Packet.HEADER_SIZE])
+        magic_number, time, packet_type, sequence_number, payload_length, ack, ack_bits = Packet.HEADER.unpack_from(
+            serialized_data)
 
         if magic_number != Packet.MAGIC_NUMBER:
             raise ValueError(
                 "Invalid packet - magic number mis-match of packets. \npacket will be disqualified")
+        if packet_type not in PACKET_TYPES:
+            raise ValueError(f"Invalid packet - unknown packet type {packet_type}")
         payload = serialized_data[Packet.HEADER_SIZE:
                                   Packet.HEADER_SIZE + payload_length]
 
         packet = Packet(packet_type, sequence_number, payload)
         packet.time = time
+        packet.ack = ack
+        packet.ack_bits = ack_bits
         return packet
 
+    def copy(self) -> 'Packet':
+        packet = Packet(self.packet_type, self.sequence_number, self.payload)
+        packet.time = self.time
+        packet.ack = self.ack
+        packet.ack_bits = self.ack_bits
+        return packet
+
+    @property
+    def reliable(self) -> bool:
+        return self.packet_type in RELIABLE_PACKET_TYPES
+
     def __repr__(self) -> str:
         return f"<Packet {self.packet_type}, {self.time}, {self.sequence_number}>"
+
+
+class Bundle:
+    """
+    Several packets for the same peer in one datagram, a BUNDLE packet with the messages back to back as payload.
+    Messages keep their type, sequence number and time in a short MESSAGE_HEADER,
+    the acks of the BUNDLE header stand for all of them
+    """
+    MESSAGE_HEADER = struct.Struct("=BIfH")  # packet type, sequence number, time relative to the bundle, payload length
+
+    @classmethod
+    def pack(cls, packets: list[Packet], now: float, max_size: int) -> list[Packet]:
+        """
+        Groups `packets` into as few datagrams of at most `max_size` bytes as they fit in, keeping their order.
+        A message that ends up alone goes out as a copy of itself, one too large for a bundle too
+        """
+        groups: list[list[Packet]] = []
+        size = max_size
+        for packet in packets:
+            message_size = cls.MESSAGE_HEADER.size + len(packet.payload)
+            if size + message_size > max_size:
+                groups.append([])
+                size = Packet.HEADER_SIZE
+            groups[-1].append(packet)
+            size += message_size
+
+        datagrams = []
+        for group in groups:
+            if len(group) == 1:
+                datagrams.append(group[0].copy())
+                continue
+
+            payload = b"".join(
+                cls.MESSAGE_HEADER.pack(packet.packet_type, packet.sequence_number, packet.time - now, len(packet.payload)) + packet.payload
+                for packet in group)
+            bundle = Packet(PacketType.BUNDLE, 0, payload)
+            bundle.time = now
+            datagrams.append(bundle)
+        return datagrams
+
+    @classmethod
+    def unpack(cls, packet: Packet) -> list[Packet]:
+        """
+        The messages in a BUNDLE packet, carrying its acks. Any other packet is a message of its own
+        """
+        if packet.packet_type != PacketType.BUNDLE:
+            return [packet]
+
+        messages = []
+        data = packet.payload
+        offset = 0
+        while offset < len(data):
+            if offset + cls.MESSAGE_HEADER.size > len(data):
+                raise ValueError("Invalid bundle - truncated message header")
+
+            packet_type, sequence_number, time_offset, length = cls.MESSAGE_HEADER.unpack_from(data, offset)
+            offset += cls.MESSAGE_HEADER.size
+            if offset + length > len(data):
+                raise ValueError("Invalid bundle - truncated message")
+
+            message = Packet(packet_type, sequence_number, data[offset:offset + length])
+            message.time = packet.time + time_offset
+            message.ack = packet.ack
+            message.ack_bits = packet.ack_bits
+            messages.append(message)
+            offset += length
+        return messages
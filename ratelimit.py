@@ -0,0 +1,66 @@
+from __future__ import annotations
+import logging
+import time
+from typing import Callable
+
+
+class TokenBucket:
+    """
+    Allows `rate` events per second on average and bursts of up to `capacity`.
+    Refilled lazily from the time of the last take, an idle bucket costs nothing
+    """
+    def __init__(self, rate: float, capacity: float, now: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = now
+
+    def refill(self, now: float) -> float:
+        # the server's threads read the clock separately, it can look like it went back a little
+        self.tokens = min(self.capacity, self.tokens + max(now - self.last, 0) * self.rate)
+        self.last = max(now, self.last)
+        return self.tokens
+
+    def take(self, now: float, amount: float = 1) -> bool:
+        if self.refill(now) < amount:
+            return False
+        self.tokens -= amount
+        return True
+
+    def full(self, now: float) -> bool:
+        """
+        A full bucket behaves like a new one, so it can be dropped and made again when needed
+        """
+        return self.refill(now) >= self.capacity
+
+
+class RateLimitedLog:
+    """
+    Logs at most one message per `interval`. The ones in between are counted and mentioned with the next one logged
+    """
+    def __init__(self, logger: logging.Logger, interval: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self.logger = logger
+        self.interval = interval
+        self.clock = clock
+        self.suppressed = 0
+        self._next = float("-inf")
+
+    def log(self, level: int, message: str, *args) -> bool:
+        """
+        True if it was logged
+        """
+        now = self.clock()
+        if now < self._next:
+            self.suppressed += 1
+            return False
+
+        self._next = now + self.interval
+        if self.suppressed:
+            message += " (%d more since the last one)"
+            args += (self.suppressed,)
+            self.suppressed = 0
+        self.logger.log(level, message, *args)
+        return True
+
+    def error(self, message: str, *args) -> bool:
+        return self.log(logging.ERROR, message, *args)
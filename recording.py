@@ -0,0 +1,100 @@
+from __future__ import annotations
+import socket
+import struct
+import threading
+from enum import IntEnum
+from typing import BinaryIO, Iterator
+
+
+class RecordType(IntEnum):
+    SEED = 1  # payload is the seed of Server.random
+    INBOUND = 2  # payload is the datagram as received
+    OUTBOUND = 3  # payload is the datagram as sent
+    UPDATE_TICK = 4  # Server.update_tick ran
+    SIMULATION_TICK = 5  # Server.simulation_tick ran, payload is dt
+
+
+MAGIC = b"TANKREC1"
+RECORD_HEADER = struct.Struct("=BdIHI")  # record type, server clock, ipv4 address, port, payload length
+SEED = struct.Struct("=Q")
+DT = struct.Struct("=d")
+
+NO_ADDRESS = ("0.0.0.0", 0)
+
+
+class Record:
+    def __init__(self, record_type: RecordType, time: float, address: tuple[str, int], payload: bytes) -> None:
+        self.record_type = record_type
+        self.time = time
+        self.address = address
+        self.payload = payload
+
+    def __repr__(self) -> str:
+        return f"<Record {self.record_type.name}, {self.time}, {self.address}, {len(self.payload)} bytes>"
+
+
+class Recorder:
+    """
+    Append-only binary log of everything the server received, sent and ticked, for replay.
+
+    Datagrams are stored as they went over the wire, so they keep their Packet framing.
+    Writes come from the receive thread, both loops and the request handlers, a lock keeps records whole
+    """
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._file: BinaryIO = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+
+    def write(self, record_type: RecordType, time: float, address: tuple[str, int], payload: bytes = b"") -> None:
+        host, port = address
+        header = RECORD_HEADER.pack(record_type, time, int.from_bytes(socket.inet_aton(host), "big"), port, len(payload))
+        with self._lock:
+            self._file.write(header)
+            self._file.write(payload)
+
+    def seed(self, time: float, seed: int) -> None:
+        self.write(RecordType.SEED, time, NO_ADDRESS, SEED.pack(seed))
+
+    def inbound(self, time: float, address: tuple[str, int], data: bytes) -> None:
+        self.write(RecordType.INBOUND, time, address, data)
+
+    def outbound(self, time: float, address: tuple[str, int], data: bytes) -> None:
+        self.write(RecordType.OUTBOUND, time, address, data)
+
+    def update_tick(self, time: float) -> None:
+        self.write(RecordType.UPDATE_TICK, time, NO_ADDRESS)
+
+    def simulation_tick(self, time: float, dt: float) -> None:
+        self.write(RecordType.SIMULATION_TICK, time, NO_ADDRESS, DT.pack(dt))
+
+    def flush(self) -> None:
+        with self._lock:
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+def read_recording(path: str) -> Iterator[Record]:
+    """
+    Records in the order they were written. A record cut short at the end (crash mid write) is ignored
+    """
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a recording")
+
+        while True:
+            header = file.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+
+            record_type, time, host, port, length = RECORD_HEADER.unpack(header)
+            payload = file.read(length)
+            if len(payload) < length:
+                return
+
+            address = (socket.inet_ntoa(host.to_bytes(4, "big")), port)
+            yield Record(RecordType(record_type), time, address, payload)
@@ -0,0 +1,203 @@
+from __future__ import annotations
+import logging
+import threading
+
+from packet import Packet, PacketType
+from settings import (
+    ACK_DELAY,
+    RELIABLE_GAP_TIMEOUT,
+    RELIABLE_INITIAL_RTO,
+    RELIABLE_MAX_RETRIES,
+    RELIABLE_MAX_RTO,
+    RELIABLE_MIN_RTO,
+    RELIABLE_RECEIVE_WINDOW,
+)
+
+
+LOGGER = logging.getLogger("Reliability")
+
+ACK_BITS = 32
+
+
+class PendingPacket:
+    def __init__(self, packet: Packet, now: float) -> None:
+        self.packet = packet
+        self.first_sent = now
+        self.last_sent = now
+        self.transmissions = 1
+
+
+class ReliableChannel:
+    """
+    Reliable ordered delivery for RELIABLE_PACKET_TYPES between two peers, on top of plain UDP.
+
+    Reliable packets get their sequence number from the channel. Every outgoing packet,
+    reliable or not, piggybacks the acknowledgement of what we received:
+    `ack` is cumulative (everything up to and including it arrived) and bit i of `ack_bits`
+    means ack + 2 + i arrived out of order. Unacknowledged packets are retransmitted
+    one by one once their RTO runs out, the RTO follows the measured round trip time.
+
+    Reliable packets more than RELIABLE_RECEIVE_WINDOW ahead are dropped, the sender sends them again.
+    A sender gives up on a packet after RELIABLE_MAX_RETRIES, the receiver skips a gap once the packet
+    after it has waited RELIABLE_GAP_TIMEOUT, by then the missing ones were given up on.
+    """
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+
+        # sending
+        self._next_sequence = 1
+        self.pending: dict[int, PendingPacket] = {}
+        self.srtt: float | None = None
+        self.rttvar: float = 0
+        self.rto: float = RELIABLE_INITIAL_RTO
+        self.retransmissions = 0
+
+        # receiving
+        self.next_expected = 1
+        self._buffered: dict[int, Packet] = {}
+        self._buffered_at: dict[int, float] = {}  # when each buffered packet arrived
+        self.skipped = 0
+        self._ack_pending_since: float | None = None
+
+    @property
+    def ack(self) -> int:
+        return self.next_expected - 1
+
+    @property
+    def ack_bits(self) -> int:
+        bits = 0
+        for sequence_number in self._buffered:
+            offset = sequence_number - self.next_expected - 1
+            if 0 <= offset < ACK_BITS:
+                bits |= 1 << offset
+        return bits
+
+    def prepare(self, packet: Packet, now: float) -> Packet:
+        """
+        Stamps acks onto an outgoing packet, reliable packets are numbered and kept until acknowledged.
+        Returns the packet to serialize, a copy when the same packet object is broadcast to several peers
+        """
+        with self._lock:
+            if packet.reliable:
+                packet = packet.copy()
+                packet.sequence_number = self._next_sequence
+                self._next_sequence += 1
+                self.pending[packet.sequence_number] = PendingPacket(packet, now)
+
+            self._stamp(packet)
+            return packet
+
+    def stamp(self, packet: Packet) -> None:
+        """
+        Stamps fresh acks onto a packet that is about to go out, for packets prepared a while before they are sent
+        """
+        with self._lock:
+            self._stamp(packet)
+
+    def _stamp(self, packet: Packet) -> None:
+        packet.ack = self.ack
+        packet.ack_bits = self.ack_bits
+        self._ack_pending_since = None
+
+    def receive(self, packet: Packet, now: float) -> list[Packet]:
+        """
+        Processes the piggybacked acks and returns the packets that are ready for handling, in order.
+        Unreliable packets are passed straight through, duplicates are dropped
+        and reliable packets that arrive early are held back until the gap before them is filled
+        """
+        with self._lock:
+            self._process_acks(packet.ack, packet.ack_bits, now)
+
+            if not packet.reliable:
+                delivered = self._skip_gaps(now) if self._buffered else []
+                return delivered if packet.packet_type == PacketType.ACK else delivered + [packet]
+
+            # acknowledge duplicates as well, our previous ack might have been lost
+            if self._ack_pending_since is None:
+                self._ack_pending_since = now
+
+            sequence_number = packet.sequence_number
+            if (sequence_number < self.next_expected or sequence_number > self.next_expected + RELIABLE_RECEIVE_WINDOW
+                    or sequence_number in self._buffered):
+                return self._skip_gaps(now)
+
+            self._buffered[sequence_number] = packet
+            self._buffered_at[sequence_number] = now
+            return self._deliver() + self._skip_gaps(now)
+
+    def _deliver(self) -> list[Packet]:
+        delivered = []
+        while self.next_expected in self._buffered:
+            del self._buffered_at[self.next_expected]
+            delivered.append(self._buffered.pop(self.next_expected))
+            self.next_expected += 1
+        return delivered
+
+    def _skip_gaps(self, now: float) -> list[Packet]:
+        """
+        Moves past missing packets the sender has given up on, they were sent before the first packet held back
+        """
+        delivered = []
+        while self._buffered:
+            first = min(self._buffered)
+            if now - self._buffered_at[first] < RELIABLE_GAP_TIMEOUT:
+                break
+            LOGGER.warning("skipping %s reliable packets the peer gave up on", first - self.next_expected)
+            self.skipped += first - self.next_expected
+            self.next_expected = first
+            delivered += self._deliver()
+        return delivered
+
+    def needs_ack(self, now: float) -> bool:
+        """
+        True when received reliable packets have not been acknowledged by any outgoing packet for ACK_DELAY
+        """
+        return self._ack_pending_since is not None and now - self._ack_pending_since >= ACK_DELAY
+
+    def retransmit(self, now: float) -> list[Packet]:
+        """
+        Packets whose RTO ran out, already stamped with fresh acks
+        """
+        with self._lock:
+            due = []
+            for sequence_number, pending in list(self.pending.items()):
+                if now - pending.last_sent < self.rto:
+                    continue
+
+                if pending.transmissions > RELIABLE_MAX_RETRIES:
+                    LOGGER.warning("giving up on %s after %s transmissions", pending.packet, pending.transmissions)
+                    del self.pending[sequence_number]
+                    continue
+
+                pending.last_sent = now
+                pending.transmissions += 1
+                self.retransmissions += 1
+                pending.packet.ack = self.ack
+                pending.packet.ack_bits = self.ack_bits
+                due.append(pending.packet)
+
+            if due:
+                self._ack_pending_since = None
+            return due
+
+    def _process_acks(self, ack: int, ack_bits: int, now: float) -> None:
+        if not self.pending:
+            return
+
+        for sequence_number in list(self.pending):
+            offset = sequence_number - ack - 2
+            if sequence_number <= ack or (0 <= offset < ACK_BITS and ack_bits & (1 << offset)):
+                pending = self.pending.pop(sequence_number)
+                if pending.transmissions == 1:
+                    # Karn's algorithm, retransmitted packets give ambiguous samples
+                    self._update_rtt(now - pending.first_sent)
+
+    def _update_rtt(self, sample: float) -> None:
+        # RFC 6298
+        if self.srtt is None:
+            self.srtt = sample
+            self.rttvar = sample / 2
+        else:
+            self.rttvar = .75 * self.rttvar + .25 * abs(self.srtt - sample)
+            self.srtt = .875 * self.srtt + .125 * sample
+        self.rto = min(max(self.srtt + 4 * self.rttvar, RELIABLE_MIN_RTO), RELIABLE_MAX_RTO)
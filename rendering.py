@@ -0,0 +1,28 @@
+import pygame
+
+
+def inverted(img: pygame.Surface):
+   inv = pygame.Surface(img.get_rect().size, pygame.SRCALPHA)
+   inv.fill((255, 255, 255, 255))
+   inv.blit(img, (0, 0), None, pygame.BLEND_RGB_SUB)
+   return inv
+
+
+def outline(surf: pygame.Surface, dest: pygame.Surface, loc: tuple[int, int], depth: int = 1) -> None:
+    temp_surf = surf.copy()
+    inverted_surf = inverted(temp_surf)
+    inverted_surf.set_colorkey((255, 255, 255))
+    dest.blit(inverted_surf, (loc[0]-depth, loc[1]))
+    dest.blit(inverted_surf, (loc[0]+depth, loc[1]))
+    dest.blit(inverted_surf, (loc[0], loc[1]-depth))
+    dest.blit(inverted_surf, (loc[0], loc[1]+depth))
+    temp_surf.set_colorkey((0, 0, 0))
+    dest.blit(temp_surf, (0, 0))
+
+
+def render_stack(surf: pygame.Surface, images: list[pygame.Surface], pos: pygame.Vector2, rotation: int):
+    count = len(images)
+    for i, img in enumerate(images):
+        rotated_img = pygame.transform.rotate(img, rotation)
+        surf.blit(rotated_img, (pos.x - rotated_img.get_width() // 2 +
+                  count, pos.y - rotated_img.get_height() // 2 - i + count))
@@ -0,0 +1,92 @@
+from __future__ import annotations
+import heapq
+import itertools
+import math
+from typing import Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class EventScheduler(Generic[T]):
+    """
+    Min-heap of items by due time, pop_due hands out everything due by `now` in time order.
+    Events are never cancelled, whoever pops an item checks that it still applies
+    """
+    def __init__(self) -> None:
+        self._heap: list[tuple[float, int, T]] = []
+        self._order = itertools.count()  # ties go first come first served, items are never compared
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def schedule(self, time: float, item: T) -> None:
+        """
+        Raises ValueError for a time that is not finite. NaN compares false with everything,
+        at the top of the heap it would hold back every item due after it
+        """
+        if not math.isfinite(time):
+            raise ValueError(f"cannot schedule an item at {time}")
+        heapq.heappush(self._heap, (time, next(self._order), item))
+
+    def next_due(self) -> float | None:
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float) -> list[T]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due.append(heapq.heappop(self._heap)[2])
+        return due
+
+    def clear(self) -> None:
+        self._heap.clear()
+
+
+class IdleExpiry(Generic[T]):
+    """
+    Expires keys that were not seen for `timeout` seconds.
+    seen only stores the time, a deadline that comes up for a key seen since is pushed back to its new deadline,
+    so expire costs what expires or is due a second look, not how many keys are tracked
+    """
+    def __init__(self, timeout: float) -> None:
+        self.timeout = timeout
+        self._last_seen: dict[T, tuple[float, int]] = {}  # key -> last seen, token of its live deadline
+        self._deadlines: EventScheduler[tuple[T, int]] = EventScheduler()
+        self._tokens = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._last_seen)
+
+    def __contains__(self, key: T) -> bool:
+        return key in self._last_seen
+
+    def add(self, key: T, now: float) -> None:
+        token = next(self._tokens)
+        self._last_seen[key] = (now, token)
+        self._deadlines.schedule(now + self.timeout, (key, token))
+
+    def seen(self, key: T, now: float) -> None:
+        """
+        Keys that were never added are ignored
+        """
+        entry = self._last_seen.get(key)
+        if entry is not None:
+            self._last_seen[key] = (now, entry[1])
+
+    def remove(self, key: T) -> None:
+        self._last_seen.pop(key, None)
+
+    def expire(self, now: float) -> list[T]:
+        expired = []
+        for key, token in self._deadlines.pop_due(now):
+            entry = self._last_seen.get(key)
+            if entry is None or entry[1] != token:
+                # removed, or added again with a deadline of its own
+                continue
+
+            deadline = entry[0] + self.timeout
+            if deadline <= now:
+                del self._last_seen[key]
+                expired.append(key)
+            else:
+                self._deadlines.schedule(deadline, (key, token))
+        return expired
@@ -4,21 +4,48 @@ import socket
 import threading
 import time
 import logging
+import math
 import random
-import pygame
-
-from arena import Arena, Tile
-from packet import Packet, PacketType, PayloadFormat
+from collections import deque
+
+from arena import Arena, ArenaRuntime
+from broadphase import SpatialGrid
+from lag_compensation import PositionHistory
+from metrics import Registry
+from network_stats import LinkStats, SendRateController
+from ratelimit import RateLimitedLog, TokenBucket
+from recording import Recorder
+from scheduler import EventScheduler, IdleExpiry
+from reliability import ReliableChannel
+from packet import RELIABLE_PACKET_TYPES, REQUEST_SCHEMAS, Bundle, Packet, PacketType, PayloadFormat
 from settings import (
     BUFF_SIZE,
+    BUNDLE_MAX_SIZE,
+    BUNDLE_MESSAGES,
     CLEANUP_INTERVAL,
+    COOLDOWN_TIME_SCALE,
     DECISIVE_SCORE,
+    FIRE_BURST,
+    FLOOD_BURST,
+    FLOOD_RATE,
     GAME_INTERVAL,
+    INPUT_BUFFER_TICKS,
+    INPUT_MAX_LEAD,
+    INPUT_TICK_RATE,
+    LAG_COMPENSATION_WINDOW,
+    LOG_INTERVAL,
+    METRICS_ADDRESS,
+    METRICS_PORT,
+    NETWORK_STATS_INTERVAL,
+    RATE_LIMITS,
     ROUND_INTERVAL,
+    SHOCKWAVE_KNOCKBACK,
+    SIMULATION_TICK_RATE,
+    UPDATE_MAX_RATE,
     WAITING_ROOM_ID,
     WAITING_TIME,
 )
-from shared import NON_LETHAL_LIFECYCLES, LifecycleType, OnboardType, Projectile, ProjectileType, check_collision, get_distance
+from shared import NON_LETHAL_LIFECYCLES, LifecycleType, OnboardType, Projectile, ProjectileType, Tank, check_collision, get_distance, unpack_input
 
 
 LOGGER = logging.getLogger("Server")
@@ -33,10 +60,72 @@ class Connection:
         self.barrel_rotation: float = 0
         self.name = ""
         self.score = 0
-        self.alive = True
-        self.ready = False
-        self.time_last_packet = time.time()
+        self.roster: Roster | None = None  # set while connected, see Roster
+        self._alive = True
+        self._ready = False
         self.wins = 0
+        self.link = LinkStats()
+        self.update_rate = SendRateController()
+        # per connection, clients read gaps as loss and not every tick reaches every client
+        self.update_sequence = 1
+        # once the client sends INPUT we move its tank, see Server.move_tanks
+        self.tank: Tank | None = None
+        self.input_tick = 0  # the client tick simulated last
+        self.input_bits = 0  # the command being applied and the client tick it was given for
+        self.input_bits_tick = 0
+        self.input_time = 0.  # simulated time not stepped yet
+        self.commands: dict[int, int] = {}  # received for ticks still to come, by tick
+        self.fire_buckets: dict[ProjectileType, TokenBucket] = {}  # see Server.allow_shot
+
+    @property
+    def alive(self) -> bool:
+        return self._alive
+
+    @alive.setter
+    def alive(self, alive: bool) -> None:
+        alive = bool(alive)
+        if self.roster and alive != self._alive:
+            self.roster.alive += 1 if alive else -1
+            self.roster.changed = True
+        self._alive = alive
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    @ready.setter
+    def ready(self, ready: bool) -> None:
+        ready = bool(ready)
+        if self.roster and ready != self._ready:
+            self.roster.ready += 1 if ready else -1
+            self.roster.changed = True
+        self._ready = ready
+
+
+class Roster:
+    """
+    Counts of connected, ready and alive players, kept up to date as players come and go and their flags flip.
+    Every change marks the lifecycle to be looked at again, see Server.check_lifecycle
+    """
+    def __init__(self) -> None:
+        self.players = 0
+        self.ready = 0
+        self.alive = 0
+        self.changed = True
+
+    def join(self, conn: Connection) -> None:
+        conn.roster = self
+        self.players += 1
+        self.ready += conn.ready
+        self.alive += conn.alive
+        self.changed = True
+
+    def leave(self, conn: Connection) -> None:
+        conn.roster = None
+        self.players -= 1
+        self.ready -= conn.ready
+        self.alive -= conn.alive
+        self.changed = True
 
 
 class Server:
@@ -45,31 +134,124 @@ class Server:
         self.running = False
         self.connections: dict[tuple[str, int], Connection] = {}
         self.spectators: list[tuple[Packet, tuple[str, int]]] = []
-        self.projectiles: dict[int, Projectile] = {}
+        self.projectiles: dict[int, Projectile] = {}  # direct, they follow their BouncePath
+        self.lobbed_projectiles: dict[int, Projectile] = {}
+        self.impacts: EventScheduler[Projectile] = EventScheduler()
+        self.expiries: EventScheduler[Projectile] = EventScheduler()  # direct projectiles running out of bounces
         self._player_index = 0
         self._projectile_index = 0
+        self._update_sequence = 1
+        self.spectator_rate = SendRateController()
         self.lifecycle_state: LifecycleType = LifecycleType.WAITING_ROOM
         self.lifecycle_context = 0
+        self.lifecycle_deadline = math.inf  # when the current state times out, see check_lifecycle
+        self.roster = Roster()
         self.round_index = 0
+        self.clock = time.time
+        # everything random goes through here, recordings store the seed
+        self.random = random.Random()
+        self.recorder: Recorder | None = None
+
+        # latest COORDINATES datagram per address, handled once per simulation tick
+        self._pending_coordinates: dict[tuple[str, int], tuple[int, bytes]] = {}
+        # every other datagram in the order it arrived, handled once per simulation tick on its thread.
+        # INPUT goes here too, each holds changes the others might not
+        self._pending_requests: deque[tuple[tuple[str, int], bytes]] = deque()
+        self.channels: dict[tuple[str, int], ReliableChannel] = {}
+        # prepared packets waiting for the end of the tick, by address
+        self.outboxes: dict[tuple[str, int], list[Packet]] = {}
+        self._outbox_lock = threading.Lock()
+        self.bundling = BUNDLE_MESSAGES
+        self.rate_limits = RATE_LIMITS
+        # per address, datagrams past FLOOD_RATE are dropped before they are decoded, see receive
+        self.flood_buckets: dict[tuple[str, int], TokenBucket] = {}
+        self.bad_datagram_log = RateLimitedLog(LOGGER, LOG_INTERVAL)
+        # every peer with a channel, any datagram from it counts as a sign of life
+        self.liveness: IdleExpiry[tuple[str, int]] = IdleExpiry(CLEANUP_INTERVAL)
+        self._next_spectator_ping = 0.
+        self.position_history = PositionHistory(LAG_COMPENSATION_WINDOW, SIMULATION_TICK_RATE)
+        # what the clients send us, see handle_packet
+        self.handlers = {
+            PacketType.CONNECT: self.handle_connect,
+            PacketType.DISCONNECT: self.handle_disconnect,
+            PacketType.COORDINATES: self.handle_coordinates,
+            PacketType.READY: self.handle_ready,
+            PacketType.SHOOT: self.handle_shoot,
+            PacketType.INPUT: self.handle_input,
+        }
+        self.accepted_types = frozenset(self.handlers) | {PacketType.PONG, PacketType.ACK}
 
         self._current_arena = 0
         arena_names = os.listdir('arenas')
         arena_names.sort()
         self.arenas = [Arena(os.path.join('arenas', file)) for file in arena_names ]
-        self.tile_collisions = []
+        self.arena_runtimes = [ArenaRuntime(arena) for arena in self.arenas]
         self.current_arena = WAITING_ROOM_ID
 
+        self.metrics = Registry("tanks_")
+        self._register_metrics()
+
+
+    def _register_metrics(self) -> None:
+        packet_type_name = lambda packet_type: PacketType(packet_type).name
+        tick_buckets = [.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1]
+
+        self.packets_received = self.metrics.counter(
+            "packets_received_total", "Datagrams received, by packet type", "type", packet_type_name)
+        self.packets_handled = self.metrics.counter(
+            "packets_handled_total", "Packets handled after coalescing and reliable delivery, by packet type", "type", packet_type_name)
+        self.packets_sent = self.metrics.counter(
+            "packets_sent_total", "Datagrams sent, by packet type", "type", packet_type_name)
+        self.messages_sent = self.metrics.counter(
+            "messages_sent_total", "Messages sent, bundled or not, by packet type", "type", packet_type_name)
+        self.bytes_received = self.metrics.counter("received_bytes_total", "Bytes received")
+        self.bytes_sent = self.metrics.counter("sent_bytes_total", "Bytes sent")
+        self.decode_errors = self.metrics.counter("decode_errors_total", "Datagrams that could not be decoded")
+        self.datagrams_dropped = self.metrics.counter(
+            "datagrams_dropped_total", "Datagrams dropped before decoding, by reason", "reason")
+        self.shots_rejected = self.metrics.counter(
+            "shots_rejected_total", "SHOOT packets fired faster than the projectile's cooldown, by projectile type",
+            "type", lambda projectile_type: ProjectileType(projectile_type).name)
+        self.logs_suppressed = self.metrics.counter("logs_suppressed_total", "Errors about bad datagrams not logged, see LOG_INTERVAL")
+        self.retransmissions = self.metrics.counter("retransmissions_total", "Reliable packets sent again")
+        self.lifecycle_transitions = self.metrics.counter(
+            "lifecycle_transitions_total", "Lifecycle changes, by the state entered", "state", lambda state: LifecycleType(state).name)
+        self.update_tick_seconds = self.metrics.histogram(
+            "update_tick_seconds", "Time spent in one iteration of the update loop", tick_buckets)
+        self.simulation_tick_seconds = self.metrics.histogram(
+            "simulation_tick_seconds", "Time spent in one iteration of the simulation loop", tick_buckets)
+
+        self.metrics.gauge("projectiles", "Live projectiles", lambda: len(self.projectiles) + len(self.lobbed_projectiles))
+        self.metrics.gauge("connections", "Connected players", lambda: len(self.connections))
+        self.metrics.gauge("spectators", "Connected spectators", lambda: len(self.spectators))
+        self.metrics.gauge("flood_buckets", "Addresses whose datagram rate is being limited", lambda: len(self.flood_buckets))
+        self.metrics.gauge("lifecycle_state", "Current LifecycleType", lambda: int(self.lifecycle_state))
+        self.metrics.gauge("link_rtt_seconds", "Round trip time, by player id",
+                           lambda: {id: link.rtt or 0 for id, link in self.network_stats().items()}, "player")
+        self.metrics.gauge("link_loss_ratio", "Loss of packets from the player, by player id",
+                           lambda: {id: link.loss for id, link in self.network_stats().items()}, "player")
+        self.metrics.gauge("update_rate_hz", "UPDATE rate, by player id",
+                           lambda: {conn.id: conn.update_rate.rate for conn in self.connections.copy().values()}, "player")
 
     @property
     def arena(self) -> Arena:
         return self.arenas[self.current_arena]
 
+    @property
+    def arena_runtime(self) -> ArenaRuntime:
+        return self.arena_runtimes[self.current_arena]
+
     def reset(self) -> None:
         for player in self.connections.values():
             # Resurrecting all players
             player.alive = True
 
         self.projectiles.clear()
+        self.lobbed_projectiles.clear()
+        self.impacts.clear()
+        self.expiries.clear()
+        # everyone gets teleported, rewinding across that makes no sense
+        self.position_history.clear()
 
     @property
     def current_arena(self) -> int:
@@ -77,12 +259,6 @@ class Server:
 
     @current_arena.setter
     def current_arena(self, val: int) -> None:
-        self.tile_collisions = [
-            pygame.Rect(tile.position[0],
-                        tile.position[1], tile.width, tile.height)
-            for tile in self.arenas[val].get_colliders()
-        ]
-        self.interactable_tiles = list(filter(lambda x: x.interactable, self.arenas[val].tiles))
         self._current_arena = val
 
     def new_arena(self):
@@ -90,14 +266,101 @@ class Server:
         waiting_room = self.arenas[WAITING_ROOM_ID]
         if waiting_room in eligible_arenas:
             eligible_arenas.remove(waiting_room)
-        chosen_arena = random.choice(eligible_arenas)
+        chosen_arena = self.random.choice(eligible_arenas)
         self.current_arena = self.arenas.index(chosen_arena)
 
     def _send(self, data: bytes, address: tuple[str, int]) -> None:
         self.sock.sendto(data, address)
 
     def _send_packet(self, packet: Packet, address: tuple[str, int]) -> None:
-        self._send(packet.serialize(), address)
+        packet = self.channel(address).prepare(packet, self.clock())
+        self._post(packet, address)
+
+    def _post(self, packet: Packet, address: tuple[str, int]) -> None:
+        """
+        Puts a prepared packet in the address's outbox, sent with the rest of the tick's messages by flush_outboxes
+        """
+        self.messages_sent.inc(packet.packet_type)
+        if not self.bundling:
+            self._transmit(packet, address)
+            return
+
+        with self._outbox_lock:
+            outbox = self.outboxes.get(address)
+            if outbox is None:
+                self.outboxes[address] = [packet]
+            else:
+                outbox.append(packet)
+
+    def flush_outboxes(self, now: float) -> None:
+        """
+        Sends every outbox as few datagrams as its messages fit in, acks are stamped as they go out
+        """
+        with self._outbox_lock:
+            outboxes, self.outboxes = self.outboxes, {}
+
+        for address, packets in outboxes.items():
+            channel = self.channels.get(address)
+            for datagram in Bundle.pack(packets, now, BUNDLE_MAX_SIZE):
+                if channel is not None:
+                    channel.stamp(datagram)
+                self._transmit(datagram, address)
+
+    def _transmit(self, packet: Packet, address: tuple[str, int]) -> None:
+        data = packet.serialize()
+        self.packets_sent.inc(packet.packet_type)
+        self.bytes_sent.inc(amount=len(data))
+        if self.recorder:
+            self.recorder.outbound(self.clock(), address, data)
+        self._send(data, address)
+
+    def channel(self, address: tuple[str, int]) -> ReliableChannel:
+        channel = self.channels.get(address)
+        if channel is None:
+            channel = self.channels.setdefault(address, ReliableChannel())
+            self.liveness.add(address, self.clock())
+        return channel
+
+    def service_channels(self, now: float) -> None:
+        """
+        Retransmits unacknowledged reliable packets and acknowledges peers we have nothing else to send to
+        """
+        for address, channel in list(self.channels.items()):
+            for packet in channel.retransmit(now):
+                self.retransmissions.inc()
+                self._post(packet, address)
+
+            if channel.needs_ack(now):
+                self._send_packet(Packet(PacketType.ACK, 0, b""), address)
+
+    def send_pings(self, now: float) -> None:
+        """
+        Sends every player their link stats, the PONG echoing it gives us the next RTT sample.
+        Also where the UPDATE rates adapt, once per stats interval
+        """
+        for addr, conn in self.connections.copy().items():
+            if not conn.link.ping_due(now):
+                continue
+
+            conn.link.close_interval(now)
+            conn.update_rate.adapt(conn.link)
+            packet = Packet(PacketType.PING, 0, PayloadFormat.PING.pack(
+                conn.link.rtt or 0, conn.link.jitter, conn.link.loss))
+            packet.time = now
+            self._send_packet(packet, addr)
+
+        # spectators send nothing on their own, their PONGs keep them from expiring
+        if self.spectators and now >= self._next_spectator_ping:
+            self._next_spectator_ping = now + NETWORK_STATS_INTERVAL
+            packet = Packet(PacketType.PING, 0, PayloadFormat.PING.pack(0, 0, 0))
+            packet.time = now
+            self.broadcast_for_spectators(packet)
+
+    def network_stats(self) -> dict[int, LinkStats]:
+        """
+        Link stats of every player, by player id
+        """
+        return {conn.id: conn.link for conn in self.connections.copy().values()}
 
     def send_hit(self, proj_id: int, hit_it: int):
         packet = Packet(PacketType.HIT, 0,
@@ -107,108 +370,238 @@ class Server:
                         ))
         self.broadcast(packet)
 
-    def check_interactive_projectiles(self, projectile: Projectile, interactable_tiles_list: list[Tile]) -> None:
-        new_pos_x, new_pos_y = projectile.position
-        for tile in interactable_tiles_list:
-            if (pygame.Rect(tile.position[0], tile.position[1], tile.width, tile.height)
-                    .colliderect(pygame.Rect(new_pos_x, new_pos_y, 8, 8))):
-                projectile.remaining_bounces = 0
-
-    def update_projectiles(self, collision_list: list[pygame.Rect], interactable_tiles_list: list[Tile], dt: float) -> None:
-        temp_proj = self.projectiles.copy()
-        keys_to_remove = []
-        for proj_id, proj in temp_proj.items():
-            proj.grace_period = max(0, proj.grace_period - dt)
-            if proj.lobbed:
-                hit_pos = Projectile.update_lobbed_projectile(proj, dt)
-                if hit_pos:
-                    self.check_interactive_projectiles(proj, interactable_tiles_list)
-
-                    if proj.projectile_type == ProjectileType.SHOCKWAVE:
-                        for projectile in temp_proj.values():
-                            # the newly made projectile gets deleted by the server instantly.
-                            # we know that we always convert to sniper shots. for now. So we can simply check for this case
-                            if proj != projectile and projectile.projectile_type != ProjectileType.SNIPER:
-                                distance = get_distance(projectile.position, (hit_pos.x, hit_pos.y))
-                                if distance < proj.radius:
-                                    keys_to_remove.append(projectile.id)
-
-                    if proj.hurts:
-                        for player in list(filter(lambda x: x.alive, self.connections.values())):
-                            if player.id == proj.sender_id and proj.grace_period:
-                                # if sender is owner, and there is grace period left we skip
-                                continue
-
-                            player_center_pos = player.position[0] - 16, player.position[1] - 16
-                            distance = get_distance(player_center_pos, proj.position)
-
-                            if distance < proj.radius:
-                                player.alive = self.lifecycle_state in NON_LETHAL_LIFECYCLES
-                                self.send_hit(proj.id, player.id)
-            else:
-                Projectile.update_projectile(proj, collision_list, dt)
-                self.check_interactive_projectiles(proj, interactable_tiles_list)
+    def rewound_position(self, player: Connection, projectile: Projectile, now: float) -> tuple[float, float]:
+        """
+        Where `player` was when the shooter of `projectile` saw them
+        """
+        if not projectile.rewind or player.id == projectile.sender_id:
+            return player.position
 
-            if proj.remaining_bounces == 0:
-                keys_to_remove.append(proj_id)
+        return self.position_history.position_at(player.id, now - projectile.rewind) or player.position
 
-        for key in set(keys_to_remove):
-            del self.projectiles[key]
+    def record_positions(self, now: float) -> None:
+        self.position_history.record(now, {conn.id: conn.position for conn in self.connections.copy().values()})
+
+    def tank_boxes(self) -> list[tuple[Connection, float, float, float, float]]:
+        """
+        Alive players, each with a box around every position a rewound hit test could put them at
+        """
+        boxes = []
+        history = self.position_history.positions
+        for player in list(filter(lambda x: x.alive, self.connections.values())):
+            xs, ys = [player.position[0]], [player.position[1]]
+            for positions in history:
+                position = positions.get(player.id)
+                if position is not None:
+                    xs.append(position[0])
+                    ys.append(position[1])
+            boxes.append((player, min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys)))
+        return boxes
+
+    def tank_grid(self) -> SpatialGrid[Connection]:
+        grid: SpatialGrid[Connection] = SpatialGrid()
+        for player, x, y, w, h in self.tank_boxes():
+            grid.insert(player, x, y, w, h)
+        return grid
+
+    def update_projectiles(self, now: float) -> None:
+        """
+        Drops direct projectiles whose bounce path is spent, then lands the lobbed ones that are due.
+        Nothing is stepped, positions are evaluated from the paths where they are needed
+        """
+        for proj in self.expiries.pop_due(now):
+            if self.projectiles.get(proj.id) is proj:
+                del self.projectiles[proj.id]
+
+        self.land_projectiles(now)
+
+    def land_projectiles(self, now: float) -> None:
+        # built when the first blast lands
+        projectile_grid: SpatialGrid[Projectile] | None = None
+        tank_grid: SpatialGrid[Connection] | None = None
+
+        for proj in self.impacts.pop_due(now):
+            if self.lobbed_projectiles.get(proj.id) is not proj:
+                # deflected by an earlier blast, or from before a reset
+                continue
+
+            del self.lobbed_projectiles[proj.id]
+            proj.position = proj.velocity  # lobbed projectiles carry their target as velocity
+            proj.grace_period = max(0, proj.grace_period - (now - proj.launch_time))
+
+            if proj.projectile_type == ProjectileType.SHOCKWAVE:
+                if projectile_grid is None:
+                    projectile_grid = SpatialGrid()
+                    for projectile in list(self.projectiles.values()) + list(self.lobbed_projectiles.values()):
+                        projectile.position = projectile.position_at(now)
+                        projectile_grid.insert_point(projectile, *projectile.position)
+
+                # projectiles caught in the blast are deflected outwards as sniper shots
+                for projectile in projectile_grid.query_radius(*proj.position, proj.radius):
+                    live = self.lobbed_projectiles if projectile.lobbed else self.projectiles
+                    if live.get(projectile.id) is not projectile:
+                        continue
+
+                    distance = get_distance(projectile.position, proj.position)
+                    if distance < proj.radius:
+                        del live[projectile.id]
+                        self.deflect_projectile(projectile, proj.position, proj.rewind)
+
+                # tanks we move are pushed out of the blast, the others push themselves on their client
+                for player in self.connections.copy().values():
+                    tank = player.tank
+                    if tank is None:
+                        continue
+                    direction_x, direction_y = tank.position.x - proj.position[0], tank.position.y - proj.position[1]
+                    distance = math.hypot(direction_x, direction_y)
+                    if 0 < distance < proj.radius:
+                        tank.knockback.x = -direction_x / distance * SHOCKWAVE_KNOCKBACK
+                        tank.knockback.y = -direction_y / distance * SHOCKWAVE_KNOCKBACK
+
+            if proj.hurts:
+                if tank_grid is None:
+                    tank_grid = self.tank_grid()
+
+                # the distance is measured to the tank's corner 16 px up and left of its position
+                for player in tank_grid.query_radius(proj.position[0] + 16, proj.position[1] + 16, proj.radius):
+                    if not player.alive:
+                        continue
+                    if player.id == proj.sender_id and proj.grace_period:
+                        # if sender is owner, and there is grace period left we skip
+                        continue
+
+                    position = self.rewound_position(player, proj, now)
+                    player_center_pos = position[0] - 16, position[1] - 16
+                    distance = get_distance(player_center_pos, proj.position)
+
+                    if distance < proj.radius:
+                        player.alive = self.lifecycle_state in NON_LETHAL_LIFECYCLES
+                        self.send_hit(proj.id, player.id)
+
+    def add_projectile(self, proj: Projectile, now: float) -> bool:
+        """
+        Projectiles are not stepped, they are launched and their impact or the end of their bounce path is scheduled.
+        False if there is no telling when that is, the projectile is not added then
+        """
+        if proj.lobbed:
+            proj.launch(now)
+            if not math.isfinite(proj.impact_time):
+                return False
+            self.lobbed_projectiles[proj.id] = proj
+            self.impacts.schedule(proj.impact_time, proj)
+        else:
+            proj.launch(now, self.arena_runtime)
+            # one that never moves would never be spent
+            if not math.isfinite(proj.impact_time):
+                return False
+            self.projectiles[proj.id] = proj
+            self.expiries.schedule(proj.impact_time, proj)
+        return True
+
+    def spawn_projectile(self, projectile_type: ProjectileType, position: tuple[float, float], velocity: tuple[float, float], sender_id: int, local_id: int = 0, rewind: float = 0) -> Projectile | None:
+        new_id = self._projectile_index
+        self._projectile_index += 1
+
+        proj = Projectile(projectile_type)
+        proj.id = new_id
+        proj.position = position
+        proj.velocity = velocity
+        proj.sender_id = sender_id
+        proj.rewind = rewind
+        if not self.add_projectile(proj, self.clock()):
+            return None
+
+        packet = Packet(PacketType.SHOOT, 0, PayloadFormat.SHOOT.pack(
+            new_id, *position, *velocity, projectile_type, sender_id, local_id))
+        self.broadcast(packet)
+        return proj
+
+    def deflect_projectile(self, projectile: Projectile, origin: tuple[float, float], rewind: float) -> None:
+        direction_x, direction_y = projectile.position[0] - origin[0], projectile.position[1] - origin[1]
+        length = get_distance(projectile.position, origin)
+        if not length:
+            return
+
+        self.spawn_projectile(
+            ProjectileType.SNIPER,
+            projectile.position,
+            (direction_x / length, direction_y / length),
+            projectile.sender_id,
+            rewind=rewind
+        )
+
+    def update_lifecycle(self, now: float) -> None:
+        """
+        One step of the lifecycle state machine, on the Roster counts instead of the players
+        """
+        roster = self.roster
+        everyone_ready = roster.ready == roster.players
 
-    def update_lifecycle(self) -> None:
         if self.lifecycle_state == LifecycleType.WAITING_ROOM:
-            if all(p.ready for p in self.connections.copy().values()):
+            if roster.players and everyone_ready:
                 self.lifecycle_state = LifecycleType.STARTING
-                self.lifecycle_context = time.time() + WAITING_TIME
-
-        elif not len(self.connections.copy().values()):
-            self.lifecycle_state = LifecycleType.WAITING_ROOM
-            self.lifecycle_context = len(self.connections)
-            self.current_arena = WAITING_ROOM_ID
+                self.lifecycle_context = now + WAITING_TIME
 
-        elif not all(p.ready for p in self.connections.copy().values()):
+        elif not roster.players or not everyone_ready:
             self.lifecycle_state = LifecycleType.WAITING_ROOM
-            self.lifecycle_context = len(self.connections)
+            self.lifecycle_context = roster.players
             self.current_arena = WAITING_ROOM_ID
 
         elif self.lifecycle_state == LifecycleType.PLAYING:
-            remaining_players = list(
-                filter(lambda x: x.alive, self.connections.values()))
-            if len(remaining_players) == 1:
-                remaining_players[0].score += 1
+            if roster.alive == 0:
                 self.lifecycle_state = LifecycleType.NEW_ROUND
-                self.lifecycle_context = time.time() + ROUND_INTERVAL
-                self.round_index += 1
-            if len(remaining_players) == 0:
-                self.lifecycle_state = LifecycleType.NEW_ROUND
-                self.lifecycle_context = time.time() + ROUND_INTERVAL
+                self.lifecycle_context = now + ROUND_INTERVAL
                 self.round_index = 0
-                return
 
-            for player in self.connections.values():
-                if player.score >= DECISIVE_SCORE:
+            elif roster.alive == 1:
+                winner = next(player for player in list(self.connections.values()) if player.alive)
+                winner.score += 1
+                self.lifecycle_state = LifecycleType.NEW_ROUND
+                self.lifecycle_context = now + ROUND_INTERVAL
+                self.round_index += 1
+
+                # only the round winner's score moved
+                if winner.score >= DECISIVE_SCORE:
                     self.current_arena = WAITING_ROOM_ID
                     self.round_index = 0
                     self.lifecycle_state = LifecycleType.DONE
-                    self.new_game_time = time.time() + GAME_INTERVAL
-                    self.lifecycle_context = player.id
-                    player.wins += 1
+                    self.new_game_time = now + GAME_INTERVAL
+                    self.lifecycle_context = winner.id
+                    winner.wins += 1
 
-        elif self.lifecycle_state == LifecycleType.DONE and time.time() >= self.new_game_time:
+        elif self.lifecycle_state == LifecycleType.DONE and now >= self.new_game_time:
             self.lifecycle_state = LifecycleType.WAITING_ROOM
-            self.lifecycle_context = len(self.connections)
+            self.lifecycle_context = roster.players
             self.round_index = 0
 
         elif self.lifecycle_state in [LifecycleType.NEW_ROUND, LifecycleType.STARTING]:
-            if time.time() >= self.lifecycle_context:
+            if now >= self.lifecycle_context:
                 self.lifecycle_state = LifecycleType.PLAYING
                 self.new_arena()
                 self.lifecycle_context = self.current_arena
 
-    def check_lifecycle(self) -> None:
+    def check_lifecycle(self, now: float) -> None:
+        """
+        Runs the state machine when the Roster changed or the current state's deadline is up, otherwise does nothing
+        """
+        if not self.roster.changed and now < self.lifecycle_deadline:
+            return
+
+        self.roster.changed = False
         old_state = self.lifecycle_state
-        self.update_lifecycle()
+        self.update_lifecycle(now)
         if old_state != self.lifecycle_state:
+            match self.lifecycle_state:
+                case LifecycleType.STARTING | LifecycleType.NEW_ROUND:
+                    self.lifecycle_deadline = self.lifecycle_context
+                case LifecycleType.DONE:
+                    self.lifecycle_deadline = self.new_game_time
+                case _:
+                    self.lifecycle_deadline = math.inf
+            # the new state might already be over, same as one that was entered a tick ago
+            self.roster.changed = True
+
+            self.lifecycle_transitions.inc(self.lifecycle_state)
             packet = Packet(PacketType.LIFECYCLE_CHANGE, 0, PayloadFormat.LIFECYCLE_CHANGE.pack(
                 self.lifecycle_state, self.lifecycle_context))
             self.broadcast(packet)
@@ -226,6 +619,8 @@ class Server:
                         ))
 
                     player.position = new_pos
+                    if player.tank is not None:
+                        player.tank.place(new_pos)
 
                     self._send_packet(packet, addr)
 
@@ -238,17 +633,33 @@ class Server:
 
                 self.spectators = []
 
-    def check_tank_hit(self) -> None:
+    def check_tank_hit(self, now: float) -> None:
         projs_hit = []
 
-        for proj in list(filter(lambda x: not x.lobbed, self.projectiles.values())):
+        grid: SpatialGrid[Projectile] = SpatialGrid()
+        for proj in self.projectiles.values():
+            proj.position = proj.position_at(now)
+            grid.insert_point(proj, *proj.position)
+
+        # 8 px projectiles overlap a 16 px tank when they are less than 8 px above or left of it, or 16 px below or right
+        candidates: dict[int, list[Connection]] = {}
+        for player, x, y, w, h in self.tank_boxes():
+            for proj in grid.query_rect(x - 8, y - 8, w + 24, h + 24):
+                candidates.setdefault(proj.id, []).append(player)
+
+        # ids follow the order projectiles were spawned in, hits are resolved in the same order as before
+        for proj_id in sorted(candidates):
+            proj = self.projectiles[proj_id]
             proj_rect = (proj.position[0], proj.position[1], 8, 8)
-            for player in list(filter(lambda x: x.alive, self.connections.values())):
-                if player.id == proj.sender_id and proj.grace_period:
+            for player in candidates[proj_id]:
+                if not player.alive:
+                    continue
+                if player.id == proj.sender_id and now - proj.launch_time < proj.grace_period:
                     # if sender is owner, and there is grace period left we skip
                     continue
 
-                player_rect = (player.position[0], player.position[1], 16, 16)
+                position = self.rewound_position(player, proj, now)
+                player_rect = (position[0], position[1], 16, 16)
                 if check_collision(proj_rect, player_rect):
                     projs_hit.append(proj.id)
                     player.alive = self.lifecycle_state in NON_LETHAL_LIFECYCLES
@@ -263,16 +674,29 @@ class Server:
             self._send_packet(packet, addr)
 
     def cleanup_stale_connections(self, now: float) -> None:
-        addr_to_cleanup = []
-        for addr, conn in self.connections.copy().items():
-            if conn.time_last_packet <= now - CLEANUP_INTERVAL:
+        """
+        Drops players, spectators and channels of peers we have not heard from for CLEANUP_INTERVAL, see IdleExpiry
+        """
+        for addr in self.liveness.expire(now):
+            conn = self.connections.get(addr)
+            if conn is not None:
                 packet = Packet(PacketType.DISCONNECT, 0, PayloadFormat.DISCONNECT.pack(conn.id))
                 self.broadcast(packet)
-                addr_to_cleanup.append(addr)
+                self.roster.leave(self.connections.pop(addr))
 
-        for addr in addr_to_cleanup:
-            del self.connections[addr]
+            self.spectators = [spectator for spectator in self.spectators if spectator[1] != addr]
+            self.channels.pop(addr, None)
 
+        for addr, bucket in list(self.flood_buckets.items()):
+            if bucket.full(now):
+                self.flood_buckets.pop(addr, None)
+
+    def forget(self, addr) -> None:
+        """
+        Drops what is left of a peer that said goodbye
+        """
+        self.channels.pop(addr, None)
+        self.liveness.remove(addr)
 
     def loop(self) -> None:
         """
@@ -283,26 +707,61 @@ class Server:
         while self.running:
             start_time = time.time()
 
-            update_data = b""
-            for _, item in self.connections.items():
-                update_data += PayloadFormat.UPDATE.pack(
-                    item.id,
-                    item.position[0],
-                    item.position[1],
-                    item.rotation,
-                    item.barrel_rotation,
-                    item.score,
-                    item.ready,
-                    item.wins > 0
-                )
-            pack = Packet(PacketType.UPDATE, 0, update_data)
-            self.broadcast(pack)
+            self.update_tick(self.clock())
 
-            self.check_lifecycle()
+            self.update_tick_seconds.observe(time.time() - start_time)
+            last_iter_time = self._wait_for_tick(start_time, UPDATE_MAX_RATE)
 
-            self.cleanup_stale_connections(time.time())
+    def update_tick(self, now: float) -> None:
+        """
+        One iteration of the update loop
+        """
+        if self.recorder:
+            self.recorder.update_tick(now)
+            self.recorder.flush()
 
-            last_iter_time = self._wait_for_tick(start_time, 20)
+        self.send_updates(now)
+        self.send_pings(now)
+        # everything posted since the last tick, from either loop or the request handlers
+        self.flush_outboxes(now)
+
+    def send_updates(self, now: float) -> None:
+        """
+        UPDATE to every client whose rate makes one due, see network_stats.SendRateController
+        """
+        entries = {}
+        for item in self.connections.copy().values():
+            entries[item.id] = PayloadFormat.UPDATE.pack(
+                item.id,
+                item.position[0],
+                item.position[1],
+                item.rotation,
+                item.barrel_rotation,
+                item.score,
+                item.ready,
+                item.wins > 0
+            )
+
+        for addr, conn in self.connections.copy().items():
+            if not conn.update_rate.due(now):
+                continue
+
+            packet = Packet(PacketType.UPDATE, conn.update_sequence, conn.update_rate.select(entries, now))
+            packet.time = now
+            conn.update_sequence += 1
+            self._send_packet(packet, addr)
+
+            if conn.tank is not None:
+                # what its own tank did with its input, see Client.handle_input_state
+                packet = Packet(PacketType.INPUT_STATE, 0, PayloadFormat.INPUT_STATE.pack(conn.input_tick, *conn.tank.state()))
+                packet.time = now
+                self._send_packet(packet, addr)
+
+        if self.spectators and self.spectator_rate.due(now):
+            packet = Packet(PacketType.UPDATE, self._update_sequence, b"".join(entries.values()))
+            packet.time = now
+            self._update_sequence += 1
+            self.broadcast_for_spectators(packet)
 
     def _wait_for_tick(self, start_time: float, tick_rate: int) -> float:
         """
@@ -318,9 +777,16 @@ class Server:
         self._player_index += 1
 
         name = packet.payload.decode()
+        if addr in self.connections:
+            self.roster.leave(self.connections[addr])
         self.connections[addr] = Connection(addr)
         self.connections[addr].name = name
         self.connections[addr].id = self._player_index
+        if addr not in self.liveness:
+            self.liveness.add(addr, self.clock())
+        # carries on from what the client saw while spectating
+        self.connections[addr].update_sequence = self._update_sequence
+        self.roster.join(self.connections[addr])
         packet = Packet(PacketType.ONBOARD, 1,
                         PayloadFormat.ONBOARD.pack(OnboardType.PLAY, self._player_index))
         self._send_packet(packet, addr)
@@ -328,71 +794,291 @@ class Server:
     def allow_new_connection(self) -> bool:
         return self.lifecycle_state in [LifecycleType.STARTING, LifecycleType.WAITING_ROOM]
 
+    def receive(self, data: bytes, addr) -> None:
+        """
+        Entry point for every datagram.
+        COORDINATES only matter as the latest value, so they are coalesced per address and handled once per tick.
+        Floods, types clients never send and anything but CONNECT from unknown peers are dropped first
+        """
+        if self.rate_limits and not self.allow_datagram(addr):
+            return
+
+        try:
+            packet_type, sequence_number, sent_time = Packet.peek(data)
+        except ValueError as e:
+            self.decode_error(e, addr)
+            return
+
+        if self.rate_limits and (packet_type not in self.accepted_types
+                                 or (addr not in self.channels and packet_type != PacketType.CONNECT)):
+            # nothing we would handle, or not from a peer we know, and it would wait for a tick
+            self.datagrams_dropped.inc("unexpected")
+            return
+
+        self.packets_received.inc(packet_type)
+        self.bytes_received.inc(amount=len(data))
+        self.liveness.seen(addr, self.clock())
+        if self.recorder:
+            self.recorder.inbound(self.clock(), addr, data)
+        self.observe_link(addr, packet_type, sequence_number, sent_time, data)
+
+        if packet_type == PacketType.PONG:
+            return
+
+        if packet_type == PacketType.COORDINATES:
+            pending = self._pending_coordinates.get(addr)
+            if pending is None or sequence_number > pending[0]:
+                self._pending_coordinates[addr] = (sequence_number, data)
+            return
+
+        self.dispatch(data, addr)
+
+    def allow_datagram(self, addr) -> bool:
+        """
+        Takes a token from the address's flood bucket, False once it sends faster than FLOOD_RATE
+        """
+        now = self.clock()
+        bucket = self.flood_buckets.get(addr)
+        if bucket is None:
+            bucket = self.flood_buckets[addr] = TokenBucket(FLOOD_RATE, FLOOD_BURST, now)
+        if bucket.take(now):
+            return True
+
+        self.datagrams_dropped.inc("flood")
+        return False
+
+    def decode_error(self, error: Exception, addr) -> None:
+        self.decode_errors.inc()
+        if not self.bad_datagram_log.error("%s from %s", error, addr):
+            self.logs_suppressed.inc()
+
+    def dispatch(self, data: bytes, addr) -> None:
+        """
+        Queues a datagram for the next simulation tick. Handlers run on the simulation thread,
+        so they never race it over the projectiles, the schedulers or the connections
+        """
+        self._pending_requests.append((addr, data))
+
+    def observe_link(self, addr, packet_type: int, sequence_number: int, sent_time: float, data: bytes) -> None:
+        """
+        Feeds the link stats before coalescing, so dropped COORDINATES are not mistaken for loss
+        """
+        conn = self.connections.get(addr)
+        if conn is None or packet_type in RELIABLE_PACKET_TYPES:
+            # reliable packets are numbered by the channel, not the client's packet counter
+            return
+
+        now = self.clock()
+        if packet_type == PacketType.PONG:
+            conn.link.on_pong(sent_time, now)
+            try:
+                (conn.link.peer_loss, conn.link.peer_jitter,
+                 conn.link.peer_queueing_delay) = REQUEST_SCHEMAS[PacketType.PONG].unpack(data[Packet.HEADER_SIZE:])
+            except ValueError as e:
+                self.decode_error(e, addr)
+        # SHOOT and PONG carry server time, not the client's clock
+        own_clock = packet_type not in (PacketType.SHOOT, PacketType.PONG)
+        conn.link.on_packet(sequence_number, sent_time if own_clock else None, now)
+
+    def handle_pending_requests(self) -> None:
+        """
+        The latest COORDINATES of every address, then everything dispatch queued in the order it arrived
+        """
+        for addr in list(self._pending_coordinates):
+            _, data = self._pending_coordinates.pop(addr)
+            self.handle_request(data, addr)
+
+        while self._pending_requests:
+            addr, data = self._pending_requests.popleft()
+            self.handle_request(data, addr)
+
     def handle_request(self, data: bytes, addr) -> None:
         LOGGER.debug("handling data: %s from %s", data, addr)
         try:
             packet = Packet.deserialize(data)
         except ValueError as e:
-            LOGGER.error(e)
+            self.decode_error(e, addr)
             return
 
-        if packet.packet_type == PacketType.CONNECT:
-            if self.allow_new_connection():
-                print('new player! %s, %s current players' % (addr, len(self.connections) + 1))
-                self.onboard_player(packet, addr)
-            else:
-                print('new spectator! %s, %s current players' % (addr, len(self.connections)))
-                self.spectators.append((packet, addr))
-                packet = Packet(PacketType.ONBOARD, 1,
-                                PayloadFormat.ONBOARD.pack(OnboardType.SPECTATE, self.current_arena))
-                self._send_packet(packet, addr)
+        channel = self.channels.get(addr)
+        if channel is None and packet.reliable:
+            channel = self.channel(addr)
 
-        if packet.packet_type == PacketType.DISCONNECT:
-            try:
-                player_id = self.connections[addr].id
-                del self.connections[addr]
-                packet.payload = PayloadFormat.DISCONNECT.pack(player_id)
-                self.broadcast(packet)
-            except:
-                self.spectators = list(filter(lambda x: x[1] != addr, self.spectators))
+        for packet in channel.receive(packet, self.clock()) if channel else [packet]:
+            self.handle_packet(packet, addr)
+
+    def handle_packet(self, packet: Packet, addr) -> None:
+        """
+        Decodes the payload with its REQUEST_SCHEMAS entry and hands the fields to the handler for its type
+        """
+        self.packets_handled.inc(packet.packet_type)
+        handler = self.handlers.get(packet.packet_type)
+        if handler is None:
+            return
 
-        if addr not in self.connections:
+        try:
+            fields = REQUEST_SCHEMAS[packet.packet_type].unpack(packet.payload)
+        except ValueError as e:
+            self.decode_error(e, addr)
             return
+        handler(packet, addr, *fields)
+
+    def handle_connect(self, packet: Packet, addr, name: bytes) -> None:
+        if self.allow_new_connection():
+            print('new player! %s, %s current players' % (addr, len(self.connections) + 1))
+            self.onboard_player(packet, addr)
+        else:
+            print('new spectator! %s, %s current players' % (addr, len(self.connections)))
+            self.spectators.append((packet, addr))
+            packet = Packet(PacketType.ONBOARD, 1,
+                            PayloadFormat.ONBOARD.pack(OnboardType.SPECTATE, self.current_arena))
+            self._send_packet(packet, addr)
 
-        self.connections[addr].time_last_packet = time.time()
+    def handle_disconnect(self, packet: Packet, addr, reason: bytes) -> None:
+        conn = self.connections.pop(addr, None)
+        if conn is not None:
+            self.roster.leave(conn)
+            self.broadcast(Packet(PacketType.DISCONNECT, 0, PayloadFormat.DISCONNECT.pack(conn.id)))
+        else:
+            self.spectators = [spectator for spectator in self.spectators if spectator[1] != addr]
+        self.forget(addr)
+
+    def handle_coordinates(self, packet: Packet, addr, player_id: int, x: float, y: float, rotation: float, barrel_rotation: float) -> None:
+        conn = self.connections.get(addr)
+        if conn is None or conn.tank is not None:
+            return
+        if not all(map(math.isfinite, (x, y, rotation, barrel_rotation))):
+            self.decode_error(ValueError("COORDINATES that are not finite"), addr)
+            return
+        if not self.arena_runtime.contains(x, y):
+            # they would stretch the tank's box in tank_grid across the plane
+            self.decode_error(ValueError("COORDINATES outside the arena"), addr)
+            return
 
-        if packet.packet_type == PacketType.COORDINATES:
-            _, x, y, rotation, barrel_rotation = PayloadFormat.COORDINATES.unpack(
-                packet.payload)
-            position = (x, y)
-            self.connections[addr].position = position
-            self.connections[addr].rotation = rotation
-            self.connections[addr].barrel_rotation = barrel_rotation
+        conn.position = (x, y)
+        conn.rotation = rotation
+        conn.barrel_rotation = barrel_rotation
 
+    def handle_ready(self, packet: Packet, addr, ready: bool) -> None:
+        conn = self.connections.get(addr)
+        if conn is not None:
+            conn.ready = ready
 
-        if packet.packet_type == PacketType.READY:
-            ready, = PayloadFormat.READY.unpack(packet.payload)
-            self.connections[addr].ready = ready
+    def handle_shoot(self, packet: Packet, addr, id: int, x: float, y: float, x_vel: float, y_vel: float,
+                     projectile_type: int, sender_id: int, local_id: int) -> None:
+        conn = self.connections.get(addr)
+        if conn is None:
+            return
 
-        if packet.packet_type == PacketType.SHOOT:
-            _, x_pos, y_pos, x_vel, y_vel, projectile_type, _ = PayloadFormat.SHOOT.unpack(
-                packet.payload)
+        try:
+            projectile_type = ProjectileType(projectile_type)
+        except ValueError as e:
+            self.decode_error(e, addr)
+            return
+        if not all(map(math.isfinite, (x, y, x_vel, y_vel))):
+            # they would end up as grid cells and deadlines, see SpatialGrid and EventScheduler
+            self.decode_error(ValueError("SHOOT that is not finite"), addr)
+            return
 
-            new_id = self._projectile_index
-            self._projectile_index += 1
+        if self.rate_limits and not self.allow_shot(conn, projectile_type):
+            self.reject_shot(local_id, addr)
+            return
 
-            sender_id = self.connections[addr].id
-            proj = Projectile(projectile_type)
-            proj.id = new_id
-            proj.position = (x_pos, y_pos)
-            proj.velocity = (x_vel, y_vel)
-            proj.sender_id = sender_id
-            self.projectiles[new_id] = proj
+        # clients stamp SHOOT with the server time they were looking at
+        rewind = self.position_history.clamp_rewind(self.clock() - packet.time)
+        if self.spawn_projectile(projectile_type, (x, y), (x_vel, y_vel), conn.id, local_id, rewind) is None:
+            self.reject_shot(local_id, addr)
 
-            packet.payload = PayloadFormat.SHOOT.pack(
-                new_id, x_pos, y_pos, x_vel, y_vel, projectile_type, sender_id)
+    def reject_shot(self, local_id: int, addr) -> None:
+        """
+        Lets the shooter drop its predicted projectile now instead of after PREDICTION_TIMEOUT.
+        Local id 0 is a shot nobody predicted
+        """
+        if local_id:
+            self._send_packet(Packet(PacketType.SHOOT_REJECTED, 0, PayloadFormat.SHOOT_REJECTED.pack(local_id)), addr)
 
-            self.broadcast(packet)
+    def allow_shot(self, conn: Connection, projectile_type: ProjectileType) -> bool:
+        """
+        Takes a token from the connection's bucket for the projectile type, refilled once per cooldown.
+        False if the client fires faster than its own cooldowns would let it
+        """
+        now = self.clock()
+        bucket = conn.fire_buckets.get(projectile_type)
+        if bucket is None:
+            cooldown = Projectile.get_cooldown(projectile_type) * COOLDOWN_TIME_SCALE
+            bucket = conn.fire_buckets[projectile_type] = TokenBucket(1 / cooldown, FIRE_BURST, now)
+        if bucket.take(now):
+            return True
+
+        self.shots_rejected.inc(projectile_type)
+        return False
+
+    def handle_input(self, packet: Packet, addr, *commands: tuple[int, int]) -> None:
+        """
+        Queues input commands for move_tanks. The first one hands the client's tank over to the server
+        """
+        conn = self.connections.get(addr)
+        if conn is None or not commands:
+            return
+
+        newest = commands[-1][0]
+        if conn.tank is None:
+            # we decide where it starts, the client learns it like any other teleport
+            spawn_positions = self.arena.spawn_positions
+            conn.position = spawn_positions[(conn.id - 1) % len(spawn_positions)]
+            conn.tank = Tank()
+            conn.tank.place(conn.position)
+            self.resync_input(conn, newest - INPUT_BUFFER_TICKS)
+            self._send_packet(Packet(PacketType.FORCE_MOVE, 0, PayloadFormat.COORDINATES.pack(conn.id, *conn.position, 0, 0)), addr)
+        elif abs(newest - INPUT_BUFFER_TICKS - conn.input_tick) > INPUT_MAX_LEAD:
+            # the client stalled or we did, carry on from where its input is now
+            self.resync_input(conn, newest - INPUT_BUFFER_TICKS)
+
+        for tick, bits in commands:
+            if tick <= conn.input_tick:
+                # too late to be applied on time, still better than holding on to an older one
+                if tick > conn.input_bits_tick:
+                    conn.input_bits_tick, conn.input_bits = tick, bits
+            elif tick <= conn.input_tick + INPUT_MAX_LEAD:
+                # anything further ahead is not a client keeping time
+                conn.commands.setdefault(tick, bits)
+
+    def resync_input(self, conn: Connection, tick: int) -> None:
+        """
+        Carries on from client tick `tick`, the commands for it and before become the one being applied
+        """
+        conn.input_tick = tick
+        conn.input_bits_tick = min(conn.input_bits_tick, tick)
+        for pending in sorted(pending for pending in conn.commands if pending <= tick):
+            conn.input_bits_tick, conn.input_bits = pending, conn.commands.pop(pending)
+
+    def move_tanks(self, dt: float) -> None:
+        """
+        Steps the tanks of clients sending INPUT through their commands, a client tick every 1 / INPUT_TICK_RATE.
+        A command holds until the next one, the client only sends changes
+        """
+        step = 1 / INPUT_TICK_RATE
+        for conn in self.connections.copy().values():
+            tank = conn.tank
+            if tank is None:
+                continue
+
+            # a stalled loop catches up, but not by more than the lead we allow
+            conn.input_time = min(conn.input_time + dt, INPUT_MAX_LEAD * step)
+            while conn.input_time >= step:
+                conn.input_time -= step
+                conn.input_tick += 1
+                bits = conn.commands.pop(conn.input_tick, None)
+                if bits is not None and conn.input_tick > conn.input_bits_tick:
+                    conn.input_bits_tick, conn.input_bits = conn.input_tick, bits
+
+                if conn.alive:
+                    buttons, tank.barrel_rotation = unpack_input(conn.input_bits)
+                    tank.move(buttons, self.arena_runtime, step)
+
+            conn.position = (tank.position.x, tank.position.y)
+            conn.rotation = tank.rotation
+            conn.barrel_rotation = tank.barrel_rotation
 
     def broadcast(self, packet: Packet) -> None:
         for addr in self.connections.copy().keys():
@@ -405,39 +1091,86 @@ class Server:
         Entry point for game simulation loop
         """
         LOGGER.info("simulation loop up!")
-        last_iter_time = 0
+        last_tick = self.clock()
         while self.running:
             start_time = time.time()
-            self.update_projectiles(
-                self.tile_collisions, self.interactable_tiles, time.time() - last_iter_time)
-            self.check_tank_hit()
+            now = self.clock()
+            self.simulation_tick(now, now - last_tick)
+            last_tick = now
 
-            last_iter_time = self._wait_for_tick(start_time, 60)
+            self.simulation_tick_seconds.observe(time.time() - start_time)
+            self._wait_for_tick(start_time, SIMULATION_TICK_RATE)
 
-    def start(self, address: str = "0.0.0.0", port: int = 30000) -> None:
+    def simulation_tick(self, now: float, dt: float) -> None:
+        """
+        One iteration of the simulation loop
         """
-        Start the UDP server
+        if self.recorder:
+            self.recorder.simulation_tick(now, dt)
+
+        self.handle_pending_requests()
+        self.move_tanks(dt)
+        self.record_positions(now)
+        self.update_projectiles(now)
+        self.check_tank_hit(now)
+        # connections and the roster only change on this thread, the lifecycle reads both
+        self.cleanup_stale_connections(now)
+        # deaths and departures this tick and due deadlines move the lifecycle on this tick
+        self.check_lifecycle(now)
+        self.service_channels(now)
+
+    def record(self, path: str) -> None:
+        """
+        Starts appending traffic and ticks to a recording, see recording.Recorder and benchmarks/replay.py
+        """
+        seed = random.getrandbits(63)
+        self.random.seed(seed)
+        self.recorder = Recorder(path)
+        self.recorder.seed(self.clock(), seed)
+
+    def start(self, address: str = "0.0.0.0", port: int = 30000, metrics_port: int = METRICS_PORT, record: str | None = None) -> None:
+        """
+        Start the UDP server, and the metrics endpoint unless metrics_port is 0.
+        With `record`, the match is recorded to that file
         """
         LOGGER.info("starting UDP server")
         self.running = True
         self.sock.bind((address, port))
+        if record:
+            self.record(record)
+        if metrics_port:
+            self.metrics.serve(METRICS_ADDRESS, metrics_port)
         threading.Thread(target=self.loop, daemon=True).start()
         threading.Thread(target=self.simulation_loop, daemon=True).start()
 
         while self.running:
             data, addr = self.sock.recvfrom(BUFF_SIZE)
-            threading.Thread(target=self.handle_request,
-                             args=(data, addr)).start()
+            self.receive(data, addr)
 
 
 if __name__ == "__main__":
     LOGGER.setLevel(logging.DEBUG)
     s = Server()
+    kwargs = {}
     if '--port' in sys.argv:
         idx = sys.argv.index('--port')
         if len(sys.argv) < idx + 1:
             raise ValueError("missing argument to option --port")
 
-        s.start(port=int(sys.argv[idx + 1]))
-    else:
-        s.start()
+        kwargs["port"] = int(sys.argv[idx + 1])
+
+    if '--metrics-port' in sys.argv:
+        idx = sys.argv.index('--metrics-port')
+        if len(sys.argv) < idx + 1:
+            raise ValueError("missing argument to option --metrics-port")
+
+        kwargs["metrics_port"] = int(sys.argv[idx + 1])
+
+    if '--record' in sys.argv:
+        idx = sys.argv.index('--record')
+        if len(sys.argv) < idx + 1:
+            raise ValueError("missing argument to option --record")
+
+        kwargs["record"] = sys.argv[idx + 1]
+
+    s.start(**kwargs)
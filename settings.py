@@ -12,7 +12,28 @@ RIPPLE_LIFETIME = 1
 SPARK_LIFETIME = 5
 PLAYER_SHADOW_COLOR = (80, 80, 80, 100)
 SHOCKWAVE_KNOCKBACK = 180
+COOLDOWN_TIME_SCALE = 10  # Projectile.cooldown counts down at a tenth of real time
 READY_INTERVAL = .5
+UI_TEXT_CACHE_SIZE = 128
+SNAPSHOT_BUFFER_SIZE = 32
+INTERPOLATION_DELAY = .1
+MAX_EXTRAPOLATION = .25
+INTERPOLATION_BUFFER_SIZE = 32
+PREDICTION_TIMEOUT = 1
+PROJECTILE_CORRECTION_TIME = .1
+COORDINATES_SEND_RATE = 30
+COORDINATES_KEEPALIVE = 1
+POSITION_SEND_THRESHOLD = .5
+ROTATION_SEND_THRESHOLD = 1
+INPUT_COMMANDS = False  # send input commands instead of COORDINATES and let the server move our tank
+INPUT_TICK_RATE = 60  # fixed steps of the tank, the client's and the server's copy alike
+INPUT_SEND_RATE = COORDINATES_SEND_RATE
+INPUT_REDUNDANCY = 2  # the latest changes each INPUT carries, in case the one before was lost
+INPUT_HISTORY = 120  # ticks of predicted states kept to reconcile with the server
+RECONCILE_THRESHOLD = .01  # px the server may disagree with our prediction before we replay
+FRAME_PROFILE_WINDOW = 240  # frames
+FRAME_PROFILE_REFRESH = .5
+PROFILE_DUMP_DIRECTORY = "profiles"
 
 # primarily server side
 BUFF_SIZE = 1024
@@ -22,3 +43,41 @@ GAME_INTERVAL = ROUND_INTERVAL
 WAITING_ROOM_ID = 0
 DECISIVE_SCORE = 7
 CLEANUP_INTERVAL = 5
+SIMULATION_TICK_RATE = 60
+INPUT_BUFFER_TICKS = 2  # client ticks an input command waits on the server, absorbs jitter
+INPUT_MAX_LEAD = 15  # ticks the server may drift from a client's input before it resyncs
+LAG_COMPENSATION_WINDOW = .25
+BROADPHASE_CELL_SIZE = 64  # px, about a blast radius
+BROADPHASE_MAX_CELLS = 256  # boxes over more cells than this are not bucketed, every query looks at them
+NETWORK_STATS_INTERVAL = 1
+METRICS_ADDRESS = "127.0.0.1"
+METRICS_PORT = 9100  # 0 disables the endpoint
+BUNDLE_MESSAGES = True  # a tick's messages for a client go out together, see packet.Bundle
+BUNDLE_MAX_SIZE = BUFF_SIZE  # clients read at most BUFF_SIZE bytes of a datagram
+RATE_LIMITS = True  # see Server.receive and Server.handle_shoot
+FLOOD_RATE = 150  # datagrams per second from one address, a client sends well under 100
+FLOOD_BURST = 75
+FIRE_BURST = 2  # shots of one type that may arrive closer together than its cooldown, jitter bunches them up
+LOG_INTERVAL = 5  # seconds between logged bad datagrams, the rest are only counted
+
+# per client UPDATE rate control, adapted every NETWORK_STATS_INTERVAL
+UPDATE_RATE = 20
+UPDATE_MIN_RATE = 10
+UPDATE_MAX_RATE = 60
+UPDATE_RATE_INCREASE = 2  # additive, Hz per interval without congestion
+UPDATE_RATE_DECREASE = .5  # multiplicative, on congestion
+UPDATE_LOSS_THRESHOLD = .15  # above what a wifi link loses at random
+UPDATE_LOSS_INTERVALS = 3  # loss counts as congestion once it lasts this many intervals, queueing delay counts at once
+UPDATE_QUEUEING_DELAY_THRESHOLD = .05
+UPDATE_REDUCED_DETAIL_RATE = 15  # at or below this, players that did not change are left out
+UPDATE_FULL_INTERVAL = 1  # full snapshot at least this often, even at reduced detail
+
+# reliable channel, both sides
+ACK_DELAY = .02
+RELIABLE_INITIAL_RTO = .2
+RELIABLE_MIN_RTO = .05
+RELIABLE_MAX_RTO = 1
+RELIABLE_MAX_RETRIES = 30
+RELIABLE_RECEIVE_WINDOW = 256  # reliable packets further ahead of the one we wait for are dropped, not held back
+# a gap this old was given up on by the sender, see ReliableChannel.receive
+RELIABLE_GAP_TIMEOUT = (RELIABLE_MAX_RETRIES + 2) * RELIABLE_MAX_RTO
@@ -1,8 +1,15 @@
 from __future__ import annotations
+import bisect
+import functools
 import math
-import pygame
 
-from enum import IntEnum, auto
+from enum import IntEnum, IntFlag, auto
+from typing import TYPE_CHECKING
+
+from geometry import Rect, Vector2
+
+if TYPE_CHECKING:
+    from arena import ArenaRuntime, Tile
 
 
 class OnboardType(IntEnum):
@@ -31,6 +38,122 @@ class ProjectileType(IntEnum):
     #BALL = auto()
 
 
+class InputButton(IntFlag):
+    FORWARD = auto()
+    BACKWARD = auto()
+    LEFT = auto()
+    RIGHT = auto()
+    FIRE_PRIMARY = auto()
+    FIRE_SECONDARY = auto()
+
+BUTTON_BITS = len(InputButton)
+BARREL_BITS = 16 - BUTTON_BITS  # an input command is 16 bits on the wire
+
+
+def pack_input(buttons: int, barrel_rotation: float) -> int:
+    """
+    One tick of a player's controls, the InputButtons in the low bits and the barrel rotation quantized above them
+    """
+    steps = 1 << BARREL_BITS
+    return buttons | (round(barrel_rotation % 360 / 360 * steps) % steps) << BUTTON_BITS
+
+
+def unpack_input(bits: int) -> tuple[int, float]:
+    """
+    The InputButtons and barrel rotation in degrees of a packed input command
+    """
+    return bits & ((1 << BUTTON_BITS) - 1), (bits >> BUTTON_BITS) * 360 / (1 << BARREL_BITS)
+
+
+class Tank:
+    """
+    How a tank drives, the same code moves the client's own tank
+    and, for clients sending input commands, the server's copy of it
+    """
+    ACCELERATION = 100
+    ROTATION_SPEED = 120
+    MAX_SPEED = 120
+    SIZE = 16
+    KNOCKBACK_DAMPING = .1  # share of the knockback left after a second
+    MIN_KNOCKBACK = 20
+
+    def __init__(self) -> None:
+        self.position = Vector2(0, 0)
+        self.rotation: float = 0
+        self.barrel_rotation: float = 0
+        self.velocity = Vector2(0, 0)
+        self.knockback = Vector2(0, 0)
+
+    def get_rect(self) -> Rect:
+        return Rect(self.position.x, self.position.y, self.SIZE, self.SIZE)
+
+    def place(self, position: tuple[float, float], rotation: float = 0) -> None:
+        """
+        Puts the tank down at rest, as on a FORCE_MOVE
+        """
+        self.position.x, self.position.y = position
+        self.rotation = rotation
+        self.velocity.x = self.velocity.y = 0
+        self.knockback.x = self.knockback.y = 0
+
+    def move(self, buttons: int, arena_runtime: ArenaRuntime, dt: float) -> None:
+        """
+        Turns and drives by the InputButtons held for `dt` seconds, knockback pushes on top.
+        Each axis is undone on its own when it runs into a wall, so tanks slide along them
+        """
+        rotation_speed = self.ROTATION_SPEED * dt
+
+        rad = math.radians(self.rotation)
+        vel_x, vel_y = math.sin(rad), -math.cos(rad)
+        velocity = self.ACCELERATION * dt
+
+        if buttons & InputButton.LEFT:
+            self.rotation -= rotation_speed
+        if buttons & InputButton.RIGHT:
+            self.rotation += rotation_speed
+
+        start_x, start_y = self.position.x, self.position.y
+
+        if buttons & InputButton.FORWARD:
+            self.velocity.y = vel_y * velocity
+            self.velocity.x = vel_x * velocity
+
+        elif buttons & InputButton.BACKWARD:
+            self.velocity.y = -vel_y * velocity
+            self.velocity.x = -vel_x * velocity
+
+        else:
+            self.velocity.x *= .5
+            self.velocity.y *= .5
+
+        damping = self.KNOCKBACK_DAMPING ** dt
+        self.knockback.x *= damping
+        self.knockback.y *= damping
+        if self.knockback.length() < self.MIN_KNOCKBACK:
+            self.knockback.x = self.knockback.y = 0
+        self.position.x -= self.knockback.x * dt
+        self.position.x += self.velocity.x
+
+        if arena_runtime.collides(self.get_rect()):
+            self.position.x = start_x
+
+        self.position.y -= self.knockback.y * dt
+        self.position.y += self.velocity.y
+        if arena_runtime.collides(self.get_rect()):
+            self.position.y = start_y
+
+    def state(self) -> tuple[float, float, float, float, float, float, float]:
+        """
+        Everything move carries over from one tick to the next: position, rotation, velocity and knockback
+        """
+        return (self.position.x, self.position.y, self.rotation,
+                self.velocity.x, self.velocity.y, self.knockback.x, self.knockback.y)
+
+    def restore(self, state: tuple[float, float, float, float, float, float, float]) -> None:
+        (self.position.x, self.position.y, self.rotation,
+         self.velocity.x, self.velocity.y, self.knockback.x, self.knockback.y) = state
+
+
 class Projectile:
     SPEED = 200  # this needs to be synced in server.Projectile.SPEED
 
@@ -47,6 +170,12 @@ class Projectile:
         self.hurts = True
         self.radius = 0
         self.remaining_bounces = 1
+        self.local_id = 0  # client side id of a predicted projectile
+        self.render_offset: tuple[float, float] = (0, 0)  # client side smoothing of corrections
+        self.rewind: float = 0  # server side lag compensation, seconds the shooter was looking behind
+        self.launch_time: float = 0  # see launch
+        self.impact_time: float = 0  # when a lobbed one lands or a direct one is spent
+        self.path: BouncePath | None = None  # direct only
 
         match projectile_type:
             case ProjectileType.LASER:
@@ -90,65 +219,129 @@ class Projectile:
         self.rotation = degrees % 360
 
     @staticmethod
+    @functools.cache
     def get_cooldown(projectile_type: ProjectileType) -> float:
         return Projectile(projectile_type).cooldown
 
     @staticmethod
+    @functools.cache
     def is_lobbed(projectile_type: ProjectileType) -> bool:
         return Projectile(projectile_type).lobbed
 
-    @staticmethod
-    def update_lobbed_projectile(projectile: Projectile, dt: float) -> None | pygame.Vector2:
-        target = pygame.Vector2(projectile.velocity)  # to simplify sockets we interchange velocity with target if lobbed
-        start = pygame.Vector2(projectile.position)
-
-        distance = get_distance((start.x, start.y), (target.x, target.y))
-
-        magnitude = projectile.speed * dt
-
-        if distance < magnitude:
-            projectile.remaining_bounces -= 1
+    def launch(self, now: float, arena_runtime: ArenaRuntime | None = None) -> None:
+        """
+        Lobbed projectiles fly straight from where they are to their target at a constant speed,
+        so when they land is known as soon as they are fired.
+        Direct ones are traced through their bounces in `arena_runtime`, see BouncePath
+        """
+        self.start_position = self.position
+        self.launch_time = now
+        if self.lobbed:
+            self.impact_time = now + get_distance(self.position, self.velocity) / self.speed
+        elif arena_runtime is not None:
+            self.path = BouncePath(arena_runtime, self.position, self.velocity, self.speed, self.remaining_bounces, now)
+            self.impact_time = self.path.end_time
+
+    def position_at(self, now: float) -> tuple[float, float]:
+        """
+        Where a launched projectile is at `now`, one that was never launched is where it was put
+        """
+        if self.path is not None:
+            return self.path.position_at(now)
+        if not self.lobbed:
+            return self.position
+
+        target = self.velocity  # to simplify sockets we interchange velocity with target if lobbed
+        flight = self.impact_time - self.launch_time
+        if now >= self.impact_time or flight <= 0:
             return target
 
-        direction = ((target[0] - start[0]) / distance, (target[1] - start[1]) / distance)
-        new_position = (start[0] + direction[0] * magnitude, start[1] + direction[1] * magnitude)
-
-        projectile.position = new_position
-
-    @staticmethod
-    def update_projectile(projectile: Projectile, collision_list: list[pygame.Rect], dt: float) -> None | pygame.Vector2:
-        x, y = projectile.position
-        vel_x, vel_y = projectile.velocity
-
-        # Calculate new potential position
-        new_pos_x = x + vel_x * dt * projectile.speed
-        new_pos_y = y + vel_y * dt * projectile.speed
-        colided = False
-
-        # Check for vertical collisions
-
-
-        if any(pygame.Rect(x, new_pos_y, 8, 8).colliderect(rect) for rect in collision_list):
-            colided = True
-            # Reflect the velocity on the y-axis
-            vel_y = -vel_y
-            # Set new position with reflected velocity
-            new_pos_y = y + vel_y * dt * projectile.speed
-
-        # Check for horizontal collisions
-        if any(pygame.Rect(new_pos_x, y, 8, 8).colliderect(rect) for rect in collision_list):
-            colided = True
-            # Reflect the velocity on the x-axis
-            vel_x = -vel_x
-            # Set new position with reflected velocity
-            new_pos_x = x + vel_x * dt * projectile.speed
-
-        projectile.velocity = (vel_x, vel_y)
+        f = max(0, (now - self.launch_time) / flight)
+        return lerp(self.start_position[0], target[0], f), lerp(self.start_position[1], target[1], f)
+
+    def advance(self, now: float) -> Vector2 | None:
+        """
+        Moves a launched direct projectile along its path to `now`, remaining_bounces drops to 0 when it is spent.
+        Returns where it hit a wall if it did since the last call
+        """
+        path = self.path
+        if path is None:
+            return None
+
+        hits = path.hits_at(now)
+        self.position = path.position_at(now)
+        segment = min(hits, len(path.times) - 1)
+        if path.velocities[segment] != self.velocity:
+            self.velocity = path.velocities[segment]
+
+        spent = path.bounces - self.remaining_bounces
+        self.remaining_bounces = 0 if now >= path.end_time else path.bounces - hits
+        if hits > spent:
+            return Vector2(path.hit_points[hits - 1])
+        return None
+
+
+class BouncePath:
+    """
+    The straight segments a direct projectile flies until it has hit `bounces` walls or an interactable tile.
+    Walls do not move, so the whole path is ray cast once when it is fired
+    and where it is later on is a lookup instead of a collision test
+    """
+    def __init__(self, arena_runtime: ArenaRuntime, position: tuple[float, float], velocity: tuple[float, float], speed: float, bounces: int, now: float) -> None:
+        self.bounces = bounces
+        self.times: list[float] = [now]  # when each segment starts
+        self.points: list[tuple[float, float]] = [position]
+        self.velocities: list[tuple[float, float]] = [velocity]  # same scale as Projectile.velocity
+        self.steps: list[tuple[float, float]] = [(velocity[0] * speed, velocity[1] * speed)]  # pixels per second
+        self.hit_points: list[tuple[float, float]] = []  # every wall hit, the last one ends the path
+        self.end_time = math.inf  # never if it stands still
+        self.tile: Tile | None = None  # the interactable tile it ended in, if any
+
+        x, y = position
+        vel_x, vel_y = velocity
+        for _ in range(bounces):
+            step_x, step_y = self.steps[-1]
+            hit = arena_runtime.cast(x, y, step_x, step_y)
+            if hit is None:
+                # out of the arena, it is spent once it is all the way out
+                self.end_time = now + arena_runtime.exit_time(x, y, step_x, step_y)
+                break
+
+            time, reflect_x, reflect_y, tile = hit
+            now += time
+            x, y = x + step_x * time, y + step_y * time
+            if tile is not None:
+                self.end_time = now
+                self.tile = tile
+                break
+
+            self.hit_points.append((x, y))
+            if len(self.hit_points) == bounces:
+                self.end_time = now
+                break
+
+            vel_x, vel_y = -vel_x if reflect_x else vel_x, -vel_y if reflect_y else vel_y
+            self.times.append(now)
+            self.points.append((x, y))
+            self.velocities.append((vel_x, vel_y))
+            self.steps.append((vel_x * speed, vel_y * speed))
+
+    def hits_at(self, now: float) -> int:
+        """
+        How many walls it has hit by `now`
+        """
+        if now >= self.end_time:
+            return len(self.hit_points)
+        return max(0, bisect.bisect_right(self.times, now) - 1)
+
+    def position_at(self, now: float) -> tuple[float, float]:
+        now = min(now, self.end_time)
+        segment = max(0, bisect.bisect_right(self.times, now) - 1)
+        elapsed = now - self.times[segment]
+        x, y = self.points[segment]
+        step_x, step_y = self.steps[segment]
+        return x + step_x * elapsed, y + step_y * elapsed
 
-        if colided:
-            projectile.remaining_bounces -= 1
-            return pygame.Vector2(projectile.position)
-        projectile.position = (new_pos_x, new_pos_y)
 
 def check_collision(rect: tuple[float, float, float, float], other_rect: tuple[float, float, float, float]) -> bool:
     x1, y1, w1, h1 = rect
@@ -163,32 +356,6 @@ def lerp(a: float, b: float, f: float):
     return a * (1.0 - f) + (b * f)
 
 
-def inverted(img: pygame.Surface):
-   inv = pygame.Surface(img.get_rect().size, pygame.SRCALPHA)
-   inv.fill((255, 255, 255, 255))
-   inv.blit(img, (0, 0), None, pygame.BLEND_RGB_SUB)
-   return inv
-
-
-def outline(surf: pygame.Surface, dest: pygame.Surface, loc: tuple[int, int], depth: int = 1) -> None:
-    temp_surf = surf.copy()
-    inverted_surf = inverted(temp_surf)
-    inverted_surf.set_colorkey((255, 255, 255))
-    dest.blit(inverted_surf, (loc[0]-depth, loc[1]))
-    dest.blit(inverted_surf, (loc[0]+depth, loc[1]))
-    dest.blit(inverted_surf, (loc[0], loc[1]-depth))
-    dest.blit(inverted_surf, (loc[0], loc[1]+depth))
-    temp_surf.set_colorkey((0, 0, 0))
-    dest.blit(temp_surf, (0, 0))
-
-
-def render_stack(surf: pygame.Surface, images: list[pygame.Surface], pos: pygame.Vector2, rotation: int):
-    count = len(images)
-    for i, img in enumerate(images):
-        rotated_img = pygame.transform.rotate(img, rotation)
-        surf.blit(rotated_img, (pos.x - rotated_img.get_width() // 2 +
-                  count, pos.y - rotated_img.get_height() // 2 - i + count))
-
 def is_within_radius(center1: tuple[float, float], center2: tuple[float, float], radius: float):
     distance = math.sqrt((center1[0] - center2[0]) ** 2 + (center1[1] - center2[1]) ** 2)
     return distance <= radius